@@ -1,5 +1,4 @@
 import gradio as gr
-import hashlib
 from typing import List, Dict
 import os
 from datetime import datetime
@@ -11,7 +10,10 @@ from agents.workflow import AgentWorkflow
 from config import constants
 from config.settings import settings
 from utils.logging import logger, set_log_level
-from utils.cache_queue import initialize_cache_queue
+from utils.cache_queue import initialize_cache_queue, get_cache_queue_manager
+from utils.fingerprint import get_fingerprinter
+from utils.cache_metrics import get_cache_stats
+from document_processor.converter_pool import initialize_converter_pool
 from langchain_community.vectorstores import Chroma
 
 # 1) Define some example data 
@@ -72,6 +74,8 @@ def update_settings(log_level, vector_search_k, hybrid_weights, cache_expire_day
         settings.VECTOR_SEARCH_K = int(vector_search_k)
         settings.HYBRID_RETRIEVER_WEIGHTS = weights
         settings.CACHE_EXPIRE_DAYS = int(cache_expire_days)
+        # 让缓存清理线程立即按新的过期天数重新调度
+        get_cache_queue_manager().update_config(expire_days=settings.CACHE_EXPIRE_DAYS)
         
         # 更新后处理设置
         post_processing_config["enable_deduplication"] = enable_deduplication
@@ -124,9 +128,45 @@ def create_knowledge_base_config(name, description, embedding_model):
     
     return f"✅ 知识库配置创建功能正在开发中...\n\n配置详情:\n- 名称: {name}\n- 描述: {description}\n- 嵌入模型: {embedding_model}"
 
+def _format_bytes(size: float) -> str:
+    """将字节数格式化为便于阅读的字符串"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+
+def show_cache_stats():
+    """汇总文档缓存的命中率、淘汰与读写耗时，用于根据实际数据调整缓存大小与过期天数"""
+    try:
+        stats = get_cache_stats()
+    except Exception as e:
+        logger.error(f"获取缓存统计时出错: {str(e)}")
+        return f"❌ 获取缓存统计时出错: {str(e)}"
+
+    metrics, queue, memory = stats["metrics"], stats["queue"], stats["memory"]
+    load, save = metrics["load_latency"], metrics["save_latency"]
+    lines = [
+        f"🎯 命中率: {metrics['hit_ratio']:.1%} (内存命中 {metrics['hits']['memory']}, "
+        f"磁盘命中 {metrics['hits']['disk']}, 未命中 {metrics['misses']})",
+        f"🧹 淘汰: 过期 {metrics['evictions']['ttl']} 个 ({_format_bytes(metrics['evicted_bytes']['ttl'])}), "
+        f"超出大小限制 {metrics['evictions']['size']} 个 ({_format_bytes(metrics['evicted_bytes']['size'])})",
+        f"📥 读取: {_format_bytes(metrics['bytes_read'])}, 耗时 p50 {load['p50_ms']:.0f}ms / "
+        f"p95 {load['p95_ms']:.0f}ms / 最大 {load['max_ms']:.0f}ms ({load['count']} 次)",
+        f"📤 写入: {_format_bytes(metrics['bytes_written'])}, 耗时 p50 {save['p50_ms']:.0f}ms / "
+        f"p95 {save['p95_ms']:.0f}ms / 最大 {save['max_ms']:.0f}ms ({save['count']} 次)",
+        f"💾 磁盘缓存: {queue['total_files']} 个文件, {_format_bytes(queue['total_size'])} / "
+        f"{_format_bytes(queue['max_size'])} ({queue['size_utilization']:.1%}), "
+        f"过期天数 {settings.CACHE_EXPIRE_DAYS}, 负责清理: {'是' if queue['is_janitor'] else '否'}",
+        f"🧠 内存缓存: {memory['entries']} 个条目, {_format_bytes(memory['total_size'])} / "
+        f"{_format_bytes(memory['max_bytes'])}, 淘汰 {memory['evictions']} 次",
+    ]
+    return "\n".join(lines)
+
 def main():
     # 初始化缓存队列管理器
     cache_queue_manager = initialize_cache_queue()
+    # 初始化并预热Docling转换器池
+    initialize_converter_pool()
     
     # 创建文档处理器
     processor = DoclingProcessor()
@@ -306,11 +346,14 @@ def main():
                         
                         if state["retriever"] is None or current_hashes != state["file_hashes"]:
                             logger.info("Processing new/changed documents...")
-                            chunks = processor.process(uploaded_files)
                             # 重新创建检索器构建器以应用最新的后处理配置
                             local_retriever_builder = RetrieverBuilder()
-                            # 使用新的build_retriever方法
-                            retriever = local_retriever_builder.build_retriever(chunks)
+                            # 流式构建：每个文件解析完成后立即嵌入，与后续文件的解析重叠进行
+                            # 按文件集合持久化向量，已嵌入过的分块不会再次请求嵌入服务
+                            retriever = local_retriever_builder.build_retriever_streaming(
+                                processor.iter_process(uploaded_files),
+                                file_hashes=current_hashes
+                            )
                             
                             state.update({
                                 "file_hashes": current_hashes,
@@ -428,6 +471,12 @@ def main():
                         )
                         create_kb_btn = gr.Button("➕ 创建知识库配置", variant="primary")
                         kb_config_output = gr.Textbox(label="配置结果", interactive=False)
+
+                with gr.Row():
+                    with gr.Column():
+                        gr.Markdown("## 📊 文档缓存统计")
+                        cache_stats_btn = gr.Button("🔄 刷新缓存统计", variant="secondary")
+                        cache_stats_output = gr.Textbox(label="缓存统计", interactive=False, lines=6)
                 
                 def create_knowledge_base_config(name, description, embedding_model):
                     """创建新的知识库配置"""
@@ -479,12 +528,23 @@ def main():
                     outputs=[kb_config_output]
                 )
                 
+                cache_stats_btn.click(
+                    fn=show_cache_stats,
+                    inputs=[],
+                    outputs=[cache_stats_output]
+                )
+                
                 # 页面加载时自动显示知识库内容
                 demo.load(
                     fn=list_knowledge_base_contents,
                     inputs=[],
                     outputs=[kb_status_output]
                 )
+                demo.load(
+                    fn=show_cache_stats,
+                    inputs=[],
+                    outputs=[cache_stats_output]
+                )
             
             with gr.TabItem("⚙️ 配置管理"):
                 gr.Markdown("# 🛠️ DocChat 配置管理")
@@ -586,11 +646,7 @@ def main():
 
 def _get_file_hashes(uploaded_files: List) -> frozenset:
     """Generate SHA-256 hashes for uploaded files."""
-    hashes = set()
-    for file in uploaded_files:
-        with open(file.name, "rb") as f:
-            hashes.add(hashlib.sha256(f.read()).hexdigest())
-    return frozenset(hashes)
+    return get_fingerprinter().fingerprints(file.name for file in uploaded_files)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,7 +2,7 @@ from pydantic_settings import BaseSettings
 from .constants import MAX_FILE_SIZE, MAX_TOTAL_SIZE, ALLOWED_TYPES
 import os
 from pathlib import Path
-from typing import List
+from typing import List, Literal
 
 def parse_weights(weight_str):
     """解析权重字符串为列表"""
@@ -27,10 +27,23 @@ class Settings(BaseSettings):
     # Database settings
     CHROMA_DB_PATH: str = "./chroma_db"
     CHROMA_COLLECTION_NAME: str = "documents"
+    # 每个知识库按文档集合持久化的向量库集合与BM25索引：最多保留最近使用的文档集合数，
+    # 以及超过该天数未使用的文档集合会被删除（均为0表示不限制）
+    CORPUS_MAX_COUNT: int = 20
+    CORPUS_EXPIRE_DAYS: int = 30
 
     # Retrieval settings - 增加检索的文档数量以提高召回率
     VECTOR_SEARCH_K: int = 20
     HYBRID_RETRIEVER_WEIGHTS: list = [0.2, 0.8]
+    # 混合检索的结果融合方式："rrf"（倒数排名融合）或"minmax"（最小-最大归一化后加权），
+    # 以及融合后最多交给后续环节的分块数（每个检索器各取VECTOR_SEARCH_K个候选）
+    RETRIEVER_FUSION: str = "rrf"
+    RETRIEVER_RRF_K: int = 60
+    RETRIEVER_TOP_K: int = 6
+    # 混合检索中各子检索器（按标记）的超时秒数，超时的检索器不参与本次结果；未列出的标记使用default
+    RETRIEVER_TIMEOUTS: dict = {"bm25": 2.0, "vector": 10.0, "default": 10.0}
+    # 所有混合检索器共用的检索线程数（超时的检索线程无法中断，需要留有余量）
+    RETRIEVER_MAX_WORKERS: int = 16
 
     # Logging settings
     LOG_LEVEL: str = "INFO"
@@ -40,6 +53,18 @@ class Settings(BaseSettings):
     CACHE_EXPIRE_DAYS: int = 7
     # 缓存最大总大小（字节），默认1GB
     MAX_CACHE_SIZE: int = 1024 * 1024 * 1024
+    # 多进程共享缓存目录时，从共享索引同步记录（以及重新竞选清理进程）的间隔（秒）
+    CACHE_INDEX_SYNC_INTERVAL: int = 60
+    # 计算文件哈希时每次读取的块大小（字节），默认1MB
+    HASH_BLOCK_SIZE: int = 1024 * 1024
+    # 文件指纹缓存的最大条目数
+    FINGERPRINT_CACHE_SIZE: int = 4096
+    # 分块缓存文件的压缩算法：none、zlib、lzma，安装zstandard后可用zstd
+    CACHE_COMPRESSION: str = "zlib"
+    # 压缩级别（zlib/lzma为0-9，zstd为1-22）
+    CACHE_COMPRESSION_LEVEL: int = 3
+    # 磁盘缓存之前的进程内分块缓存的最大总大小（字节），默认256MB，为0时禁用
+    MEMORY_CACHE_SIZE: int = 256 * 1024 * 1024
     
     # SiliconFlow settings
     SILICONFLOW_KEY: str = ""
@@ -67,8 +92,35 @@ class Settings(BaseSettings):
     CHROMA_DEFAULT_COLLECTION_NAME: str = "docchat-collection"
     # 解析器相关配置
     PROCESSOR: str = ""
+    # 解析未命中缓存文件时使用的工作进程数，1表示在当前进程中顺序解析
+    PROCESSOR_WORKERS: int = 1
+    # 扫描件按页分片并行转换：每个分片的页数（0表示关闭分片），以及启用分片的最少页数
+    DOCLING_SHARD_PAGES: int = 8
+    DOCLING_SHARD_MIN_PAGES: int = 16
+    # Docling转换器池：每种流水线配置最多保留的转换器数量（即该配置下的最大并发转换数）
+    DOCLING_POOL_SIZE: int = 2
+    # 启动时是否预热转换器（提前加载版面分析与OCR模型）
+    DOCLING_WARMUP: bool = True
+    # OCR识别语言，默认支持简体中文和英文
+    DOCLING_OCR_LANG: list = ["ch_sim", "en"]
+    # OCR模式：auto 仅对没有文本层的页面做OCR，always 所有页面都做OCR，never 不做OCR
+    DOCLING_OCR_MODE: Literal["auto", "always", "never"] = "auto"
+    # 页面非空白字符数达到该值才认为其文本层可用，可跳过OCR
+    DOCLING_TEXT_LAYER_MIN_CHARS: int = 32
     # 检索器相关配置
     RETRIEVER: str = ""
+    # 流式入库：解析与嵌入之间的队列最多缓存的文件数，以及每次写入向量库的分块数
+    # （每次写入的分块再由嵌入执行器拆分为多个并发请求，过小会限制并发）
+    INGEST_QUEUE_SIZE: int = 4
+    INGEST_BATCH_SIZE: int = 512
+    # 嵌入请求：每个请求的文本数上限与估计token预算、同时进行的请求数上限，以及被限流或临时错误时的重试次数
+    EMBEDDING_MAX_BATCH_SIZE: int = 32
+    EMBEDDING_MAX_BATCH_TOKENS: int = 8192
+    EMBEDDING_MAX_IN_FLIGHT: int = 4
+    EMBEDDING_MAX_RETRIES: int = 6
+    # 按内容寻址的嵌入向量缓存目录，所有知识库共用；EMBEDDING_CACHE_ENABLED为False时直接请求嵌入服务
+    EMBEDDING_CACHE_DIR: str = str(PROJECT_ROOT / "embedding_cache")
+    EMBEDDING_CACHE_ENABLED: bool = True
     
     class Config:
         env_file = ".env"
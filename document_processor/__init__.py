@@ -3,4 +3,6 @@
 __all__ = ["DocumentProcessor"]
 
 
+from .base import CHUNK_ID_KEY, assign_chunk_id, chunk_id
 from .docling import DoclingProcessor 
+from .converter_pool import ConverterConfig, ConverterPool, initialize_converter_pool, get_converter_pool
@@ -1,22 +1,88 @@
 # 抽象出一个基类以便于后续的多解析器切换
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 import os
 import hashlib
-import pickle
+import json
+import time
 from pathlib import Path
 from config import constants
 from config.settings import settings
 from utils.cache_queue import get_cache_queue_manager
+from utils.fingerprint import get_fingerprinter
+from utils.memory_cache import get_memory_cache
+from utils.cache_metrics import get_cache_metrics
 from utils.logging import logger
+from langchain_core.documents import Document
+from .cache_format import (CACHE_SUFFIX, FORMAT_VERSION, SUPPORTED_VERSIONS,
+                           CacheFormatError, CachedChunks, write_chunks)
+from .parallel import convert_file_in_worker, create_process_pool, process_file_in_worker
+
+
+# 一级缓存（转换后的markdown）文件名中的标记
+MARKDOWN_CACHE_TAG = ".markdown"
+
+# 记录在缓存清单中的缓存版本，不在可读版本之内的缓存文件视为失效
+CACHE_CONFIG_VERSION = f"chunks-v{FORMAT_VERSION}"
+READABLE_CONFIG_VERSIONS = ("",) + tuple(f"chunks-v{version}" for version in SUPPORTED_VERSIONS)
+
+# 分块元数据中保存稳定分块ID的键
+CHUNK_ID_KEY = "chunk_id"
+
+
+def chunk_id(doc: Document) -> str:
+    """
+    分块的稳定ID：文本内容的SHA-256
+
+    入库时由assign_chunk_id写入metadata，之后向量库、BM25索引与去重都直接读取，
+    缺少该字段的分块（例如旧版本的缓存）才重新计算。
+    """
+    return (doc.metadata or {}).get(CHUNK_ID_KEY) or hashlib.sha256(doc.page_content.encode()).hexdigest()
+
+
+def assign_chunk_id(doc: Document) -> str:
+    """确保分块的metadata中带有稳定ID，并返回该ID"""
+    if doc.metadata is None:
+        doc.metadata = {}
+    doc.metadata[CHUNK_ID_KEY] = chunk_id(doc)
+    return doc.metadata[CHUNK_ID_KEY]
+
+
+class ParseTask(NamedTuple):
+    """未命中缓存、需要解析的文件"""
+    index: int  # 文件在上传列表中的序号
+    file_path: str
+    chunk_path: Path  # 二级缓存（分块列表）路径
+    markdown_path: Optional[Path]  # 一级缓存（转换结果）路径，不使用一级缓存时为None
 
 
 class BaseDocumentProcessor(ABC):
-    def __init__(self):
+    # 仅在当前进程内有效的属性，序列化到解析进程时需要去掉
+    _process_local_attrs = ("cache_queue", "memory_cache", "_process_pool")
+
+    def __init__(self, max_workers: int = None):
         self.cache_dir = Path(settings.CACHE_DIR)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.cache_queue = get_cache_queue_manager()
+        self.memory_cache = get_memory_cache()
+        self.max_workers = max_workers
+        self._process_pool = None
+
+    def __getstate__(self):
+        """序列化处理器时去掉锁、线程、子进程池等进程内资源"""
+        state = self.__dict__.copy()
+        for name in self._process_local_attrs:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cache_queue = None  # 工作进程只负责解析，缓存由主进程维护
+        self.memory_cache = None
+        self._process_pool = None
         
     def validate_files(self, files: List) -> None:
         """验证上传的文件的大小是否超出限制"""
@@ -25,69 +91,372 @@ class BaseDocumentProcessor(ABC):
             raise ValueError(f"Total size exceeds {constants.MAX_TOTAL_SIZE//1024//1024}MB limit")
     
     def process(self, files: List) -> List:
-        """通用处理流程，包含缓存机制"""
+        """
+        通用处理流程，包含两级缓存机制
+
+        一级缓存保存文件转换后的markdown，键为文件内容哈希与转换配置；
+        二级缓存保存分块列表，键在此基础上再加上分块配置。
+        只修改分块配置时可以直接复用一级缓存，跳过耗时的文档转换。
+        """
+        return [chunk for chunks in self.iter_process(files) for chunk in chunks]
+
+    def iter_process(self, files: List) -> Iterator[List]:
+        """
+        流式处理文件，每个文件处理完成后立即产出其（跨文件去重后的）分块
+
+        先在主进程中计算哈希并检查缓存，需要转换的文件交给_parse_files解析
+        （工作进程数大于1时并行解析）。结果按上传顺序产出：前面的文件都完成后
+        即可产出，不必等待整批文件，因此下游可以一边嵌入已完成的分块一边等待后续文件；
+        去重也按上传顺序进行，输出与并行度无关。单个文件失败只会跳过该文件。
+
+        Yields:
+            每个文件新增的分块列表
+        """
         self.validate_files(files)
-        all_chunks = []
-        seen_hashes = set()
-        
-        for file in files:
+        file_chunks = [None] * len(files)  # 按上传顺序保存每个文件的分块
+        finished = [False] * len(files)
+        pending = []  # 需要解析的文件
+
+        for index, file in enumerate(files):
+            finished[index] = True
             try:
-                # Generate content-based hash for caching
-                with open(file.name, "rb") as f:
-                    file_hash = self._generate_hash(f.read())
-                cache_path = self.cache_dir / f"{file_hash}.pkl"
-                if self._is_cache_valid(cache_path): # 如果缓存存在则从缓存处加载，而不需要重新解析
+                # Generate content-based hash for caching（与会话变更检测共用指纹服务的结果）
+                file_hash = get_fingerprinter().fingerprint(file.name)
+                chunk_path = self._cache_path(self._chunk_cache_key(file_hash, file.name))
+                chunks = self._lookup_cache(chunk_path)
+                if chunks is not None: # 如果缓存存在则从缓存处加载，而不需要重新解析
                     logger.info(f"Loading from cache: {file.name}")
-                    chunks = self._load_from_cache(cache_path)
-                else:
-                    logger.info(f"Processing and caching: {file.name}")
-
-                    chunks = self._process_file(file.name)
-                    self._save_to_cache(chunks, cache_path)
-
-                # Deduplicate chunks across files
-                for chunk in chunks:
-                    chunk_hash = self._generate_hash(chunk.page_content.encode())
-                    if chunk_hash not in seen_hashes:
-                        all_chunks.append(chunk)
-                        seen_hashes.add(chunk_hash)
-                        
+                    file_chunks[index] = chunks
+                    continue
+
+                markdown_path = None
+                if self._uses_conversion_cache(file.name):
+                    markdown_path = self._cache_path(self._conversion_cache_key(file_hash, file.name), MARKDOWN_CACHE_TAG)
+                    markdown = self._lookup_markdown(markdown_path)
+                    if markdown is not None: # 只需要重新分块
+                        logger.info(f"Re-chunking cached conversion: {file.name}")
+                        file_chunks[index] = self._store_chunks(file.name, chunk_path, self._split_markdown(markdown, file.name))
+                        continue
+
+                logger.info(f"Processing and caching: {file.name}")
+                pending.append(ParseTask(index, file.name, chunk_path, markdown_path))
+                finished[index] = False
             except Exception as e:
                 logger.error(f"Failed to process {file.name}: {str(e)}")
-                continue
+
+        # Deduplicate chunks across files（按分块ID，旧缓存中没有ID的分块在此补上）
+        seen_ids = set()
+        total_chunks = 0
+        next_index = 0  # 下一个待产出的文件序号
+
+        def emit_ready():
+            nonlocal next_index, total_chunks
+            while next_index < len(files) and finished[next_index]:
+                unique_chunks = []
+                for chunk in file_chunks[next_index] or []:
+                    chunk_key = assign_chunk_id(chunk)
+                    if chunk_key not in seen_ids:
+                        unique_chunks.append(chunk)
+                        seen_ids.add(chunk_key)
+                file_chunks[next_index] = None  # 已产出，释放引用
+                next_index += 1
+                if unique_chunks:
+                    total_chunks += len(unique_chunks)
+                    yield unique_chunks
+
+        yield from emit_ready()
+        for task, result in self._parse_files(pending):
+            try:
+                if result is None:
+                    chunks = None
+                elif task.markdown_path is None:
+                    chunks = self._store_chunks(task.file_path, task.chunk_path, result)
+                else:
+                    self._store_markdown(task.file_path, task.markdown_path, result)
+                    chunks = self._store_chunks(task.file_path, task.chunk_path,
+                                                self._split_markdown(result, task.file_path))
+                file_chunks[task.index] = chunks
+            except Exception as e:
+                logger.error(f"Failed to process {task.file_path}: {str(e)}")
+            finished[task.index] = True
+            yield from emit_ready()
                 
-        logger.info(f"Total unique chunks: {len(all_chunks)}")
-        return all_chunks
+        logger.info(f"Total unique chunks: {total_chunks}")
+
+    def _store_chunks(self, file_path: str, chunk_path: Path, chunks: List) -> List:
+        """为分块分配稳定ID后保存到二级缓存，缓存失败不影响本次处理结果"""
+        for chunk in chunks:
+            assign_chunk_id(chunk)
+        try:
+            self._save_to_cache(chunks, chunk_path)
+        except Exception as e:
+            logger.error(f"Failed to cache {file_path}: {str(e)}")
+        return chunks
+
+    def _store_markdown(self, file_path: str, markdown_path: Path, markdown: str):
+        """保存转换结果到一级缓存，缓存失败不影响本次处理结果"""
+        try:
+            self._save_to_cache([Document(page_content=markdown)], markdown_path)
+        except Exception as e:
+            logger.error(f"Failed to cache conversion of {file_path}: {str(e)}")
+
+    def _lookup_markdown(self, markdown_path: Path) -> Optional[str]:
+        """查找一级缓存中的markdown，未命中返回None"""
+        chunks = self._lookup_cache(markdown_path, record=False)
+        if chunks is None:
+            return None
+        return chunks[0].page_content if len(chunks) else ""
+
+    def _cache_path(self, cache_key: str, tag: str = "") -> Path:
+        """根据缓存键生成缓存文件路径"""
+        return self.cache_dir / f"{cache_key}{tag}{CACHE_SUFFIX}"
+
+    def _conversion_cache_key(self, file_hash: str, file_path: str) -> str:
+        """一级缓存（转换结果）的键：文件内容哈希 + 转换配置"""
+        return self._signature_hash({
+            "content": file_hash,
+            "converter": self.converter_signature(file_path),
+        })
+
+    def _chunk_cache_key(self, file_hash: str, file_path: str) -> str:
+        """二级缓存（分块列表）的键：文件内容哈希 + 转换配置 + 分块配置"""
+        return self._signature_hash({
+            "content": file_hash,
+            "converter": self.converter_signature(file_path),
+            "splitter": self.splitter_signature(),
+        })
+
+    def _signature_hash(self, signature: Dict) -> str:
+        return self._generate_hash(json.dumps(signature, sort_keys=True, ensure_ascii=False, default=str).encode())
+
+    def converter_signature(self, file_path: str) -> Dict:
+        """
+        影响文件转换结果的配置，用于生成缓存键，子类应当覆盖
+
+        Args:
+            file_path: 文件路径，不同类型的文件可能走不同的转换流程
+        """
+        return {"processor": type(self).__name__}
+
+    def splitter_signature(self) -> Dict:
+        """影响分块结果的配置，用于生成缓存键，子类应当覆盖"""
+        return {}
+
+    def _uses_conversion_cache(self, file_path: str) -> bool:
+        """该文件是否先转换为markdown再分块（从而可以使用一级缓存），由子类按需实现"""
+        return False
+
+    @abstractmethod
+    def _convert_file(self, file_path: str) -> str:
+        """将单个文件转换为markdown（_uses_conversion_cache返回True的文件先转换再分块）"""
+        pass
+
+    @abstractmethod
+    def _split_markdown(self, markdown: str, file_path: str) -> List[Any]:
+        """将_convert_file得到的markdown分块"""
+        pass
+
+    def _get_max_workers(self) -> int:
+        """解析使用的工作进程数，1表示在当前进程中顺序解析"""
+        return max(1, self.max_workers or settings.PROCESSOR_WORKERS)
+
+    def _get_process_pool(self):
+        """获取（必要时创建）解析进程池，进程池在多次调用之间复用以保持工作进程中的模型常驻"""
+        if self._process_pool is None:
+            self._process_pool = create_process_pool(self, self._get_max_workers())
+        return self._process_pool
+
+    def shutdown(self):
+        """关闭解析进程池"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(cancel_futures=True)
+            self._process_pool = None
+
+    def _run_task(self, task: "ParseTask") -> Any:
+        """在当前进程中执行解析任务：需要一级缓存的文件只做转换，其余文件直接解析为分块"""
+        if task.markdown_path is None:
+            return self._process_file(task.file_path)
+        return self._convert_file(task.file_path)
+
+    def _parse_files(self, pending: List["ParseTask"]) -> Iterator[Tuple["ParseTask", Any]]:
+        """
+        解析未命中缓存的文件
+
+        Args:
+            pending: 解析任务列表
+
+        Yields:
+            每个任务的 (任务, 结果)，按完成顺序产出；结果为转换后的markdown
+            （使用一级缓存的任务）或分块列表，解析失败时为None
+        """
+        if len(pending) <= 1 or self._get_max_workers() <= 1:
+            for task in pending:
+                try:
+                    result = self._run_task(task)
+                except Exception as e:
+                    logger.error(f"Failed to process {task.file_path}: {str(e)}")
+                    result = None
+                yield task, result
+            return
+
+        pool = self._get_process_pool()
+        futures = {
+            pool.submit(process_file_in_worker if task.markdown_path is None else convert_file_in_worker,
+                        task.file_path): task
+            for task in pending
+        }
+        for future in as_completed(futures):
+            task = futures[future]
+            result = None
+            try:
+                result, stats = future.result()
+                self._merge_worker_stats(stats)
+            except BrokenProcessPool as e:
+                # 工作进程异常退出后进程池不可再用，丢弃以便下次重新创建
+                logger.error(f"Failed to process {task.file_path}: worker process died ({str(e)})")
+                self._process_pool = None
+            except Exception as e:
+                logger.error(f"Failed to process {task.file_path}: {str(e)}")
+            yield task, result
     
+    def _drain_worker_stats(self) -> Dict:
+        """返回并清零工作进程中累计的统计计数，由子类按需实现"""
+        return {}
+
+    def _merge_worker_stats(self, stats: Dict):
+        """将工作进程返回的统计计数合并到当前进程，由子类按需实现"""
+        pass
+
     def _generate_hash(self, content: bytes) -> str:
         """生成内容的哈希值"""
         return hashlib.sha256(content).hexdigest()
     
+    def _lookup_cache(self, cache_path: Path, record: bool = True) -> Optional[Sequence]:
+        """
+        查找文件对应的缓存
+
+        无法识别的缓存文件视为未命中并删除。旧版本以文件哈希为键的pickle缓存不含转换与分块配置，
+        无法确认是否与当前配置一致，因此不再读取，由清理线程在过期后删除。
+
+        Args:
+            cache_path: 缓存文件路径
+            record: 是否计入命中率指标。每个文件只按分块缓存（二级）的结果计一次，
+                一级markdown缓存的查找不计入，否则冷文件会被计为两次未命中
+
+        Returns:
+            命中时返回分块序列，否则返回None
+        """
+        tier = "memory"
+        chunks = self._lookup_memory(cache_path)
+        if chunks is None:
+            tier = "disk"
+            chunks = self._lookup_disk(cache_path)
+
+        if record:
+            metrics = get_cache_metrics()
+            if chunks is None:
+                metrics.record_miss()
+            else:
+                metrics.record_hit(tier)
+        return chunks
+
+    def _lookup_disk(self, cache_path: Path) -> Optional[Sequence]:
+        """查找磁盘缓存，未命中返回None"""
+        if self._is_cache_valid(cache_path):
+            try:
+                return self._load_from_cache(cache_path)
+            except FileNotFoundError:
+                # 已被其他进程的清理删除（或清单记录已过时），视为未命中并修正清单
+                logger.debug(f"Cache file removed before it could be read: {cache_path}")
+                self.cache_queue.remove_file(str(cache_path))
+                return None
+            except CacheFormatError as e:
+                logger.warning(f"Ignoring unreadable cache file: {e}")
+                self._discard_cache_file(cache_path)
+                return None
+        return None
+
+    def _lookup_memory(self, cache_path: Path) -> Optional[Sequence]:
+        """
+        查找内存缓存，命中时不需要重新打开与解压缓存文件
+
+        同时刷新磁盘缓存的过期时间，使常用文档的磁盘缓存与内存缓存一起保留；
+        访问记录延迟到同步缓存清单时批量写入，命中时不访问磁盘。
+        缓存的是已读入内存的CachedChunks，每次访问都构建新的Document，调用方修改元数据不会影响缓存。
+        """
+        chunks = self.memory_cache.get(str(cache_path))
+        if chunks is None:
+            return None
+        self.cache_queue.touch_file(str(cache_path), defer=True)
+        return chunks
+
+    def _fits_memory(self, cache_path: Path) -> bool:
+        """缓存文件能否放入内存缓存，能放入的文件直接读入内存而不是映射"""
+        try:
+            return os.path.getsize(cache_path) <= self.memory_cache.max_bytes
+        except OSError:
+            return False
+
+    def _remember(self, cache_path: Path, chunks: CachedChunks):
+        """
+        将以in_memory模式打开的缓存文件放入内存缓存
+
+        保存的是按需构建Document的只读视图而不是Document列表，放入内存缓存不会破坏列式格式的延迟加载；
+        实例不持有mmap与文件描述符，被淘汰后直接释放。按数据段占用的内存（文件内容或解压后的数据）计入字节预算。
+        """
+        self.memory_cache.put(str(cache_path), chunks, chunks.resident_bytes)
+
+    def _discard_cache_file(self, cache_path: Path):
+        """删除缓存文件并将其移出清理队列与内存缓存"""
+        self.memory_cache.invalidate(str(cache_path))
+        self.cache_queue.remove_file(str(cache_path))
+        try:
+            cache_path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(f"Failed to remove cache file {cache_path}: {e}")
+
     def _save_to_cache(self, chunks: List, cache_path: Path):
-        """保存处理结果到缓存"""
-        with open(cache_path, "wb") as f:
-            pickle.dump({
-                "timestamp": datetime.now().timestamp(),
-                "chunks": chunks
-            }, f)
+        """保存处理结果到缓存（列式格式，按配置压缩），队列按压缩后的文件大小计入总大小"""
+        start = time.perf_counter()
+        nbytes = write_chunks(cache_path, chunks, codec=settings.CACHE_COMPRESSION, level=settings.CACHE_COMPRESSION_LEVEL)
+        get_cache_metrics().record_save(time.perf_counter() - start, nbytes)
         # 将新创建的缓存文件添加到队列管理器中
-        self.cache_queue.add_file(str(cache_path))
-        
-    def _load_from_cache(self, cache_path: Path) -> List:
-        """从缓存加载处理结果"""
-        # 当从缓存加载文件时，移除它以免被过早删除
-        self.cache_queue.remove_file(str(cache_path))
-        
-        with open(cache_path, "rb") as f:
-            data = pickle.load(f)
-        return data["chunks"]
+        self.cache_queue.add_file(str(cache_path), CACHE_CONFIG_VERSION)
+        try:
+            if self._fits_memory(cache_path):
+                self._remember(cache_path, CachedChunks(cache_path, in_memory=True))
+        except (OSError, CacheFormatError) as e:
+            logger.debug(f"Failed to keep {cache_path} in memory cache: {e}")
         
+    def _load_from_cache(self, cache_path: Path) -> Sequence:
+        """从磁盘缓存加载处理结果，返回按需构建Document的只读序列，并放入内存缓存"""
+        start = time.perf_counter()
+        in_memory = self._fits_memory(cache_path)
+        chunks = CachedChunks(cache_path, in_memory=in_memory)
+        # 读取耗时包括读取（或映射）与解压，Document在访问时才构建
+        get_cache_metrics().record_load(time.perf_counter() - start, chunks.nbytes)
+        if in_memory:
+            self._remember(cache_path, chunks)
+        # 命中缓存时刷新其过期时间与最近使用顺序，避免常用的文件被过早删除
+        self.cache_queue.touch_file(str(cache_path))
+        return chunks
+
     def _is_cache_valid(self, cache_path: Path) -> bool:
-        """检查缓存是否有效"""
-        if not cache_path.exists():
+        """
+        检查缓存是否有效
+
+        优先查询缓存清单，无需访问文件系统；清单之外的文件按修改时间判断，
+        命中后会被登记到清单中。
+        """
+        entry = self.cache_queue.lookup(str(cache_path))
+        if entry is not None:
+            return entry.config_version in READABLE_CONFIG_VERSIONS
+        try:
+            mtime = cache_path.stat().st_mtime
+        except FileNotFoundError:
             return False
             
-        cache_age = datetime.now() - datetime.fromtimestamp(cache_path.stat().st_mtime)
+        cache_age = datetime.now() - datetime.fromtimestamp(mtime)
         return cache_age < timedelta(days=settings.CACHE_EXPIRE_DAYS)
 
     @abstractmethod
@@ -0,0 +1,288 @@
+# 文档分块缓存的列式存储格式
+#
+# 相比直接pickle整个Document列表，列式格式把所有分块文本拼接成一段连续的UTF-8数据，
+# 用偏移量数组定位每个分块；元数据编码为紧凑的JSON并去重。读取时通过mmap打开文件，
+# 只解析固定长度的文件头，Document在访问时才构建，命中缓存时无需反序列化成千上万个对象。
+#
+# 文件布局（小端序，各段均按8字节对齐）:
+#   文件头      magic(8) version(u16) flags(u16) count(u32) meta_count(u32) reserved(u32)
+#               created(f64) text_size(u64) meta_size(u64)
+#   文本偏移    (count + 1) 个 u64
+#   元数据偏移  (meta_count + 1) 个 u64
+#   元数据索引  count 个 u32，指向去重后的元数据
+#   文本数据    text_size 字节
+#   元数据数据  meta_size 字节
+#
+# 第2版在flags的低4位记录压缩算法。启用压缩时，文本数据与元数据数据（含中间的对齐填充）
+# 作为一整段压缩后写到文件末尾，读取时一次性解压到内存；偏移量数组不压缩，仍然直接从mmap读取。
+# text_size与meta_size始终是未压缩的大小。
+import json
+import lzma
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, List
+from langchain_core.documents import Document
+
+try:
+    import zstandard
+except ImportError:  # zstd为可选依赖
+    zstandard = None
+
+MAGIC = b"DCCHUNK\x00"
+FORMAT_VERSION = 2
+# 可以读取的格式版本（第1版没有压缩）
+SUPPORTED_VERSIONS = (1, 2)
+# 缓存文件后缀，旧版本的pickle缓存使用 .pkl
+CACHE_SUFFIX = ".chunks"
+LEGACY_CACHE_SUFFIX = ".pkl"
+
+_HEADER = struct.Struct("<8sHHIII dQQ")
+
+
+class CacheFormatError(ValueError):
+    """缓存文件不是当前版本的列式格式（或已损坏）"""
+
+
+# 压缩算法 -> flags中的编号
+CODECS = {"none": 0, "zlib": 1, "lzma": 2, "zstd": 3}
+_CODEC_MASK = 0x000F
+
+
+def available_codecs() -> List[str]:
+    """当前环境可用的压缩算法"""
+    return [codec for codec in CODECS if codec != "zstd" or zstandard is not None]
+
+
+def _compress(codec: str, data: bytes, level: int) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if codec == "lzma":
+        return lzma.compress(data, preset=level)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return data
+
+
+def _decompress(codec_id: int, data) -> bytes:
+    if codec_id == CODECS["zlib"]:
+        return zlib.decompress(data)
+    if codec_id == CODECS["lzma"]:
+        return lzma.decompress(data)
+    if codec_id == CODECS["zstd"]:
+        if zstandard is None:
+            raise CacheFormatError("Cache file is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise CacheFormatError(f"Unknown cache compression codec {codec_id}")
+
+
+def _pad(size: int) -> int:
+    """对齐到8字节需要补充的字节数"""
+    return -size % 8
+
+
+def _encode_metadata(metadata: Dict) -> bytes:
+    return json.dumps(metadata, ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=str).encode("utf-8")
+
+
+def write_chunks(path, chunks: Iterable[Document], created: float = None, codec: str = "none", level: int = 3):
+    """
+    将分块列表写入列式缓存文件
+
+    先写入同一目录下的临时文件，完成后通过rename原子地替换目标文件，
+    其他进程（或线程）只会看到完整的旧文件或新文件，不会读到写了一半的缓存。
+
+    Args:
+        path: 缓存文件路径
+        chunks: Document列表
+        created: 缓存创建时间戳，默认为当前时间
+        codec: 压缩算法，可选none、zlib、lzma、zstd（需安装zstandard）
+        level: 压缩级别
+
+    Returns:
+        写入的文件大小（字节）
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown cache compression codec: {codec}")
+    if codec not in available_codecs():
+        raise ValueError(f"Cache compression codec {codec} is not available, install zstandard")
+
+    text_offsets = array("Q", [0])
+    meta_offsets = array("Q", [0])
+    meta_index = array("I")
+    meta_ids: Dict[bytes, int] = {}
+    text_parts: List[bytes] = []
+    meta_parts: List[bytes] = []
+
+    for chunk in chunks:
+        text = chunk.page_content.encode("utf-8")
+        text_parts.append(text)
+        text_offsets.append(text_offsets[-1] + len(text))
+
+        meta = _encode_metadata(chunk.metadata or {})
+        if meta not in meta_ids:
+            meta_ids[meta] = len(meta_parts)
+            meta_parts.append(meta)
+            meta_offsets.append(meta_offsets[-1] + len(meta))
+        meta_index.append(meta_ids[meta])
+
+    count = len(text_parts)
+    payload = None
+    if codec != "none":
+        payload = _compress(codec, b"".join(text_parts) + b"\0" * _pad(text_offsets[-1]) + b"".join(meta_parts), level)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, CODECS[codec], count, len(meta_parts), 0,
+                          created if created is not None else time.time(),
+                          text_offsets[-1], meta_offsets[-1])
+    directory, name = os.path.split(os.fspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or None)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(text_offsets.tobytes())
+            f.write(meta_offsets.tobytes())
+            f.write(meta_index.tobytes())
+            f.write(b"\0" * _pad(len(meta_index) * meta_index.itemsize))
+            if payload is not None:
+                f.write(payload)
+            else:
+                for text in text_parts:
+                    f.write(text)
+                f.write(b"\0" * _pad(text_offsets[-1]))
+                for meta in meta_parts:
+                    f.write(meta)
+            nbytes = f.tell()
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    return nbytes
+
+
+class CachedChunks(Sequence):
+    """
+    基于mmap的只读分块序列
+
+    按下标访问时才解码对应分块的文本并构建Document，每次访问都返回新的Document，
+    调用方修改元数据不会影响缓存内容。压缩的缓存文件在打开时解压数据段，偏移量仍从mmap读取。
+    常驻内存缓存的实例以in_memory=True打开，把文件读入内存而不保留mmap（及其文件描述符），
+    被淘汰时随垃圾回收释放。
+    """
+
+    def __init__(self, path, in_memory: bool = False):
+        """
+        打开列式缓存文件
+
+        Args:
+            path: 缓存文件路径
+            in_memory: 为True时一次读入整个文件，打开后不占用文件描述符
+
+        Raises:
+            CacheFormatError: 文件不是当前版本的列式格式
+        """
+        self._mmap = None
+        with open(path, "rb") as f:
+            if in_memory:
+                self._buffer = f.read()
+            else:
+                try:
+                    self._mmap = self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError as e:  # 空文件无法映射
+                    raise CacheFormatError(f"Empty cache file: {path}") from e
+        try:
+            self._open(path)
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self, path):
+        if len(self._buffer) < _HEADER.size:
+            raise CacheFormatError(f"Truncated cache file: {path}")
+        (magic, version, flags, count, meta_count, _reserved,
+         self.created, text_size, meta_size) = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise CacheFormatError(f"Not a chunk cache file: {path}")
+        if version not in SUPPORTED_VERSIONS:
+            raise CacheFormatError(f"Unsupported chunk cache version {version}: {path}")
+        codec_id = flags & _CODEC_MASK if version >= 2 else 0
+
+        position = _HEADER.size
+        sections = []
+        for itemsize, length in ((8, count + 1), (8, meta_count + 1), (4, count)):
+            size = itemsize * length
+            sections.append((position, size))
+            position += size + _pad(size)
+        if position > len(self._buffer):
+            raise CacheFormatError(f"Truncated cache file: {path}")
+        payload, text_start = None, position
+        if codec_id:
+            try:
+                payload = _decompress(codec_id, self._buffer[position:])
+            except CacheFormatError:
+                raise
+            except Exception as e:  # zlib.error、lzma.LZMAError、zstandard.ZstdError等
+                raise CacheFormatError(f"Corrupt compressed cache file {path}: {e}") from e
+            text_start = 0
+        meta_start = text_start + text_size + _pad(text_size)
+        if meta_start + meta_size > (len(self._buffer) if payload is None else len(payload)):
+            raise CacheFormatError(f"Truncated cache file: {path}")
+
+        # 校验全部通过后才创建memoryview，失败时不会留下阻止关闭mmap的导出
+        view = memoryview(self._buffer)
+        data = view if payload is None else memoryview(payload)
+        self.nbytes = len(self._buffer)  # 文件大小，即命中时从磁盘读取的字节数
+        self.resident_bytes = len(data)  # 数据段占用的内存：映射的文件或解压后的数据
+        self._view = view
+        self._data = data
+        self._text_offsets, self._meta_offsets, self._meta_index = (
+            view[start:start + size].cast(fmt) for (start, size), fmt in zip(sections, ("Q", "Q", "I")))
+        self._text = data[text_start:text_start + text_size]
+        self._meta = data[meta_start:meta_start + meta_size]
+        self._meta_cache: Dict[int, Dict] = {}
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def text(self, index: int) -> str:
+        """获取指定分块的文本"""
+        return str(self._text[self._text_offsets[index]:self._text_offsets[index + 1]], "utf-8")
+
+    def metadata(self, index: int) -> Dict:
+        """获取指定分块的元数据（返回副本）"""
+        meta_id = self._meta_index[index]
+        if meta_id not in self._meta_cache:
+            raw = self._meta[self._meta_offsets[meta_id]:self._meta_offsets[meta_id + 1]]
+            self._meta_cache[meta_id] = json.loads(str(raw, "utf-8"))
+        return dict(self._meta_cache[meta_id])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("chunk index out of range")
+        return Document(page_content=self.text(index), metadata=self.metadata(index))
+
+    def close(self):
+        """释放内存映射（in_memory模式下只释放视图）"""
+        for name in ("_text_offsets", "_meta_offsets", "_meta_index", "_text", "_meta", "_data", "_view"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        if self._mmap is not None and not self._mmap.closed:
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
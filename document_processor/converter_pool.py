@@ -0,0 +1,220 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from threading import Condition
+from typing import Dict, Iterable, List, Tuple
+from docling.datamodel.base_models import InputFormat
+from docling.document_converter import DocumentConverter, PdfFormatOption
+from docling.datamodel.pipeline_options import PdfPipelineOptions, EasyOcrOptions
+from config.settings import settings
+from utils.logging import logger
+
+
+@dataclass(frozen=True)
+class ConverterConfig:
+    """
+    Docling转换流水线的配置，同时作为转换器池的键
+
+    相同配置的转换器可以互相替换，因此池中按配置分组保存
+    """
+    do_ocr: bool = True
+    ocr_lang: Tuple[str, ...] = ("ch_sim", "en")
+
+    @classmethod
+    def from_settings(cls) -> "ConverterConfig":
+        """根据全局配置生成默认的流水线配置"""
+        return cls(ocr_lang=tuple(settings.DOCLING_OCR_LANG))
+
+    @classmethod
+    def default_configs(cls) -> List["ConverterConfig"]:
+        """根据OCR模式返回需要预热的配置：auto模式下带OCR与不带OCR的流水线都会用到"""
+        config = cls.from_settings()
+        if settings.DOCLING_OCR_MODE == "never":
+            return [replace(config, do_ocr=False)]
+        if settings.DOCLING_OCR_MODE == "auto":
+            return [config, replace(config, do_ocr=False)]
+        return [config]
+
+    def build(self) -> DocumentConverter:
+        """按当前配置构建一个新的DocumentConverter（尚未加载模型）"""
+        pipeline_options = PdfPipelineOptions()
+        pipeline_options.do_ocr = self.do_ocr
+        pipeline_options.ocr_options = EasyOcrOptions(lang=list(self.ocr_lang))
+        return DocumentConverter(format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+        })
+
+
+class PooledConverter:
+    """池中的单个转换器，记录其是否已经加载过模型"""
+
+    def __init__(self, converter: DocumentConverter):
+        self.converter = converter
+        self.warm = False  # 模型是否已加载（预热或完成过一次转换）
+        self.uses = 0
+
+
+class ConverterPool:
+    """
+    进程内共享的Docling转换器池
+
+    DocumentConverter首次使用时会加载版面分析与EasyOCR模型，这一步往往比转换一个
+    小文件还慢。转换器池按流水线配置缓存已初始化的转换器，供并发请求借用和归还，
+    每种配置最多同时存在max_per_config个转换器，超过时借用方会等待空闲的转换器。
+    """
+
+    def __init__(self, max_per_config: int = None):
+        """
+        初始化转换器池
+
+        Args:
+            max_per_config: 每种配置最多创建的转换器数量，即该配置下的最大并发转换数
+        """
+        self.max_per_config = max(1, max_per_config or settings.DOCLING_POOL_SIZE)
+        self._idle: Dict[ConverterConfig, List[PooledConverter]] = {}
+        self._created: Dict[ConverterConfig, int] = {}
+        self._in_use: Dict[ConverterConfig, int] = {}
+        self._cold_starts: Dict[ConverterConfig, int] = {}
+        self._cond = Condition()
+
+    def _checkout(self, config: ConverterConfig) -> PooledConverter:
+        """借出一个转换器，必要时创建新的转换器或等待其他请求归还"""
+        with self._cond:
+            while True:
+                idle = self._idle.setdefault(config, [])
+                if idle:
+                    # 优先借出已预热的转换器
+                    idle.sort(key=lambda pooled: pooled.warm)
+                    pooled = idle.pop()
+                    self._in_use[config] = self._in_use.get(config, 0) + 1
+                    return pooled
+                if self._created.get(config, 0) < self.max_per_config:
+                    # 先占位，在锁外构建转换器，避免阻塞其他配置的借用
+                    self._created[config] = self._created.get(config, 0) + 1
+                    self._in_use[config] = self._in_use.get(config, 0) + 1
+                    break
+                self._cond.wait()
+
+        try:
+            return PooledConverter(config.build())
+        except Exception:
+            with self._cond:
+                self._created[config] -= 1
+                self._in_use[config] -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, config: ConverterConfig, pooled: PooledConverter):
+        """归还转换器"""
+        with self._cond:
+            self._idle.setdefault(config, []).append(pooled)
+            self._in_use[config] -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def acquire(self, config: ConverterConfig = None):
+        """
+        借用一个转换器，离开上下文时自动归还
+
+        Args:
+            config: 流水线配置，默认使用全局配置
+
+        Yields:
+            PooledConverter，其warm属性表示借出时模型是否已经加载
+        """
+        config = config or ConverterConfig.from_settings()
+        pooled = self._checkout(config)
+        if not pooled.warm:
+            with self._cond:
+                self._cold_starts[config] = self._cold_starts.get(config, 0) + 1
+        try:
+            yield pooled
+        finally:
+            # 无论转换是否成功，模型都已经加载过了
+            pooled.warm = True
+            pooled.uses += 1
+            self._checkin(config, pooled)
+
+    def warmup(self, configs: Iterable[ConverterConfig] = None, count: int = 1):
+        """
+        预先创建转换器并加载模型
+
+        Args:
+            configs: 需要预热的配置列表，默认按OCR模式预热全局配置
+            count: 每种配置预热的转换器数量（不超过max_per_config）
+        """
+        configs = list(configs) if configs else ConverterConfig.default_configs()
+        count = min(max(1, count), self.max_per_config)
+        for config in configs:
+            checked_out = []
+            try:
+                for _ in range(count):
+                    pooled = self._checkout(config)
+                    checked_out.append(pooled)
+                    if pooled.warm:
+                        continue
+                    start = time.perf_counter()
+                    pooled.converter.initialize_pipeline(InputFormat.PDF)
+                    pooled.warm = True
+                    logger.info(f"Warmed up Docling converter {config} in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logger.error(f"Failed to warm up Docling converter {config}: {e}")
+            finally:
+                for pooled in checked_out:
+                    self._checkin(config, pooled)
+
+    def is_warm(self, config: ConverterConfig = None) -> bool:
+        """判断该配置下是否存在已加载模型的空闲转换器"""
+        config = config or ConverterConfig.from_settings()
+        with self._cond:
+            return any(pooled.warm for pooled in self._idle.get(config, []))
+
+    def get_pool_stats(self) -> Dict:
+        """
+        获取转换器池的统计信息
+
+        Returns:
+            以配置描述为键的字典，包含创建数、空闲数、借出数、已预热数与冷启动次数
+        """
+        with self._cond:
+            stats = {}
+            for config, created in self._created.items():
+                idle = self._idle.get(config, [])
+                stats[repr(config)] = {
+                    "created": created,
+                    "idle": len(idle),
+                    "in_use": self._in_use.get(config, 0),
+                    "warm_idle": sum(1 for pooled in idle if pooled.warm),
+                    "cold_starts": self._cold_starts.get(config, 0),
+                }
+            return stats
+
+
+# 全局实例
+converter_pool = None
+
+def initialize_converter_pool(warmup: bool = None):
+    """
+    初始化全局转换器池，并按配置在启动时预热
+
+    Args:
+        warmup: 是否预热默认配置的转换器，默认读取settings.DOCLING_WARMUP
+    """
+    global converter_pool
+    if converter_pool is None:
+        converter_pool = ConverterPool()
+        if settings.DOCLING_WARMUP if warmup is None else warmup:
+            converter_pool.warmup()
+    return converter_pool
+
+def get_converter_pool():
+    """
+    获取全局转换器池实例
+
+    Returns:
+        ConverterPool实例
+    """
+    global converter_pool
+    if converter_pool is None:
+        converter_pool = initialize_converter_pool(warmup=False)
+    return converter_pool
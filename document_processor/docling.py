@@ -1,18 +1,27 @@
+import time
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
 from pathlib import Path
-from typing import List, Any
-from docling.datamodel.base_models import InputFormat
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.datamodel.pipeline_options import PdfPipelineOptions, EasyOcrOptions
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
 from langchain_text_splitters import MarkdownHeaderTextSplitter
 from langchain_core.documents import Document
 from config.settings import settings
 from utils.logging import logger
 from utils.cache_queue import get_cache_queue_manager
+from utils.memory_cache import get_memory_cache
 from .base import BaseDocumentProcessor
+from .converter_pool import ConverterConfig, get_converter_pool
+from .parallel import convert_in_worker, in_worker
+from .text import TEXT_FILE_TYPES, split_text_file
+from .pdf_utils import count_pdf_pages, page_ranges, probe_text_layer, split_pdf
 
 
 class DoclingProcessor(BaseDocumentProcessor):
-    def __init__(self):
+    _process_local_attrs = BaseDocumentProcessor._process_local_attrs + ("converter_pool", "ocr_counter")
+
+    def __init__(self, max_workers: int = None):
         # 增加更多层级的标题分块以提高召回率
         self.headers = [("#", "Header 1"), ("##", "Header 2"), ("###", "Header 3")]
         self.cache_dir = Path(settings.CACHE_DIR_PATH)
@@ -20,22 +29,70 @@ class DoclingProcessor(BaseDocumentProcessor):
 
         # 获取缓存队列管理器实例
         self.cache_queue = get_cache_queue_manager()
+        # 磁盘缓存之前的进程内缓存，重复上传的热门文档无需读取磁盘
+        self.memory_cache = get_memory_cache()
+
+        # 转换器从进程级共享的池中借用，避免每个文件都重新加载模型
+        self.converter_config = ConverterConfig.from_settings()
+        self.converter_pool = get_converter_pool()
+        self.ocr_counter = OcrPageCounter()
+
+        # 解析进程池，工作进程数默认读取settings.PROCESSOR_WORKERS
+        self.max_workers = max_workers
+        self._process_pool = None
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # 工作进程使用自己的转换器池，首次转换后模型在该进程内常驻
+        self.converter_pool = get_converter_pool()
+        self.ocr_counter = OcrPageCounter()
 
     def _process_file(self, file_path: str) -> List[Any]:
         """Original processing logic with Docling"""
-        if not file_path.endswith(('.pdf', '.docx', '.txt', '.md')):  # 检测格式是否支持
+        if not self._is_supported(file_path):  # 检测格式是否支持
             logger.warning(f"Skipping unsupported file type: {file_path}")
             return []
 
-        # 为Docling配置OCR选项，添加中文支持
-        pipeline_options = PdfPipelineOptions()
-        ocr_options = EasyOcrOptions(lang=["ch_sim", "en"])  # 支持简体中文和英文
-        pipeline_options.ocr_options = ocr_options
-        converter = DocumentConverter(format_options={
-            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
-        })  # 加载Docling的文本加载器
-        result = converter.convert(file_path)
-        markdown = result.document.export_to_markdown()
+        # 纯文本与markdown直接流式分块，无需初始化转换器与模型
+        if file_path.lower().endswith(TEXT_FILE_TYPES):
+            return split_text_file(file_path, self.headers)
+
+        return self._split_markdown(self._convert_file(file_path), file_path)
+
+    def _is_supported(self, file_path: str) -> bool:
+        return file_path.endswith(('.pdf', '.docx', '.txt', '.md'))
+
+    def _uses_conversion_cache(self, file_path: str) -> bool:
+        # 纯文本与markdown分块本身就很快，不需要缓存中间结果
+        return self._is_supported(file_path) and not file_path.lower().endswith(TEXT_FILE_TYPES)
+
+    def converter_signature(self, file_path: str) -> Dict:
+        if file_path.lower().endswith(TEXT_FILE_TYPES):
+            return {"processor": "text"}
+        return {
+            "processor": "docling",
+            "ocr_lang": list(self.converter_config.ocr_lang),
+            "ocr_mode": settings.DOCLING_OCR_MODE,
+            "text_layer_min_chars": settings.DOCLING_TEXT_LAYER_MIN_CHARS,
+            # 分片转换的markdown按分片拼接，与整篇转换的结果不同
+            "shard": self._shard_signature(),
+        }
+
+    def _shard_signature(self) -> Optional[Dict]:
+        """启用分片转换时影响转换结果的分片配置，未启用时为None"""
+        if settings.DOCLING_SHARD_PAGES <= 0 or self._get_max_workers() <= 1:
+            return None
+        return {"pages": settings.DOCLING_SHARD_PAGES, "min_pages": settings.DOCLING_SHARD_MIN_PAGES}
+
+    def splitter_signature(self) -> Dict:
+        return {"splitter": "markdown_header", "headers": [list(header) for header in self.headers]}
+
+    def _convert_file(self, file_path: str) -> str:
+        """使用Docling将文件转换为markdown"""
+        return self._convert_to_markdown(file_path)
+
+    def _split_markdown(self, markdown: str, file_path: str) -> List[Any]:
+        """将Docling转换得到的markdown分块"""
         # 检查是否有内容
         if not markdown or not markdown.strip():
             logger.warning(f"Document {file_path} has no content after processing")
@@ -51,6 +108,153 @@ class DoclingProcessor(BaseDocumentProcessor):
         
         return chunks
 
+    def _convert(self, file_path: str, config: ConverterConfig) -> str:
+        """使用转换器池中的转换器将单个文件转换为markdown"""
+        # 从转换器池借用已按OCR配置（默认简体中文和英文）初始化好的转换器
+        with self.converter_pool.acquire(config) as pooled:
+            was_warm = pooled.warm
+            start = time.perf_counter()
+            result = pooled.converter.convert(file_path)
+        logger.info(f"Converted {file_path} in {time.perf_counter() - start:.2f}s "
+                    f"({'warm' if was_warm else 'cold'} converter)")
+        return result.document.export_to_markdown()
+
+    def _convert_to_markdown(self, file_path: str) -> str:
+        """
+        将文件转换为markdown
+
+        PDF会先探测每页是否带有可提取的文本层：有文本层的页面跳过OCR，只有纯图片页面走OCR流程。
+        页数较多的PDF按页分片后在进程池中并行转换。
+        """
+        if not file_path.lower().endswith(".pdf"):
+            return self._convert(file_path, self.converter_config)
+
+        segments = self._plan_segments(file_path)
+        if len(segments) == 1:
+            markdown = self._convert(file_path, segments[0][2])
+        else:
+            markdown = self._convert_segments(file_path, segments)
+
+        ocr_pages = sum(end - start for start, end, config in segments if config.do_ocr)
+        skipped_pages = sum(end - start for start, end, config in segments if not config.do_ocr)
+        self.ocr_counter.add(ocr_pages=ocr_pages, skipped_pages=skipped_pages)
+        logger.debug(f"{file_path}: {ocr_pages} pages OCR'd, {skipped_pages} pages skipped OCR")
+        return markdown
+
+    def _plan_segments(self, file_path: str) -> List[Tuple[int, int, ConverterConfig]]:
+        """
+        为PDF规划转换片段
+
+        Returns:
+            (起始页, 结束页, 流水线配置) 列表，页码区间左闭右开。
+            连续的同类页面（有/无文本层）合并为一个片段，需要分片时再按分片页数切开。
+            无法读取页面（加密或损坏的PDF等）时返回 [(0, 0, 配置)]，由Docling整体转换：
+            auto与always模式下所有页面都做OCR。
+        """
+        ocr_config = self.converter_config
+        text_config = replace(self.converter_config, do_ocr=False)
+
+        mode = settings.DOCLING_OCR_MODE
+        try:
+            if mode == "auto":
+                has_text = probe_text_layer(file_path, settings.DOCLING_TEXT_LAYER_MIN_CHARS)
+            else:
+                has_text = [mode == "never"] * count_pdf_pages(file_path)
+        except Exception as e:
+            logger.warning(f"Failed to read pages of {file_path}, converting it as a whole: {e}")
+            return [(0, 0, text_config if mode == "never" else ocr_config)]
+        page_count = len(has_text)
+
+        runs = []
+        for page, page_has_text in enumerate(has_text):
+            config = text_config if page_has_text else ocr_config
+            if runs and runs[-1][2] == config:
+                runs[-1][1] = page + 1
+            else:
+                runs.append([page, page + 1, config])
+        if not runs:
+            return [(0, page_count, ocr_config)]
+
+        if not (self._should_shard() and page_count >= settings.DOCLING_SHARD_MIN_PAGES):
+            return [tuple(run) for run in runs]
+        return [
+            (run_start + start, run_start + end, config)
+            for run_start, run_end, config in runs
+            for start, end in page_ranges(run_end - run_start, settings.DOCLING_SHARD_PAGES)
+        ]
+
+    def _should_shard(self) -> bool:
+        """是否启用按页分片转换（工作进程内不再嵌套分片）"""
+        return (settings.DOCLING_SHARD_PAGES > 0
+                and self._get_max_workers() > 1
+                and not in_worker())
+
+    def _convert_segments(self, file_path: str, segments: List[Tuple[int, int, ConverterConfig]]) -> str:
+        """
+        将PDF按片段拆分后分别转换，再按页码顺序拼接markdown
+
+        启用分片时各片段在解析进程池中并行转换，每个工作进程持有自己的转换器池，
+        OCR模型在进程内常驻，后续分片无需重新加载；否则在当前进程中依次转换。
+        任意片段失败都会使整个文档失败，避免静默丢页。
+        """
+        logger.info(f"Converting {file_path} in {len(segments)} page segments")
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="docchat_shards_") as shard_dir:
+            shard_paths = split_pdf(file_path, [(first, last) for first, last, _ in segments], shard_dir)
+            if not self._should_shard():
+                markdowns = [self._convert(shard_path, config)
+                             for shard_path, (_, _, config) in zip(shard_paths, segments)]
+            else:
+                pool = self._get_process_pool()
+                futures = [pool.submit(convert_in_worker, shard_path, config)
+                           for shard_path, (_, _, config) in zip(shard_paths, segments)]
+                try:
+                    markdowns = [future.result() for future in futures]
+                except BrokenProcessPool:
+                    self._process_pool = None
+                    raise
+                finally:
+                    for future in futures:
+                        future.cancel()
+        logger.info(f"Converted {file_path} in {time.perf_counter() - start:.2f}s using page segments")
+        return "\n\n".join(markdown.strip() for markdown in markdowns if markdown and markdown.strip())
+
+    def get_ocr_stats(self) -> Dict:
+        """
+        获取OCR统计信息
+
+        Returns:
+            包含OCR处理页数与跳过OCR页数的字典（含工作进程中处理的页面）
+        """
+        return self.ocr_counter.snapshot()
+
+    def _drain_worker_stats(self) -> Dict:
+        return self.ocr_counter.drain()
+
+    def _merge_worker_stats(self, stats: Dict):
+        self.ocr_counter.add(**stats)
+
+
+class OcrPageCounter:
+    """统计经过OCR的页数与因带有文本层而跳过OCR的页数（线程安全）"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.ocr_pages = 0
+        self.skipped_pages = 0
 
+    def add(self, ocr_pages: int = 0, skipped_pages: int = 0):
+        with self._lock:
+            self.ocr_pages += ocr_pages
+            self.skipped_pages += skipped_pages
 
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"ocr_pages": self.ocr_pages, "skipped_pages": self.skipped_pages}
 
+    def drain(self) -> Dict:
+        """返回当前计数并清零，用于把工作进程中的计数汇总到主进程"""
+        with self._lock:
+            stats = {"ocr_pages": self.ocr_pages, "skipped_pages": self.skipped_pages}
+            self.ocr_pages = self.skipped_pages = 0
+            return stats
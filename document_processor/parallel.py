@@ -0,0 +1,55 @@
+# 多进程解析相关的工具函数
+# Docling与OCR都是CPU密集型任务，受GIL限制无法用线程并行，因此使用进程池。
+# 处理器在每个工作进程启动时反序列化一次，之后的任务都复用该实例（以及其中已预热的模型）。
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+# 工作进程内的处理器实例
+_worker_processor = None
+
+
+def _init_worker(processor):
+    """工作进程初始化函数，保存本进程使用的处理器实例"""
+    global _worker_processor
+    _worker_processor = processor
+
+
+def in_worker() -> bool:
+    """当前是否运行在解析进程池的工作进程中"""
+    return _worker_processor is not None
+
+
+def process_file_in_worker(file_path: str) -> Tuple[List[Any], Dict]:
+    """在工作进程中解析单个文件，同时返回本次任务产生的统计计数"""
+    chunks = _worker_processor._process_file(file_path)
+    return chunks, _worker_processor._drain_worker_stats()
+
+
+def create_process_pool(processor, max_workers: int) -> ProcessPoolExecutor:
+    """
+    创建解析进程池
+
+    使用spawn方式启动子进程，避免fork时复制主进程中的线程（缓存清理线程、Web服务等）与模型状态。
+
+    Args:
+        processor: 在工作进程中使用的处理器，会被序列化后传给每个工作进程
+        max_workers: 工作进程数量
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(processor,),
+    )
+
+
+def convert_file_in_worker(file_path: str) -> Tuple[str, Dict]:
+    """在工作进程中将单个文件转换为markdown，同时返回本次任务产生的统计计数"""
+    markdown = _worker_processor._convert_file(file_path)
+    return markdown, _worker_processor._drain_worker_stats()
+
+
+def convert_in_worker(file_path: str, config) -> str:
+    """在工作进程中将单个文件（或PDF分片）转换为markdown"""
+    return _worker_processor._convert(file_path, config)
@@ -0,0 +1,97 @@
+# PDF页面级别的工具函数，基于Docling自带的pypdfium2实现
+# pdfium不是线程安全的：并发会话与Docling自身的pdfium后端可能同时调用它，因此所有调用都在pypdfium2_lock内进行
+import os
+from threading import RLock
+from typing import List, Tuple
+import pypdfium2 as pdfium
+
+try:
+    # 较新版本的Docling在调用pdfium时持有该锁，共用同一把锁才能与其解析线程互斥
+    from docling.utils.locks import pypdfium2_lock
+except ImportError:
+    pypdfium2_lock = RLock()
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """获取PDF页数"""
+    with pypdfium2_lock:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+
+def probe_text_layer(file_path: str, min_chars: int) -> List[bool]:
+    """
+    探测PDF每一页是否带有可用的文本层
+
+    只读取PDF内嵌的文本对象，不做任何渲染，开销远小于版面分析与OCR。
+
+    Args:
+        file_path: PDF路径
+        min_chars: 页面中非空白字符数达到该值才认为文本层可用
+
+    Returns:
+        每页是否带有可用文本层的列表
+    """
+    with pypdfium2_lock:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            has_text = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_range()
+                finally:
+                    textpage.close()
+                    page.close()
+                has_text.append(sum(1 for char in text if not char.isspace()) >= min_chars)
+            return has_text
+        finally:
+            pdf.close()
+
+
+def page_ranges(page_count: int, shard_pages: int) -> List[Tuple[int, int]]:
+    """
+    将页面按固定页数划分为若干区间
+
+    Args:
+        page_count: 总页数
+        shard_pages: 每个区间的页数
+
+    Returns:
+        左闭右开的页码区间列表（页码从0开始）
+    """
+    shard_pages = max(1, shard_pages)
+    return [(start, min(start + shard_pages, page_count)) for start in range(0, page_count, shard_pages)]
+
+
+def split_pdf(file_path: str, ranges: List[Tuple[int, int]], output_dir: str) -> List[str]:
+    """
+    按页码区间将PDF拆分为多个小PDF
+
+    Args:
+        file_path: 源PDF路径
+        ranges: 左闭右开的页码区间列表
+        output_dir: 拆分结果的保存目录
+
+    Returns:
+        与ranges一一对应的拆分文件路径列表
+    """
+    shard_paths = []
+    with pypdfium2_lock:
+        source = pdfium.PdfDocument(file_path)
+        try:
+            for start, end in ranges:
+                shard = pdfium.PdfDocument.new()
+                try:
+                    shard.import_pages(source, list(range(start, end)))
+                    shard_path = os.path.join(output_dir, f"pages_{start + 1:05d}-{end:05d}.pdf")
+                    shard.save(shard_path)
+                finally:
+                    shard.close()
+                shard_paths.append(shard_path)
+        finally:
+            source.close()
+    return shard_paths
@@ -0,0 +1,100 @@
+# 纯文本与markdown文件的轻量解析
+# 这类文件本身就是（或可以直接视作）markdown，无需经过Docling的转换器与模型，
+# 流式读取后直接交给MarkdownHeaderTextSplitter分块即可。
+# 与经过Docling的结果并不逐字相同：Docling不支持.txt，而.md会被它解析后重新导出，
+# 一级标题以外的标题都变为##、列表与强调等行内格式被改写；快速路径保留原文与原有的标题层级。
+from typing import Iterator, List, Tuple
+from langchain_text_splitters import MarkdownHeaderTextSplitter
+from langchain_core.documents import Document
+from utils.logging import logger
+
+# 走快速解析路径的文件类型
+TEXT_FILE_TYPES = (".txt", ".md")
+
+# 依次尝试的文件编码，gb18030兼容GBK/GB2312编码的中文文本
+TEXT_ENCODINGS = ("utf-8-sig", "gb18030")
+
+
+def _iter_sections(file_path: str, encoding: str, top_sep: str) -> Iterator[str]:
+    """
+    逐行读取文件，在代码块之外的最高级标题处切分为若干段
+
+    最高级标题会重置分块器中所有层级的标题元数据，因此逐段分块与整篇分块的结果一致，
+    而内存中只需要保留当前这一段。
+    """
+    section = []
+    in_code_block = False
+    opening_fence = ""
+    with open(file_path, "r", encoding=encoding) as f:
+        for line in f:
+            stripped_line = line.strip()
+            # 与MarkdownHeaderTextSplitter保持一致的代码块判断
+            if not in_code_block:
+                if stripped_line.startswith("```") and stripped_line.count("```") == 1:
+                    in_code_block = True
+                    opening_fence = "```"
+                elif stripped_line.startswith("~~~"):
+                    in_code_block = True
+                    opening_fence = "~~~"
+                elif (top_sep and section and stripped_line.startswith(top_sep)
+                      and (len(stripped_line) == len(top_sep) or stripped_line[len(top_sep)] == " ")):
+                    yield "".join(section)
+                    section = []
+            elif stripped_line.startswith(opening_fence):
+                in_code_block = False
+                opening_fence = ""
+            section.append(line)
+    if section:
+        yield "".join(section)
+
+
+def _split_file(file_path: str, headers: List[Tuple[str, str]], encoding: str) -> Tuple[List[Document], str]:
+    """按指定编码流式分块，返回分块列表与文件开头的一段内容（用于兜底）"""
+    # 只有在分块标题中的最高级标题处切分才不会改变分块结果
+    top_sep = min((sep for sep, _ in headers), key=len) if headers else ""
+    splitter = MarkdownHeaderTextSplitter(headers)
+    chunks = []
+    head = ""
+    for section in _iter_sections(file_path, encoding, top_sep):
+        if len(head) < 1000:
+            head = (head + section).lstrip()[:1000]
+        for chunk in splitter.split_text(section):
+            # 分块器会合并元数据相同的相邻内容，跨段时同样合并
+            if chunks and chunks[-1].metadata == chunk.metadata:
+                chunks[-1].page_content += "  \n" + chunk.page_content
+            else:
+                chunks.append(chunk)
+    return chunks, head
+
+
+def split_text_file(file_path: str, headers: List[Tuple[str, str]]) -> List[Document]:
+    """
+    解析纯文本或markdown文件
+
+    Args:
+        file_path: 文件路径
+        headers: 传给MarkdownHeaderTextSplitter的标题配置
+
+    Returns:
+        分块列表，空文件返回空列表
+    """
+    for encoding in TEXT_ENCODINGS:
+        try:
+            chunks, head = _split_file(file_path, headers, encoding)
+            break
+        except UnicodeDecodeError:
+            logger.debug(f"Failed to decode {file_path} as {encoding}")
+    else:
+        logger.warning(f"Unable to decode {file_path}, skipping")
+        return []
+
+    # 检查是否有内容
+    if not head.strip():
+        logger.warning(f"Document {file_path} has no content after processing")
+        return []
+
+    # 如果没有生成块，创建一个包含开头内容的文档
+    if not chunks:
+        logger.warning(f"No chunks created for document {file_path}, creating single chunk")
+        chunks = [Document(page_content=head)]  # 限制长度避免embedding问题
+    return chunks
@@ -1,13 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import Any, List
-import logging,os
+from typing import Any, Iterable, List
+import asyncio,hashlib,logging,os
 from config.settings import settings
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from pydantic import BaseModel, Field
 from pathlib import Path
-import hashlib
-from document_processor import DoclingProcessor
+from document_processor import DoclingProcessor, chunk_id
+from utils.fingerprint import get_fingerprinter
+from .embedding_cache import CachedEmbeddings
+from .embedding_executor import ConcurrentEmbeddings, get_embedding_executor
 logger = logging.getLogger(__name__)
 # 使用pydantic构建一个检索器构建器的config模型
 class BaseKBConfig(BaseModel):
@@ -24,6 +26,23 @@ class BaseKBConfig(BaseModel):
     PROCESSOR: str = Field(default="Docling",description="使用的文档处理器名称")
 
 
+def default_kb_config() -> BaseKBConfig:
+    """根据全局配置生成默认知识库的配置"""
+    config = {
+        "name": settings.CHROMA_DEFAULT_COLLECTION_NAME,
+        "description": "",
+        "EMBEDDING_MODEL_SERVER": settings.EMBEDDING_MODEL_SERVER or os.getenv("EMBEDDING_MODEL_SERVER", ""),
+    }
+    model_name = settings.EMBEDDING_MODEL_NAME or os.getenv("EMBEDDING_MODEL_NAME")
+    if model_name:
+        config["EMBEDDING_MODEL"] = model_name
+    return BaseKBConfig(**config)
+
+
+def corpus_key(file_hashes: Iterable[str]) -> str:
+    """文档集合的键：排序后的文件哈希整体的SHA-256，与上传顺序无关"""
+    return hashlib.sha256("\n".join(sorted(file_hashes)).encode()).hexdigest()
+
 
 class BaseRetriever(ABC):
     """
@@ -44,6 +63,17 @@ class BaseRetriever(ABC):
             相关文档列表
         """
         pass
+    async def ainvoke(self, query: str) -> List[Document]:
+        """
+        异步获取相关文档，默认在线程中执行invoke
+        
+        Args:
+            query: 查询字符串
+            
+        Returns:
+            相关文档列表
+        """
+        return await asyncio.to_thread(self.invoke, query)
 class file_manager:
     """
     文件管理器
@@ -60,23 +90,19 @@ class file_manager:
         pass
     def get_single_hash(self,file_path:str)->str:
         """Generate SHA-256 hash for a single file."""
-        with open(file_path, "rb") as f:
-            return hashlib.sha256(f.read()).hexdigest()
-    def _get_file_hashes(uploaded_files: List) -> frozenset:
+        return get_fingerprinter().fingerprint(file_path)
+    def _get_file_hashes(self, uploaded_files: List) -> frozenset:
         """Generate SHA-256 hashes for uploaded files."""
-        hashes = set()
-        for file in uploaded_files:
-            with open(file.name, "rb") as f:
-                hashes.add(hashlib.sha256(f.read()).hexdigest())
-        return frozenset(hashes)
+        return get_fingerprinter().fingerprints(file.name for file in uploaded_files)
 class BASE_KB(ABC):
     """
     知识库的抽象基类
     定义构建检索器的标准接口
     """
-    def __init__(self,config:BaseKBConfig):
-        """初始化检索器构建器"""
+    def __init__(self,config:BaseKBConfig=None):
+        """初始化检索器构建器，未指定配置时使用全局配置中的默认知识库"""
         self.init_status = True # 初始化状态，默认为成功
+        config = config or default_kb_config()
 
         self.status_msg = ""
         if not config.name:
@@ -100,10 +126,17 @@ class BASE_KB(ABC):
             self.status_msg =f"尚不支持嵌入层服务商: {config.EMBEDDING_MODEL_SERVER}"
             self.init_status = False
             return 
+        model = f"{config.EMBEDDING_MODEL_SERVER}/{config.EMBEDDING_MODEL}"
+        # 按token预算打包并发请求，被限流时自动降低并发并退避重试；同一模型的知识库共用执行器
+        self.embedding_executor = get_embedding_executor(model, embedding)
+        embedding = ConcurrentEmbeddings(embedding, self.embedding_executor)
+        if settings.EMBEDDING_CACHE_ENABLED:
+            # 相同文本（包括查询）的嵌入在所有知识库之间共用，命中时不请求嵌入服务
+            embedding = CachedEmbeddings(embedding, model=model)
         self.embeddings = embedding
         if config.KB_TYPE == "chroma":
             # 获取本地缓存地址
-            self.cache_dir = os.path.join(Path(settings.CHROMA_DB_PATH), config.name)
+            self.cache_dir = Path(settings.CHROMA_DB_PATH) / config.name
             self.cache_dir.mkdir(parents=True, exist_ok=True)
         else:
             self.status_msg =f"尚不支持知识库类型: {config.KB_TYPE}"
@@ -0,0 +1,372 @@
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from document_processor import chunk_id
+from document_processor.cache_format import CachedChunks, write_chunks
+from .base import BaseRetriever
+logger = logging.getLogger(__name__)
+
+# 连续的中文字符，以及由字母/数字组成的词
+_TOKEN_RE = re.compile(r"[一-鿿]+|[^\W_一-鿿]+")
+_CJK_RE = re.compile(r"[一-鿿]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    把文本切分为检索词
+
+    英文与数字按词切分并转为小写；中文不做分词，取单字与相邻两字组成的二元词，
+    既能匹配单字查询，又保留了词语的顺序信息。
+    """
+    matches = _TOKEN_RE.findall(text.lower())
+    if not _CJK_RE.search(text):
+        return matches
+    tokens = []
+    for match in matches:
+        if "一" <= match[0] <= "鿿":
+            tokens.extend(match)
+            tokens.extend(match[i:i + 2] for i in range(len(match) - 1))
+        else:
+            tokens.append(match)
+    return tokens
+
+
+_save_locks: Dict[str, Lock] = {}
+_save_locks_lock = Lock()
+
+
+def _save_lock(path: Path) -> Lock:
+    """同一索引目录的保存锁"""
+    with _save_locks_lock:
+        return _save_locks.setdefault(os.path.abspath(path), Lock())
+
+
+def _replace_dir(src: Path, dst: Path, attempts: int = 3):
+    """
+    用src目录替换dst目录
+
+    原目录先移到mkdtemp创建的唯一目录中再删除，不会与残留的旧目录冲突；
+    其他进程在此期间写入了dst时重新移开再替换。
+    """
+    stash = Path(tempfile.mkdtemp(prefix=f".{dst.name}.old-", dir=dst.parent))
+    try:
+        for attempt in range(attempts):
+            try:
+                os.replace(dst, stash / str(attempt))
+            except FileNotFoundError:
+                pass
+            try:
+                os.replace(src, dst)
+                return
+            except OSError:
+                if attempt == attempts - 1 or not dst.exists():
+                    raise
+    finally:
+        shutil.rmtree(stash, ignore_errors=True)
+
+
+class BM25Index:
+    """
+    可持久化的BM25倒排索引
+
+    倒排表按CSR格式保存为三个NumPy数组：indptr[t]:indptr[t+1]是检索词t的倒排区间，
+    postings与tfs分别记录该区间内的文档编号与词频。保存为.npy文件后可以通过mmap直接加载，
+    打开大型索引几乎不需要时间；查询时只遍历查询中出现的检索词，每个词的打分是一次向量化运算，
+    再用argpartition选出前k个文档。
+    没有使用已有依赖scipy.sparse的csr_matrix：构建时它会统一索引数组的整数类型（可能复制mmap加载的数组），
+    增量合并也需要重建整个矩阵，而这里只需要按检索词切片，三个普通数组即可满足。
+
+    分块文本以列式缓存格式（cache_format）保存，只在返回结果时构建Document。
+    新增分块只需要对新分块分词并与已有倒排表合并；删除的分块先记为墓碑（打分时忽略），
+    墓碑占比超过COMPACT_RATIO时在保存前压缩。文档总数、文档频率与平均长度都只统计未删除的分块，
+    有墓碑时的分数与只包含这些分块的索引相同。
+    """
+
+    FORMAT_VERSION = 1
+    # 墓碑占比超过该值时，保存前压缩索引
+    COMPACT_RATIO = 0.2
+    _ARRAYS = ("indptr", "postings", "tfs", "doc_len", "deleted", "ids")
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        创建空索引
+
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.postings = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.deleted = np.zeros(0, dtype=bool)
+        self.ids = np.zeros(0, dtype="S64")
+        # 已保存的分块文本（mmap）与之后新增的分块
+        self._stored: Optional[CachedChunks] = None
+        self._pending: List[Document] = []
+        self._positions: Optional[Dict[str, int]] = None
+        self._norm: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        """未删除的分块数"""
+        return int(len(self.deleted) - self.deleted.sum())
+
+    def _invalidate(self):
+        self._positions = None
+        self._norm = None
+
+    def _position_map(self) -> Dict[str, int]:
+        """分块ID -> 未删除分块的编号"""
+        if self._positions is None:
+            self._positions = {id_.decode(): i for i, id_ in enumerate(self.ids) if not self.deleted[i]}
+        return self._positions
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._position_map()
+
+    def live_ids(self) -> List[str]:
+        """所有未删除分块的ID"""
+        return list(self._position_map())
+
+    def document(self, position: int) -> Document:
+        """按编号获取分块"""
+        stored = len(self._stored) if self._stored is not None else 0
+        if position < stored:
+            return self._stored[position]
+        return Document(page_content=self._pending[position - stored].page_content,
+                        metadata=dict(self._pending[position - stored].metadata))
+
+    def add(self, docs: Iterable[Document], ids: Iterable[str] = None) -> int:
+        """
+        新增分块，已存在的ID会被跳过
+
+        Args:
+            docs: 分块
+            ids: 分块ID，与docs一一对应，默认使用分块metadata中的稳定ID
+
+        Returns:
+            实际新增的分块数
+        """
+        docs = list(docs)
+        ids = [chunk_id(doc) for doc in docs] if ids is None else ids
+        positions = self._position_map()
+        seen = set()
+        new_docs, new_ids = [], []
+        for doc, id_ in zip(docs, ids):
+            if id_ not in positions and id_ not in seen:
+                seen.add(id_)
+                new_docs.append(doc)
+                new_ids.append(id_)
+        if not new_docs:
+            return 0
+
+        base = len(self.doc_len)
+        tokens, lengths = [], []
+        for doc in new_docs:
+            doc_tokens = tokenize(doc.page_content)
+            tokens.extend(doc_tokens)
+            lengths.append(len(doc_tokens))
+        vocab = self.vocab
+        terms = np.fromiter((vocab.setdefault(token, len(vocab)) for token in tokens), dtype=np.int64, count=len(tokens))
+        lengths = np.asarray(lengths, dtype=np.int64)
+        # (检索词, 分块) 组合去重计数即得到词频，结果按检索词、分块编号排序
+        pairs, tfs = np.unique(terms * len(new_docs) + np.repeat(np.arange(len(new_docs)), lengths), return_counts=True)
+        terms = (pairs // len(new_docs)).astype(np.int32)
+        doc_ids = (pairs % len(new_docs) + base).astype(np.int32)
+
+        # 已有倒排表按检索词展开后与新分块的倒排项合并；新分块编号更大，稳定排序保持每个词内文档编号递增
+        old_terms = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr))
+        all_terms = np.concatenate([old_terms, terms])
+        order = np.argsort(all_terms, kind="stable")
+        self.postings = np.concatenate([self.postings, doc_ids])[order]
+        self.tfs = np.concatenate([self.tfs, tfs.astype(np.float32)])[order]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(all_terms, minlength=len(self.vocab)))]).astype(np.int64)
+        self.doc_len = np.concatenate([self.doc_len, np.asarray(lengths, dtype=np.float32)])
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(new_docs), dtype=bool)])
+        self.ids = np.concatenate([self.ids, np.asarray(new_ids, dtype="S64")])
+        self._pending.extend(new_docs)
+        self._invalidate()
+        return len(new_docs)
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """
+        删除分块（记为墓碑）
+
+        Returns:
+            实际删除的分块数
+        """
+        positions = self._position_map()
+        removed = [positions[id_] for id_ in ids if id_ in positions]
+        if removed:
+            self.deleted = np.array(self.deleted)
+            self.deleted[removed] = True
+            self._invalidate()
+        return len(removed)
+
+    def compact(self):
+        """移除墓碑，重新编号分块并重建倒排表"""
+        keep = ~self.deleted
+        if keep.all():
+            return
+        remap = np.cumsum(keep, dtype=np.int64) - 1
+        live = keep[self.postings]
+        terms = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr))[live]
+        self.postings = remap[self.postings[live]].astype(np.int32)
+        self.tfs = np.asarray(self.tfs[live])
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(self.vocab)))]).astype(np.int64)
+        docs = [self.document(i) for i in np.flatnonzero(keep)]
+        self.doc_len = np.asarray(self.doc_len[keep])
+        self.ids = np.asarray(self.ids[keep])
+        self.deleted = np.zeros(len(docs), dtype=bool)
+        self._pending = docs
+        if self._stored is not None:
+            self._stored.close()
+            self._stored = None
+        self._invalidate()
+
+    def _length_norm(self) -> np.ndarray:
+        """每个分块打分时的长度归一化项 k1 * (1 - b + b * dl / avgdl)"""
+        if self._norm is None:
+            live = self.doc_len[~self.deleted]
+            avgdl = float(live.mean()) if len(live) and live.mean() > 0 else 1.0
+            self._norm = (self.k1 * (1 - self.b + self.b * np.asarray(self.doc_len) / avgdl)).astype(np.float32)
+        return self._norm
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """计算查询对每个分块的BM25分数，已删除的分块为0"""
+        scores = np.zeros(len(self.doc_len), dtype=np.float32)
+        n_docs = len(self)
+        if not n_docs:
+            return scores
+        norm = self._length_norm()
+        for term, qtf in Counter(tokenize(query)).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+            if start == end:
+                continue
+            docs = self.postings[start:end]
+            tf = self.tfs[start:end]
+            # 文档频率不计已删除的分块，否则可能超过n_docs使idf为负
+            df = end - start - int(np.count_nonzero(self.deleted[docs]))
+            if not df:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            # 同一检索词的倒排区间内文档编号互不相同，可以直接按下标累加
+            scores[docs] += qtf * idf * tf * (self.k1 + 1) / (tf + norm[docs])
+        scores[self.deleted] = 0
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        检索分数最高的k个分块
+
+        Returns:
+            (分块编号, 分数) 列表，按分数降序排列，只包含分数大于0的分块
+        """
+        scores = self.get_scores(query)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(i), float(scores[i])) for i in candidates]
+
+    def save(self, path):
+        """
+        保存索引
+
+        先写入临时目录再替换原目录，读取方不会看到写了一半的索引。
+        临时目录由mkdtemp创建，同一进程内对同一路径的保存依次进行。
+        墓碑占比超过COMPACT_RATIO时先压缩。
+        """
+        if len(self.deleted) and self.deleted.mean() > self.COMPACT_RATIO:
+            self.compact()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with _save_lock(path):
+            tmp = Path(tempfile.mkdtemp(prefix=f".{path.name}.tmp-", dir=path.parent))
+            try:
+                for name in self._ARRAYS:
+                    np.save(tmp / f"{name}.npy", np.asarray(getattr(self, name)))
+                # 分块文本不压缩，保持按需从mmap读取
+                write_chunks(tmp / "docs.chunks", (self.document(i) for i in range(len(self.doc_len))))
+                with open(tmp / "vocab.json", "w", encoding="utf-8") as f:
+                    json.dump(sorted(self.vocab, key=self.vocab.get), f, ensure_ascii=False)
+                with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+                    json.dump({"version": self.FORMAT_VERSION, "k1": self.k1, "b": self.b}, f)
+                _replace_dir(tmp, path)
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            # 改为引用刚保存的文件，释放新增分块占用的内存
+            loaded = self.load(path)
+        self.close()
+        self.__dict__.update(loaded.__dict__)
+
+    @classmethod
+    def load(cls, path) -> "BM25Index":
+        """
+        通过mmap加载保存的索引
+
+        Raises:
+            FileNotFoundError: 索引不存在
+            ValueError: 索引版本不符或已损坏
+        """
+        path = Path(path)
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index version: {meta.get('version')}")
+        index = cls(k1=meta["k1"], b=meta["b"])
+        for name in cls._ARRAYS:
+            setattr(index, name, np.load(path / f"{name}.npy", mmap_mode="r"))
+        # 墓碑需要可写，且体积很小
+        index.deleted = np.array(index.deleted)
+        with open(path / "vocab.json", encoding="utf-8") as f:
+            index.vocab = {term: i for i, term in enumerate(json.load(f))}
+        index._stored = CachedChunks(path / "docs.chunks")
+        if len(index._stored) != len(index.doc_len) or len(index.indptr) != len(index.vocab) + 1:
+            index.close()
+            raise ValueError(f"Inconsistent BM25 index: {path}")
+        return index
+
+    def close(self):
+        """释放分块文本的内存映射"""
+        if self._stored is not None:
+            self._stored.close()
+            self._stored = None
+
+
+class BM25Retriever(BaseRetriever):
+    """基于BM25Index的关键词检索器，返回的分块在metadata["score"]中带有BM25分数"""
+
+    def __init__(self, index: BM25Index, k: int = 4):
+        """
+        Args:
+            index: BM25索引
+            k: 返回的分块数
+        """
+        self.index = index
+        self.k = k
+
+    def invoke(self, query: str) -> List[Document]:
+        docs = []
+        for position, score in self.index.top_k(query, self.k):
+            doc = self.index.document(position)
+            doc.metadata["score"] = score
+            docs.append(doc)
+        return docs
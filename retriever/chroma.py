@@ -1,80 +1,309 @@
 from langchain_community.vectorstores import Chroma
-from langchain_community.retrievers import BM25Retriever
+
+from langchain_core.documents import Document
 
 from config.settings import settings
-import logging,os,pickle
-from .base import BASE_KB,BaseRetriever
+import asyncio,logging,os,shutil,time,uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from .base import BASE_KB,BaseKBConfig,BaseRetriever,chunk_id,corpus_key
+from .bm25 import BM25Index, BM25Retriever
+from .embedding_cache import CachedEmbeddings
+from .fusion import FUSION_MODES, fuse
+from .ingest import prefetch
 logger = logging.getLogger(__name__)
+
+retrieval_pool = None
+# 向量库集合元数据中记录文档集合最近使用时间的键
+CORPUS_LAST_USED_KEY = "last_used"
+
+def get_retrieval_pool():
+    """
+    获取全局检索线程池，所有混合检索器共用
+
+    重建检索器时不会再创建新的线程池，线程数也不会随知识库数量增长。
+
+    Returns:
+        ThreadPoolExecutor实例
+    """
+    global retrieval_pool
+    if retrieval_pool is None:
+        retrieval_pool = ThreadPoolExecutor(max_workers=settings.RETRIEVER_MAX_WORKERS, thread_name_prefix="retriever")
+    return retrieval_pool
+
 class Chroma_Retriever(BaseRetriever):
-    def __init__(self, retrievers,weights,flags):
-        """初始化检索器列表，以及对应的权重，以及对应标记"""
+    def __init__(self, retrievers,weights,flags,timeouts: Dict[str, float] = None,fusion: str = None,top_k: int = None):
+        """初始化检索器列表，以及对应的权重，以及对应标记与超时时间（秒，按标记），以及结果融合方式与返回的分块数"""
         self.retrievers = retrievers
         self.weights = weights
         self.flags = flags
+        self.timeouts = settings.RETRIEVER_TIMEOUTS if timeouts is None else timeouts
+        self.fusion = fusion or settings.RETRIEVER_FUSION
+        if self.fusion not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode: {self.fusion}, expected one of {FUSION_MODES}")
+        self.top_k = top_k or settings.RETRIEVER_TOP_K
+        # 子检索器在共用的线程池中并发执行
+        self.pool = get_retrieval_pool()
+
+    def _timeout(self, flag: str) -> Optional[float]:
+        return self.timeouts.get(flag, self.timeouts.get("default"))
+
+    @staticmethod
+    def _search(retriever, flag: str, query: str):
+        """执行单个子检索器"""
+        if flag in ["vector"]:
+            return retriever.similarity_search_with_score(query, k=settings.VECTOR_SEARCH_K)
+        return retriever.invoke(query)
 
     def invoke(self, query: str):
-        """进行混合检索"""
-        combined = [] 
-        # 遍历每个检索器，并使用权重进行混合
-        for retriever, weight,flag in zip(self.retrievers, self.weights,self.flags):
-            if flag in ["vector"]:
-                docs = retriever.similarity_search_with_score(query)
-            else:
-                docs = retriever.invoke(query)
-            for doc in docs:
-                if type(doc) is tuple:
-                    adjusted_score = doc[1] * weight
-                    combined.append((doc[0], adjusted_score,flag))
+        """并发执行所有子检索器并进行混合检索，超时或出错的检索器不参与本次结果"""
+        start = time.monotonic()
+        futures = [self.pool.submit(self._search, retriever, flag, query)
+                   for retriever, flag in zip(self.retrievers, self.flags)]
+        results = []
+        for future, flag in zip(futures, self.flags):
+            timeout = self._timeout(flag)
+            try:
+                # 所有检索器同时开始，按各自的截止时间等待
+                results.append(future.result(
+                    timeout=None if timeout is None else max(0.0, start + timeout - time.monotonic())))
+            except Exception as e:
+                future.cancel()
+                results.append(e)
+        return self._combine(results)
+
+    async def ainvoke(self, query: str):
+        """invoke的异步版本，子检索器在线程池中并发执行"""
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(asyncio.wait_for(loop.run_in_executor(self.pool, self._search, retriever, flag, query), self._timeout(flag))
+              for retriever, flag in zip(self.retrievers, self.flags)),
+            return_exceptions=True)
+        return self._combine(results)
+
+    def _combine(self, results: List):
+        """
+        混合各子检索器的结果
+
+        Args:
+            results: 与retrievers一一对应的检索结果，检索失败或超时的位置为异常对象
+
+        Raises:
+            所有子检索器都失败时抛出第一个异常
+        """
+        ranked_lists = []
+        errors = []
+        for docs, flag in zip(results, self.flags):
+            if isinstance(docs, BaseException):
+                if isinstance(docs, TimeoutError):
+                    logger.warning(f"Retriever '{flag}' timed out after {self._timeout(flag)}s, skipping its results")
                 else:
-                    adjusted_score = doc.metadata.get("score", 0) * weight
-                    combined.append((doc, adjusted_score,flag))
-        # 按调整后的分数降序排序
-        combined.sort(key=lambda x: x[1], reverse=True)
-        # 去重：基于文档内容
-        seen_content = set()
-        final_docs = []
-        for doc, score, source in combined:
-            content_snippet = doc.page_content[:100]  # 使用内容前100字符作为标识
-            if content_snippet not in seen_content: # 如果没有见过，则添加
-                seen_content.add(content_snippet)
-                # 处理doc没有metadata的情况
-                if not hasattr(doc, 'metadata') or doc.metadata is None:
-                    doc.metadata = {}
-                # 可以选择将合并后的分数存入metadata
-                doc.metadata["score"] = score
-                doc.metadata["retrieval_source"] = source
-                final_docs.append(doc)
-        return final_docs
+                    logger.error(f"Retriever '{flag}' failed: {docs}")
+                errors.append(docs)
+                docs = []
+            ranked_lists.append(docs)
+        if errors and len(errors) == len(results):
+            raise errors[0]
+        # 按名次（或归一化分数）加权融合，去重后只保留前top_k个分块
+        return fuse(ranked_lists, self.weights, self.flags, mode=self.fusion, top_k=self.top_k,
+                    rrf_k=settings.RETRIEVER_RRF_K)
 
 class RetrieverBuilder(BASE_KB):
-    def __init__(self):
+    def __init__(self, config: BaseKBConfig = None):
         """Initialize the retriever builder with embeddings."""
-        super().__init__()
+        super().__init__(config)
+        if not self.init_status:
+            raise ValueError(self.status_msg)
         self.retriever = None
-        self.docs_dir = os.path.join(self.cache_dir,"docs.pkl") #用于存储处理后文档的目录(bm25不支持本地持久化),使用pkl格式文件保存
         self.file_dir =os.path.join(self.cache_dir,"files") #存储原始文档的目录
-        if self.docs_dir: # 加载处理后的文档
-            with open(self.docs_dir, 'rb') as f:
-                docs = pickle.load(f)
-        self.docs = docs #由于bm25不支持持久化，所以本质上需要即插即用没法预先构建检索器在后续操作，所以利用保存文档列表的形式变相的保存
-    def build_retriever(self):
+        self.vectors_dir = os.path.join(self.cache_dir,"vectors") #按文档集合持久化的向量库集合
+        self.bm25_dir = os.path.join(self.cache_dir,"bm25") #按文档集合持久化的BM25索引
+        self.docs = [] #最近一次构建使用的分块
+        self.bm25_index = None
+        self.corpus = None
+
+    def build_retriever(self, docs: List[Document] = None):
         """构建一个结合BM25与向量检索的混合检索器。"""
+        docs = self.docs if docs is None else list(docs)
+        # 分块已全部就绪，直接以分块ID集合作为文档集合的键
+        return self.build_retriever_streaming([docs], corpus=corpus_key(chunk_id(doc) for doc in docs))
 
-        try:
-            vector_store = Chroma(
-                documents=self.docs,
-                embedding=self.embeddings,
+    def _open_vector_store(self, corpus: Optional[str]) -> Chroma:
+        """
+        打开文档集合对应的向量库集合
+
+        指定corpus时使用CHROMA_DB_PATH下按文档集合命名的持久化集合，同一组文件在不同会话中
+        复用已经写入的向量；否则使用仅在本次构建中有效的内存集合。
+        """
+        if corpus is None:
+            return Chroma(
+                collection_name=f"{self.name}-{uuid.uuid4().hex[:8]}",
+                embedding_function=self.embeddings,
             )
+        vector_store = Chroma(
+            collection_name=self._collection_name(corpus),
+            embedding_function=self.embeddings,
+            persist_directory=str(self.vectors_dir),
+        )
+        # 集合元数据记录最近使用时间，按此淘汰长期未使用的文档集合
+        vector_store._collection.modify(metadata={CORPUS_LAST_USED_KEY: time.time()})
+        return vector_store
+
+    def _collection_name(self, corpus: str) -> str:
+        """文档集合对应的向量库集合名"""
+        return f"{self.name}-{corpus[:16]}"
+
+    def _bm25_path(self, corpus: str) -> str:
+        """文档集合对应的BM25索引目录"""
+        return os.path.join(self.bm25_dir, corpus[:16])
+
+    def _evict_corpora(self, client, keep: str) -> int:
+        """
+        删除最近未使用的文档集合（向量库集合与BM25索引目录）
+
+        按集合元数据中的最近使用时间，只保留CORPUS_MAX_COUNT个最近使用的文档集合，
+        并删除超过CORPUS_EXPIRE_DAYS天未使用的；没有对应集合的BM25索引目录同样删除。
+        当前使用的文档集合keep始终保留。
+
+        Args:
+            client: 向量库集合所在的Chroma持久化客户端
+            keep: 当前文档集合的键
+
+        Returns:
+            删除的文档集合数
+        """
+        prefix = f"{self.name}-"
+        keep = keep[:16]
+        # 当前文档集合排在最前，占用保留名额中的一个
+        corpora = sorted(
+            ((collection.name[len(prefix):], (collection.metadata or {}).get(CORPUS_LAST_USED_KEY, 0.0))
+             for collection in client.list_collections() if collection.name.startswith(prefix)),
+            key=lambda item: (item[0] == keep, item[1]), reverse=True)
+        expire_before = time.time() - settings.CORPUS_EXPIRE_DAYS * 24 * 60 * 60
+        evicted = []
+        for rank, (key, last_used) in enumerate(corpora):
+            if key == keep:
+                continue
+            if (0 < settings.CORPUS_MAX_COUNT <= rank) or (settings.CORPUS_EXPIRE_DAYS > 0 and last_used < expire_before):
+                client.delete_collection(prefix + key)
+                evicted.append(key)
+        live = {key for key, _ in corpora} - set(evicted)
+        if os.path.isdir(self.bm25_dir):
+            for key in os.listdir(self.bm25_dir):
+                # 以.开头的是正在保存的临时目录
+                if not key.startswith(".") and key not in live and key != keep:
+                    shutil.rmtree(os.path.join(self.bm25_dir, key), ignore_errors=True)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} unused corpora: {', '.join(evicted)}")
+        return len(evicted)
+
+    def _open_bm25_index(self, corpus: Optional[str]) -> BM25Index:
+        """打开文档集合已保存的BM25索引，不存在或无法读取时返回空索引"""
+        if corpus is not None:
+            try:
+                return BM25Index.load(self._bm25_path(corpus))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Failed to load BM25 index for corpus {corpus[:16]}, rebuilding: {e}")
+        return BM25Index()
+
+    def build_retriever_streaming(self, chunk_batches: Iterable[List[Document]], file_hashes: Iterable[str] = None,
+                                  corpus: str = None):
+        """
+        流式构建混合检索器
+
+        chunk_batches通常是处理器的iter_process结果：解析在后台线程中进行，
+        通过有界队列把每个文件的分块交给当前线程嵌入并写入向量库，
+        因此文档解析与嵌入请求可以重叠进行。全部分块入库后再更新BM25索引。
+
+        给出file_hashes（或corpus）时向量写入按文档集合持久化的集合，并以分块ID写入：
+        集合中已有的分块不会再次发送给嵌入服务，入库完成后删除集合中不再属于本次结果的分块
+        （例如修改分块配置后的旧分块），集合内容始终与本次分块结果一致。
+        BM25索引同样按文档集合保存，只对新增的分块分词并合并到索引中。
+
+        Args:
+            chunk_batches: 分块列表的迭代器，每个元素对应一个已处理完成的文件
+            file_hashes: 本次上传文件的内容哈希，用于确定文档集合
+            corpus: 直接指定文档集合的键，优先于file_hashes
+
+        Returns:
+            混合检索器
+        """
+        try:
+            if corpus is None and file_hashes is not None:
+                corpus = corpus_key(file_hashes)
+            vector_store = self._open_vector_store(corpus)
+            bm25_index = self._open_bm25_index(corpus)
+            docs = []
+            indexed_ids = set()
+            embedded = 0
+            start = time.perf_counter()
+            batch_size = max(1, settings.INGEST_BATCH_SIZE)
+            for chunks in prefetch(chunk_batches, settings.INGEST_QUEUE_SIZE):
+                for offset in range(0, len(chunks), batch_size):
+                    batch = list(chunks[offset:offset + batch_size])
+                    ids = [chunk_id(doc) for doc in batch]
+                    # 只嵌入集合中还没有的分块
+                    existing = set(vector_store.get(ids=ids, include=[])["ids"]) if corpus else set()
+                    new = [(chunk, id_) for chunk, id_ in zip(batch, ids) if id_ not in existing and id_ not in indexed_ids]
+                    if new:
+                        vector_store.add_documents([chunk for chunk, _ in new], ids=[id_ for _, id_ in new])
+                        embedded += len(new)
+                    indexed_ids.update(ids)
+                if not docs:
+                    logger.info(f"First {len(chunks)} chunks indexed after {time.perf_counter() - start:.2f}s")
+                docs.extend(chunks)
+            if not docs:
+                raise ValueError("No document chunks to index")
+            if corpus:
+                stale = [id_ for id_ in vector_store.get(include=[])["ids"] if id_ not in indexed_ids]
+                if stale:
+                    vector_store.delete(ids=stale)
+                    logger.info(f"Removed {len(stale)} stale chunks from the collection")
+            bm25_start = time.perf_counter()
+            added = bm25_index.add(docs)
+            removed = bm25_index.delete([id_ for id_ in bm25_index.live_ids() if id_ not in indexed_ids])
+            if corpus and (added or removed):
+                bm25_index.save(self._bm25_path(corpus))
+            logger.info(f"BM25 index ready in {time.perf_counter() - bm25_start:.2f}s "
+                        f"({added} chunks added, {removed} removed, {len(bm25_index)} total)")
+            logger.info(f"Indexed {len(docs)} chunks in {time.perf_counter() - start:.2f}s "
+                        f"({embedded} embedded, {len(docs) - embedded} reused)")
+            stats = self.embedding_executor.get_stats()
+            if stats["chunks"]:
+                logger.info(f"Embedding throughput: {stats['chunks_per_second']:.1f} chunks/s "
+                            f"({stats['chunks']} chunks in {stats['batches']} requests, "
+                            f"{stats['throttled']} rate limited, concurrency {stats['concurrency']})")
+            if isinstance(self.embeddings, CachedEmbeddings):
+                stats = self.embeddings.cache.get_stats()
+                logger.info(f"Embedding cache hit ratio: {stats['hit_ratio']:.1%} "
+                            f"({stats['hits']} hits, {stats['misses']} misses, {stats['entries']} cached)")
+
+            if corpus:
+                try:
+                    self._evict_corpora(vector_store._client, corpus)
+                except Exception as e:
+                    logger.warning(f"Failed to evict unused corpora: {e}")
 
-            bm25 = BM25Retriever.from_documents(self.docs)
+            self.docs = docs
+            self.bm25_index = bm25_index
+            self.corpus = corpus
+            bm25 = BM25Retriever(bm25_index, k=settings.VECTOR_SEARCH_K)
             hybrid_retriever = Chroma_Retriever(
                     retrievers=[bm25, vector_store],
                     weights=settings.HYBRID_RETRIEVER_WEIGHTS,
                     flags=["bm25","vector"]
                 )
             self.retriever = hybrid_retriever
+            return hybrid_retriever
         except Exception as e:
             logger.error(f"Failed to load vector store: {e}")
             raise
 
-                
+    def save_local(self):
+        """保存最近一次构建的BM25索引，下次打开同一文档集合时直接映射加载"""
+        if self.bm25_index is None:
+            return
+        corpus = self.corpus or corpus_key(self.bm25_index.live_ids())
+        self.bm25_index.save(self._bm25_path(corpus))
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List
+import numpy as np
+from filelock import FileLock
+from langchain_core.embeddings import Embeddings
+from config.settings import settings
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    按内容寻址的嵌入向量缓存，独立于向量库
+
+    以 (模型, 文本SHA-256) 为键保存嵌入向量：向量按模型与维度追加写入float32数组文件，
+    读取时通过numpy.memmap映射；SQLite索引记录每个键对应的行号。同一段文本出现在不同的
+    上传或知识库中时只需要请求一次嵌入服务。多个进程可以共用同一个缓存目录：
+    追加写入由每个数组文件旁的文件锁串行化，索引的并发访问由SQLite保证。
+    """
+
+    def __init__(self, cache_dir: str = None):
+        """
+        打开（必要时创建）嵌入缓存
+
+        Args:
+            cache_dir: 缓存目录，默认读取settings.EMBEDDING_CACHE_DIR
+        """
+        self.cache_dir = Path(cache_dir or settings.EMBEDDING_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = Lock()
+        self._conn = sqlite3.connect(str(self.cache_dir / "index.sqlite3"), timeout=30,
+                                     isolation_level=None, check_same_thread=False)
+        with self.lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, dim INTEGER NOT NULL, row INTEGER NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+        # (模型, 维度) -> 已映射的向量数组，文件增长后按需重新映射
+        self._maps: Dict[tuple, np.memmap] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """文本内容的SHA-256（与分块的稳定ID相同）"""
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _vectors_path(self, model: str, dim: int) -> Path:
+        """模型与维度对应的向量数组文件"""
+        return self.cache_dir / f"{hashlib.sha256(model.encode()).hexdigest()[:16]}-{dim}.f32"
+
+    def _read_row(self, model: str, dim: int, row: int) -> np.ndarray:
+        """读取一行向量（调用方需持有锁）"""
+        key = (model, dim)
+        vectors = self._maps.get(key)
+        if vectors is None or row >= vectors.shape[0]:
+            path = self._vectors_path(model, dim)
+            rows = os.path.getsize(path) // (dim * 4)
+            vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim))
+            self._maps[key] = vectors
+        return np.array(vectors[row])
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        批量查找嵌入向量
+
+        Args:
+            model: 嵌入模型标识
+            hashes: 文本哈希
+
+        Returns:
+            命中的 文本哈希 -> 向量
+        """
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        with self.lock:
+            # SQLite对单条语句的参数个数有限制，分批查询
+            for offset in range(0, len(hashes), 500):
+                batch = hashes[offset:offset + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, dim, row FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]).fetchall()
+                for text_hash, dim, row in rows:
+                    try:
+                        found[text_hash] = self._read_row(model, dim, row)
+                    except (OSError, ValueError, IndexError) as e:
+                        logger.warning(f"Failed to read cached embedding {text_hash}: {e}")
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        """
+        保存嵌入向量
+
+        Args:
+            model: 嵌入模型标识
+            vectors: 文本哈希 -> 向量
+        """
+        by_dim: Dict[int, List] = {}
+        for text_hash, vector in vectors.items():
+            by_dim.setdefault(len(vector), []).append((text_hash, vector))
+
+        for dim, items in by_dim.items():
+            path = self._vectors_path(model, dim)
+            data = np.asarray([vector for _, vector in items], dtype=np.float32)
+            row_bytes = dim * 4
+            with FileLock(f"{path}.lock"):
+                # 从最后一个完整的行之后写入，覆盖可能因异常退出留下的不完整数据
+                mode = "r+b" if path.exists() else "wb"
+                with open(path, mode) as f:
+                    f.seek(0, os.SEEK_END)
+                    first_row = f.tell() // row_bytes
+                    f.seek(first_row * row_bytes)
+                    f.write(data.tobytes())
+                    f.truncate()
+                with self.lock:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO embeddings (model, hash, dim, row) VALUES (?, ?, ?, ?)",
+                        [(model, text_hash, dim, first_row + offset) for offset, (text_hash, _) in enumerate(items)])
+
+    def record(self, hits: int, misses: int):
+        """记录命中与未命中的文本数"""
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get_stats(self) -> Dict:
+        """
+        获取嵌入缓存的统计信息
+
+        Returns:
+            包含缓存的向量数、命中/未命中次数与命中率的字典
+        """
+        with self.lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带嵌入缓存的Embeddings包装
+
+    文档与查询的嵌入都先查找缓存，只把未命中的文本发送给底层的嵌入服务。
+    查询嵌入使用单独的键空间，兼容对查询与文档使用不同指令的模型。
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache = None):
+        """
+        Args:
+            embeddings: 底层的嵌入服务
+            model: 嵌入模型标识（服务商与模型名），不同模型的向量互不共用
+            cache: 嵌入缓存，默认使用全局实例
+        """
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache or get_embedding_cache()
+
+    def _embed(self, texts: List[str], model: str, embed) -> List[List[float]]:
+        hashes = [self.cache.text_hash(text) for text in texts]
+        found = self.cache.get_many(model, hashes)
+        # 同一批中重复的文本只请求一次
+        missing = {text_hash: text for text_hash, text in zip(hashes, texts) if text_hash not in found}
+        if missing:
+            vectors = dict(zip(missing, embed(list(missing.values()))))
+            self.cache.put_many(model, vectors)
+            found.update((text_hash, np.asarray(vector, dtype=np.float32)) for text_hash, vector in vectors.items())
+        # 重复的文本只请求一次，只有实际发出请求的文本计为未命中
+        self.cache.record(hits=len(hashes) - len(missing), misses=len(missing))
+        return [found[text_hash].tolist() for text_hash in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, self.model, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], f"{self.model}#query", lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+
+# 全局实例
+embedding_cache = None
+
+def get_embedding_cache():
+    """
+    获取全局嵌入缓存实例，所有知识库共用
+
+    Returns:
+        EmbeddingCache实例
+    """
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache()
+    return embedding_cache
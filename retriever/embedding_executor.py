@@ -0,0 +1,279 @@
+import hashlib
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock
+from typing import Callable, Dict, List, Tuple, TypeVar
+from langchain_core.embeddings import Embeddings
+from config.settings import settings
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计文本的token数
+
+    中文每个字约占一个token（UTF-8下3字节），英文约4个字符一个token，按UTF-8字节数除以3估计，
+    对中英文都略微偏大，用于打包请求时留有余量。
+    """
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def _status_code(error: Exception):
+    """从异常中取出HTTP状态码（openai等客户端的异常带有status_code或response）"""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _is_transient(error: Exception) -> bool:
+    """服务端错误、超时与连接错误可以重试，认证、参数等错误直接失败"""
+    code = _status_code(error)
+    if code is not None:
+        return code >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or \
+        type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _retry_after(error: Exception):
+    """服务端通过Retry-After响应头要求的等待秒数"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """
+    自适应的并发限制
+
+    收到429（限流）时把允许同时进行的请求数减半，并暂停所有新请求一段时间；
+    之后每连续成功limit次请求，允许的并发数加一，直到恢复到上限（加性增、乘性减）。
+    """
+
+    def __init__(self, max_in_flight: int):
+        self.max_limit = max(1, max_in_flight)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.successes = 0
+        self.throttled = 0
+        self.cond = Condition()
+
+    def acquire(self):
+        """等待直到可以发出新的请求"""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.cond.wait(self.paused_until - now)
+                elif self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                else:
+                    self.cond.wait()
+
+    def release(self, throttled: bool = False, delay: float = 0.0):
+        """
+        请求结束
+
+        Args:
+            throttled: 请求是否被限流
+            delay: 被限流时暂停新请求的秒数
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            else:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.cond.notify_all()
+
+
+class EmbeddingExecutor:
+    """
+    并发的嵌入请求执行器
+
+    把一次嵌入的文本按token预算与条数上限打包成若干批，用线程池同时发出多个批次，
+    并通过AdaptiveLimiter在限流时自动降低并发、退避重试，单个429不会导致整次构建失败。
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = None, max_batch_tokens: int = None,
+                 max_in_flight: int = None, max_retries: int = None):
+        """
+        Args:
+            embeddings: 底层的嵌入服务
+            max_batch_size: 每个请求最多包含的文本数
+            max_batch_tokens: 每个请求的token预算（估计值）
+            max_in_flight: 最多同时进行的请求数
+            max_retries: 单个批次被限流或遇到临时错误时的最大重试次数
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max(1, max_batch_size or settings.EMBEDDING_MAX_BATCH_SIZE)
+        self.max_batch_tokens = max(1, max_batch_tokens or settings.EMBEDDING_MAX_BATCH_TOKENS)
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        max_in_flight = max(1, max_in_flight or settings.EMBEDDING_MAX_IN_FLIGHT)
+        self.limiter = AdaptiveLimiter(max_in_flight)
+        self.pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedding")
+        self.lock = Lock()
+        self.chunks = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def pack(self, texts: List[str]) -> List[List[int]]:
+        """按token预算与条数上限把文本（下标）打包成批次，保持原有顺序"""
+        batches, current, tokens = [], [], 0
+        for index, text in enumerate(texts):
+            cost = estimate_tokens(text)
+            if current and (len(current) >= self.max_batch_size or tokens + cost > self.max_batch_tokens):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(index)
+            tokens += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def call(self, func: Callable[[], T]) -> T:
+        """在并发限制下执行一次请求，限流时退避后重试"""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                result = func()
+            except Exception as e:
+                backoff = min(60.0, 2 ** attempt) * (0.5 + random.random())
+                if _is_rate_limited(e):
+                    delay = _retry_after(e) or backoff
+                    self.limiter.release(throttled=True, delay=delay)
+                    logger.warning(f"Embedding request rate limited, retrying in {delay:.1f}s "
+                                   f"(concurrency now {self.limiter.limit})")
+                elif _is_transient(e):
+                    self.limiter.release()
+                    logger.warning(f"Embedding request failed ({e}), retrying in {backoff:.1f}s")
+                    time.sleep(backoff)
+                else:
+                    self.limiter.release()
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                continue
+            self.limiter.release()
+            return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """并发嵌入所有文本，返回的向量与输入顺序一致"""
+        if not texts:
+            return []
+        start = time.perf_counter()
+        batches = self.pack(texts)
+        futures = [
+            self.pool.submit(self.call, lambda batch=batch: self.embeddings.embed_documents([texts[i] for i in batch]))
+            for batch in batches
+        ]
+        vectors: List[List[float]] = [None] * len(texts)
+        for batch, future in zip(batches, futures):
+            for index, vector in zip(batch, future.result()):
+                vectors[index] = vector
+
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.chunks += len(texts)
+            self.batches += len(batches)
+            self.seconds += elapsed
+        logger.info(f"Embedded {len(texts)} chunks in {len(batches)} requests, {elapsed:.2f}s "
+                    f"({len(texts) / elapsed if elapsed > 0 else 0:.1f} chunks/s)")
+        return vectors
+
+    def get_stats(self) -> Dict:
+        """
+        获取嵌入请求的统计信息
+
+        Returns:
+            包含累计嵌入的分块数、请求数、耗时、吞吐量（chunks/s）、限流次数与当前并发上限的字典
+        """
+        with self.lock:
+            return {
+                "chunks": self.chunks,
+                "batches": self.batches,
+                "seconds": self.seconds,
+                "chunks_per_second": self.chunks / self.seconds if self.seconds > 0 else 0.0,
+                "throttled": self.limiter.throttled,
+                "concurrency": self.limiter.limit,
+            }
+
+
+class ConcurrentEmbeddings(Embeddings):
+    """通过EmbeddingExecutor发出请求的Embeddings包装"""
+
+    def __init__(self, embeddings: Embeddings, executor: EmbeddingExecutor = None):
+        self.embeddings = embeddings
+        self.executor = executor or EmbeddingExecutor(embeddings)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.executor.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.executor.call(lambda: self.embeddings.embed_query(text))
+
+
+def _secret_value(value) -> str:
+    """取出pydantic SecretStr中的明文，其他值转为字符串"""
+    if hasattr(value, "get_secret_value"):
+        value = value.get_secret_value()
+    return "" if value is None else str(value)
+
+
+def credential_identity(embeddings: Embeddings) -> str:
+    """
+    嵌入服务的服务商与账号标识
+
+    由服务类型、服务地址与API Key计算哈希，不保存明文的API Key；
+    相同模型名在不同服务商或不同账号下的限流互不相关。
+    """
+    base_url = next((getattr(embeddings, name) for name in ("openai_api_base", "base_url")
+                     if getattr(embeddings, name, None)), None)
+    api_key = next((getattr(embeddings, name) for name in ("openai_api_key", "api_key")
+                    if getattr(embeddings, name, None)), None)
+    identity = "\0".join((type(embeddings).__name__, _secret_value(base_url), _secret_value(api_key)))
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+
+
+embedding_executors: Dict[Tuple[str, str], EmbeddingExecutor] = {}
+embedding_executors_lock = Lock()
+
+def get_embedding_executor(model: str, embeddings: Embeddings) -> EmbeddingExecutor:
+    """
+    获取指定嵌入模型的全局执行器，使用同一服务商账号与模型的知识库共用线程池与限流状态
+
+    限流是按服务商账号与模型计算的，共用执行器才能让并发上限与退避对所有知识库同时生效，
+    重建检索器时也不会丢失已经调整好的并发数；执行器按模型与credential_identity区分，
+    使用不同服务地址或API Key的知识库不会共用同一个（以及其中的底层嵌入服务）。
+
+    Args:
+        model: 嵌入模型的唯一标识，如 "siliconflow/BAAI/bge-m3"
+        embeddings: 首次创建执行器时使用的底层嵌入服务
+
+    Returns:
+        EmbeddingExecutor实例
+    """
+    key = (model, credential_identity(embeddings))
+    with embedding_executors_lock:
+        executor = embedding_executors.get(key)
+        if executor is None:
+            executor = embedding_executors[key] = EmbeddingExecutor(embeddings)
+        return executor
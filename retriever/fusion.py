@@ -0,0 +1,89 @@
+import heapq
+import logging
+from typing import Dict, Iterable, List, Sequence, Tuple
+from langchain_core.documents import Document
+from document_processor import chunk_id
+logger = logging.getLogger(__name__)
+
+# 分数越小越相关的检索器标记（Chroma返回的是距离）
+DISTANCE_FLAGS = frozenset({"vector"})
+FUSION_MODES = ("rrf", "minmax")
+
+
+def _normalize(ranked: Sequence[Tuple[Document, float]], flag: str) -> List[Tuple[Document, float]]:
+    """把单个检索器的结果统一为按相关性降序排列的 (文档, 分数)，未带分数的文档分数为0"""
+    items = [item if isinstance(item, tuple) else (item, item.metadata.get("score", 0)) for item in ranked]
+    return sorted(items, key=lambda item: item[1], reverse=flag not in DISTANCE_FLAGS)
+
+
+def _rrf_scores(ranked: List[Tuple[Document, float]], flag: str, rrf_k: int) -> List[float]:
+    """倒数排名融合：第r名（从1开始）得分 1 / (rrf_k + r)，只依赖名次，不受各检索器分数尺度影响"""
+    return [1.0 / (rrf_k + rank) for rank in range(1, len(ranked) + 1)]
+
+
+def _minmax_scores(ranked: List[Tuple[Document, float]], flag: str, rrf_k: int) -> List[float]:
+    """最小-最大归一化到 [0, 1]，距离取反使1始终表示最相关；分数都相同时均为1"""
+    scores = [score for _, score in ranked]
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0] * len(scores)
+    if flag in DISTANCE_FLAGS:
+        return [(high - score) / (high - low) for score in scores]
+    return [(score - low) / (high - low) for score in scores]
+
+
+_SCORERS = {"rrf": _rrf_scores, "minmax": _minmax_scores}
+
+
+def fuse(results: Iterable[Sequence], weights: Sequence[float], flags: Sequence[str], mode: str = "rrf",
+         top_k: int = None, rrf_k: int = 60) -> List[Document]:
+    """
+    融合多个检索器的结果
+
+    每个检索器的结果先按mode换算为可比较的分数，乘以该检索器的权重后按分块ID累加，
+    被多个检索器同时召回的文档得分更高。最后用堆选出得分最高的top_k个文档，无需对全部候选排序。
+
+    Args:
+        results: 与flags一一对应的检索结果，元素为 (文档, 分数) 或带metadata["score"]的文档
+        weights: 各检索器的权重
+        flags: 各检索器的标记，DISTANCE_FLAGS中的检索器分数越小越相关
+        mode: "rrf"（倒数排名融合）或"minmax"（最小-最大归一化后加权求和）
+        top_k: 最多返回的文档数，None表示不限制
+        rrf_k: 倒数排名融合的平滑常数
+
+    Returns:
+        按融合分数降序排列的文档，metadata["score"]为融合分数，
+        metadata["retrieval_source"]为贡献分数最多的检索器标记
+    """
+    if mode not in _SCORERS:
+        raise ValueError(f"Unknown fusion mode: {mode}, expected one of {FUSION_MODES}")
+    scorer = _SCORERS[mode]
+    # 分块ID -> [融合分数, 文档, {检索器标记: 贡献的分数}]
+    fused: Dict[str, list] = {}
+    for ranked, weight, flag in zip(results, weights, flags):
+        ranked = _normalize(ranked, flag)
+        if not ranked:
+            continue
+        seen = set()
+        for (doc, _), score in zip(ranked, scorer(ranked, flag, rrf_k)):
+            key = chunk_id(doc)
+            # 同一检索器重复返回的文档只计一次
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = fused.setdefault(key, [0.0, doc, {}])
+            entry[0] += weight * score
+            entry[2][flag] = weight * score
+
+    if top_k is None:
+        top_k = len(fused)
+    selected = heapq.nlargest(top_k, fused.values(), key=lambda entry: entry[0])
+    docs = []
+    for score, doc, sources in selected:
+        if doc.metadata is None:
+            doc.metadata = {}
+        doc.metadata["score"] = score
+        doc.metadata["retrieval_source"] = max(sources, key=sources.get)
+        docs.append(doc)
+    logger.debug(f"Fused {len(fused)} candidates into {len(docs)} documents ({mode})")
+    return docs
@@ -0,0 +1,56 @@
+# 流式入库相关的工具函数
+import queue
+from threading import Thread
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def prefetch(items: Iterable[T], max_pending: int) -> Iterator[T]:
+    """
+    在后台线程中迭代items，通过有界队列交给调用方
+
+    文档解析（生产者）与嵌入入库（消费者）因此可以重叠进行；队列满时生产者会阻塞，
+    避免解析速度远快于嵌入时在内存中堆积大量分块。生产者中的异常会在调用方重新抛出。
+
+    Args:
+        items: 待迭代的对象，例如处理器的iter_process结果
+        max_pending: 队列中最多缓存的元素数量
+    """
+    pending = queue.Queue(maxsize=max(1, max_pending))
+    stopped = False
+
+    def put(item) -> bool:
+        """放入队列，调用方已经停止消费时放弃并返回False"""
+        while not stopped:
+            try:
+                pending.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    producer = Thread(target=produce, name="ingest-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # 调用方提前结束（或出错）时通知生产者停止
+        stopped = True
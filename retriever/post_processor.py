@@ -3,6 +3,7 @@ from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 import logging
 from pydantic import Field
+from document_processor import chunk_id
 
 logger = logging.getLogger(__name__)
 
@@ -67,7 +68,7 @@ class PostProcessingRetriever(BaseRetriever):
 
 def deduplicate_documents(docs: List[Document]) -> List[Document]:
     """
-    去除重复文档
+    去除重复文档（按分块ID）
     
     Args:
         docs: 文档列表
@@ -75,12 +76,13 @@ def deduplicate_documents(docs: List[Document]) -> List[Document]:
     Returns:
         去重后的文档列表
     """
-    seen_content = set()
+    seen_ids = set()
     unique_docs = []
     
     for doc in docs:
-        if doc.page_content not in seen_content:
-            seen_content.add(doc.page_content)
+        key = chunk_id(doc)
+        if key not in seen_ids:
+            seen_ids.add(key)
             unique_docs.append(doc)
             
     logger.debug(f"Deduplicated documents: {len(docs)} -> {len(unique_docs)}")
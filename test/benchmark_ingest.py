@@ -0,0 +1,262 @@
+"""
+文档解析基准测试
+
+针对DoclingProcessor / BaseDocumentProcessor测量:
+  - 冷启动解析耗时（新建转换器池后的首次解析，包含模型加载）与每页耗时
+  - 预热后的解析耗时与每页耗时、每秒产出的分块数
+  - 缓存未命中、磁盘缓存命中与内存缓存命中时process()的耗时
+  - 各压缩算法下分块缓存的文件大小、压缩耗时与解压（打开并读取全部分块）耗时
+  - 进程峰值内存（RSS）
+
+结果以JSON格式输出，并可与保存的基线比较，超出容差时以非零状态码退出。
+
+用法（在项目根目录下运行）:
+    python test/benchmark_ingest.py
+    python test/benchmark_ingest.py --files test/ocr_test.pdf my.docx --repeat 5 --output bench.json
+    python test/benchmark_ingest.py --save-baseline test/benchmark_baseline.json
+    python test/benchmark_ingest.py --baseline test/benchmark_baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEFAULT_FILES = ["test/ocr_test.pdf"]
+
+# 参与基线比较的指标，以及该指标是否越小越好
+COMPARED_METRICS = {
+    "cold_parse_per_page_s": True,
+    "warm_parse_per_page_s": True,
+    "cache_miss_s": True,
+    "cache_hit_s": True,
+    "cache_memory_hit_s": True,
+    "cache_decode_s": True,
+    "chunks_per_second": False,
+}
+
+
+### 🔹 Helpers
+def peak_rss_mb() -> float:
+    """获取当前进程的峰值内存（MB）"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux下单位为KB，macOS下为字节
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+
+def page_count(file_path: str) -> int:
+    """获取文件页数，非PDF文件按1页计"""
+    if file_path.lower().endswith(".pdf"):
+        from document_processor.pdf_utils import count_pdf_pages
+        return count_pdf_pages(file_path)
+    return 1
+
+
+def timed(func, *args):
+    """执行函数并返回 (结果, 耗时秒数)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def measure_codecs(chunks, repeat: int, cache_dir: str) -> dict:
+    """
+    用各个可用的压缩算法写入同一组分块，测量文件大小、压缩耗时与解压耗时
+
+    解压耗时包括打开缓存文件并构建全部Document，即缓存命中时读取磁盘的开销。
+    """
+    from config.settings import settings
+    from document_processor.cache_format import CachedChunks, available_codecs, write_chunks
+
+    results = {}
+    for codec in available_codecs():
+        path = os.path.join(cache_dir, f"codec_{codec}.chunks")
+        _, encode = timed(write_chunks, path, chunks, None, codec, settings.CACHE_COMPRESSION_LEVEL)
+
+        def decode():
+            with CachedChunks(path) as cached:
+                return list(cached)
+
+        decode_runs = [timed(decode)[1] for _ in range(repeat)]
+        results[codec] = {
+            "size_bytes": os.path.getsize(path),
+            "encode_s": encode,
+            "decode_s": statistics.median(decode_runs),
+        }
+    raw = results["none"]["size_bytes"]
+    for metrics in results.values():
+        metrics["compression_ratio"] = raw / metrics["size_bytes"] if metrics["size_bytes"] else 0.0
+    return results
+
+
+### 🔹 Benchmark
+def benchmark_file(file_path: str, repeat: int, cache_root: str) -> dict:
+    """
+    对单个文件进行基准测试
+
+    每个文件都使用新建的转换器池和空的缓存目录，保证冷启动与缓存未命中的测量互不影响。
+    """
+    from config.settings import settings
+    from document_processor import DoclingProcessor
+    import document_processor.converter_pool as pool_module
+    from utils.memory_cache import get_memory_cache
+
+    # 在缓存根目录下为每个文件新建子目录，缓存清单保留在根目录中
+    with tempfile.TemporaryDirectory(prefix="docchat_bench_", dir=cache_root) as cache_dir:
+        settings.CACHE_DIR_PATH = cache_dir
+        pool_module.converter_pool = None  # 丢弃已加载的模型，测量冷启动
+        processor = DoclingProcessor()
+        upload = SimpleNamespace(name=file_path)
+        pages = page_count(file_path)
+
+        chunks, cold = timed(processor._process_file, file_path)
+        warm_runs = [timed(processor._process_file, file_path)[1] for _ in range(repeat)]
+        _, cache_miss = timed(processor.process, [upload])
+        # 磁盘命中：每次运行前清空内存缓存；内存命中：上一次运行已将缓存文件放入内存缓存
+        hit_runs = []
+        for _ in range(repeat):
+            get_memory_cache().clear()
+            hit_runs.append(timed(processor.process, [upload])[1])
+        memory_hit_runs = [timed(processor.process, [upload])[1] for _ in range(repeat)]
+        processor.shutdown()
+        codecs = measure_codecs(chunks, repeat, cache_dir)
+
+    warm = statistics.median(warm_runs)
+    configured = codecs.get(settings.CACHE_COMPRESSION, codecs["none"])
+    return {
+        "pages": pages,
+        "chunks": len(chunks),
+        "cold_parse_s": cold,
+        "cold_parse_per_page_s": cold / pages,
+        "warm_parse_s": warm,
+        "warm_parse_per_page_s": warm / pages,
+        "chunks_per_second": len(chunks) / warm if warm > 0 else 0.0,
+        "cache_miss_s": cache_miss,
+        "cache_hit_s": statistics.median(hit_runs),
+        "cache_memory_hit_s": statistics.median(memory_hit_runs),
+        "cache_decode_s": configured["decode_s"],
+        "cache_file_bytes": configured["size_bytes"],
+        "codecs": codecs,
+    }
+
+
+def run_benchmark(files, repeat: int) -> dict:
+    """对所有文件进行基准测试并汇总结果"""
+    from config.settings import settings
+    from utils.cache_queue import get_cache_queue_manager
+
+    # 缓存队列管理器同样指向临时目录，避免清理或统计到正式的缓存文件
+    cache_root = tempfile.mkdtemp(prefix="docchat_bench_cache_")
+    settings.CACHE_DIR_PATH = cache_root
+    settings.CACHE_DIR = tempfile.mkdtemp(prefix="docchat_bench_queue_")
+    settings.DOCLING_WARMUP = False
+    get_cache_queue_manager()
+
+    results = {}
+    for file_path in files:
+        print(f"\n🔍 Benchmarking {file_path} ...", file=sys.stderr)
+        results[file_path] = benchmark_file(file_path, repeat, cache_root)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.time(),
+        },
+        "config": {
+            "repeat": repeat,
+            "processor_workers": settings.PROCESSOR_WORKERS,
+            "ocr_mode": settings.DOCLING_OCR_MODE,
+            "ocr_lang": settings.DOCLING_OCR_LANG,
+            "cache_compression": settings.CACHE_COMPRESSION,
+            "cache_compression_level": settings.CACHE_COMPRESSION_LEVEL,
+        },
+        "files": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+### 🔹 Baseline comparison
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    与基线比较，返回超出容差的指标列表
+
+    越小越好的指标超过 基线 * (1 + tolerance) 视为退化，越大越好的指标低于 基线 * (1 - tolerance) 视为退化。
+    """
+    regressions = []
+
+    def check(name, current, previous, lower_is_better):
+        if previous in (None, 0) or current is None:
+            return
+        if lower_is_better:
+            regressed = current > previous * (1 + tolerance)
+        else:
+            regressed = current < previous * (1 - tolerance)
+        if regressed:
+            regressions.append({"metric": name, "baseline": previous, "current": current})
+
+    for file_path, metrics in report["files"].items():
+        previous = baseline.get("files", {}).get(file_path)
+        if previous is None:
+            continue
+        for metric, lower_is_better in COMPARED_METRICS.items():
+            check(f"{file_path}:{metric}", metrics.get(metric), previous.get(metric), lower_is_better)
+    check("peak_rss_mb", report.get("peak_rss_mb"), baseline.get("peak_rss_mb"), True)
+    return regressions
+
+
+### 🔹 Main Execution
+def main():
+    parser = argparse.ArgumentParser(description="DocChat ingestion benchmark")
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES, help="要测试的文件")
+    parser.add_argument("--repeat", type=int, default=3, help="预热解析与缓存命中的重复次数")
+    parser.add_argument("--output", help="JSON结果的保存路径，默认输出到标准输出")
+    parser.add_argument("--baseline", help="用于比较的基线JSON文件")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化幅度")
+    parser.add_argument("--save-baseline", help="将本次结果保存为基线")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别，日志输出到标准错误以免混入JSON结果")
+    args = parser.parse_args()
+
+    from utils.logging import logger
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level, format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
+
+    report = run_benchmark(args.files, max(1, args.repeat))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["regressions"] = compare_with_baseline(report, baseline, args.tolerance)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"\n✅ Baseline saved to {args.save_baseline}", file=sys.stderr)
+
+    if report.get("regressions"):
+        print(f"\n❌ {len(report['regressions'])} metrics regressed beyond {args.tolerance:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+pytest公共配置
+
+测试在项目根目录下运行（python -m pytest test/），导入项目模块前先把根目录加入sys.path，
+并指定检索器类型（retriever包在导入时按settings.RETRIEVER选择实现）。
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("RETRIEVER", "Chroma")
+
+
+@pytest.fixture
+def isolated_cache(tmp_path, monkeypatch):
+    """让处理器使用临时的缓存目录，以及新的缓存队列管理器与内存缓存"""
+    import utils.cache_queue as cache_queue
+    import utils.memory_cache as memory_cache
+    from config.settings import settings
+
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path / "document_cache"))
+    monkeypatch.setattr(settings, "CACHE_DIR_PATH", str(tmp_path / "cache"))
+    monkeypatch.setattr(cache_queue, "cache_queue_manager", None)
+    monkeypatch.setattr(memory_cache, "memory_cache", None)
+    yield tmp_path
+    if cache_queue.cache_queue_manager is not None:
+        cache_queue.cache_queue_manager.stop_cleanup_loop()
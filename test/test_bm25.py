@@ -0,0 +1,200 @@
+"""BM25Index的测试：与逐个文档计算的BM25分数比较，并覆盖删除、压缩与保存/加载"""
+import math
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from document_processor import chunk_id
+from retriever.bm25 import BM25Index, BM25Retriever, tokenize
+
+TEXTS = [
+    "the quick brown fox jumps over the lazy dog",
+    "a quick brown dog outpaces a quick fox",
+    "lazy afternoons are for sleeping dogs",
+    "检索增强生成结合了检索与生成",
+    "向量检索与关键词检索的混合检索",
+    "BM25 is a bag of words retrieval function",
+    "the fox and the hound",
+    "生成式模型 quick answers",
+]
+QUERIES = ["quick fox", "lazy dog", "检索", "混合检索", "retrieval function", "the", "不存在的词 zebra"]
+
+
+def make_docs(texts):
+    return [Document(page_content=text, metadata={"row": i}) for i, text in enumerate(texts)]
+
+
+def brute_force_scores(texts, query, k1=1.5, b=0.75):
+    """按定义逐个文档计算BM25分数（idf = log(1 + (N - df + 0.5) / (df + 0.5))）"""
+    docs = [Counter(tokenize(text)) for text in texts]
+    lengths = [sum(doc.values()) for doc in docs]
+    avgdl = sum(lengths) / len(lengths)
+    scores = []
+    for doc, length in zip(docs, lengths):
+        score = 0.0
+        for term, qtf in Counter(tokenize(query)).items():
+            df = sum(1 for other in docs if term in other)
+            if not df or term not in doc:
+                continue
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            tf = doc[term]
+            score += qtf * idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avgdl))
+        scores.append(score)
+    return np.array(scores)
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add(make_docs(TEXTS))
+    yield index
+    index.close()
+
+
+def test_tokenize():
+    assert tokenize("Hello, World_42") == ["hello", "world", "42"]
+    assert tokenize("检索a") == ["检", "索", "检索", "a"]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_brute_force(index, query):
+    np.testing.assert_allclose(index.get_scores(query), brute_force_scores(TEXTS, query), rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_top_k(index, query):
+    """top_k按分数降序返回分数大于0的分块"""
+    expected = brute_force_scores(TEXTS, query)
+    results = index.top_k(query, 3)
+    assert len(results) == min(3, int((expected > 0).sum()))
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    for position, score in results:
+        assert score == pytest.approx(expected[position], rel=1e-5)
+        assert score >= np.sort(expected)[-len(results)] - 1e-6
+
+
+def test_add_skips_existing_ids(index):
+    assert index.add(make_docs(TEXTS[:2])) == 0
+    assert len(index) == len(TEXTS)
+    assert chunk_id(make_docs(TEXTS[:1])[0]) in index
+
+
+def test_incremental_add_matches_bulk_build():
+    """分多次添加与一次性构建的分数相同"""
+    index = BM25Index()
+    index.add(make_docs(TEXTS[:3]))
+    index.add(make_docs(TEXTS[3:]))
+    for query in QUERIES:
+        np.testing.assert_allclose(index.get_scores(query), brute_force_scores(TEXTS, query), rtol=1e-5, atol=1e-6)
+
+
+def test_delete(index):
+    removed = [chunk_id(doc) for doc in make_docs(TEXTS[:2])]
+    assert index.delete(removed + ["missing"]) == 2
+    assert len(index) == len(TEXTS) - 2
+    assert all(id_ not in index for id_ in removed)
+    scores = index.get_scores("quick fox")
+    assert scores[0] == 0 and scores[1] == 0
+    assert all(position >= 2 for position, _ in index.top_k("quick fox", 10))
+
+
+def test_scores_with_tombstones_match_live_docs(index):
+    """有墓碑（未压缩）时的分数与只由剩余文档计算的BM25相同，不会出现负分"""
+    deleted = [0, 1, 6]
+    index.delete([chunk_id(doc) for i, doc in enumerate(make_docs(TEXTS)) if i in deleted])
+    live = [i for i in range(len(TEXTS)) if i not in deleted]
+    for query in QUERIES + ["fox", "quick brown fox"]:
+        scores = index.get_scores(query)
+        assert (scores >= 0).all()
+        assert not scores[deleted].any()
+        np.testing.assert_allclose(scores[live], brute_force_scores([TEXTS[i] for i in live], query),
+                                   rtol=1e-5, atol=1e-6)
+
+
+def test_compact(index):
+    """压缩后分块重新编号，分数与只由剩余文档构建的索引相同"""
+    index.delete([chunk_id(doc) for doc in make_docs(TEXTS[:3])])
+    index.compact()
+    remaining = TEXTS[3:]
+    assert len(index) == len(remaining) == len(index.doc_len)
+    assert [index.document(i).page_content for i in range(len(index))] == remaining
+    for query in QUERIES:
+        np.testing.assert_allclose(index.get_scores(query), brute_force_scores(remaining, query), rtol=1e-5, atol=1e-6)
+
+
+def test_save_and_load(index, tmp_path):
+    path = tmp_path / "bm25"
+    index.save(path)
+    loaded = BM25Index.load(path)
+    try:
+        assert isinstance(loaded.postings, np.memmap)
+        assert loaded.live_ids() == index.live_ids()
+        assert loaded.document(3).page_content == TEXTS[3]
+        assert loaded.document(3).metadata["row"] == 3
+        for query in QUERIES:
+            np.testing.assert_allclose(loaded.get_scores(query), index.get_scores(query))
+        # 加载后的索引仍可以增删并再次保存
+        loaded.add(make_docs(["a brand new quick document"]))
+        loaded.delete([chunk_id(make_docs(TEXTS[:1])[0])])
+        loaded.save(path)
+    finally:
+        loaded.close()
+
+    reloaded = BM25Index.load(path)
+    try:
+        assert len(reloaded) == len(TEXTS)
+        assert reloaded.document(len(TEXTS)).page_content == "a brand new quick document"
+    finally:
+        reloaded.close()
+
+
+def test_save_compacts_tombstones(index, tmp_path):
+    """墓碑占比超过COMPACT_RATIO时保存前压缩"""
+    index.delete([chunk_id(doc) for doc in make_docs(TEXTS[:4])])
+    index.save(tmp_path / "bm25")
+    assert len(index.doc_len) == len(index) == len(TEXTS) - 4
+    assert not index.deleted.any()
+
+
+def test_save_ignores_stale_and_concurrent_dirs(index, tmp_path):
+    """残留的临时/旧目录不影响保存，同一进程内并发保存同一路径不会冲突"""
+    path = tmp_path / "bm25"
+    for name in (f"bm25.old-{os.getpid()}", f"bm25.tmp-{os.getpid()}"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "leftover").write_text("x")
+    index.save(path)
+
+    copies = [BM25Index.load(path) for _ in range(4)]
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(lambda copy: copy.save(path), copies))
+    finally:
+        for copy in copies:
+            copy.close()
+    reloaded = BM25Index.load(path)
+    try:
+        assert reloaded.live_ids() == index.live_ids()
+    finally:
+        reloaded.close()
+    # 只剩下索引目录与测试放入的残留目录
+    assert sorted(item.name for item in tmp_path.iterdir()) == \
+        sorted(["bm25", f"bm25.old-{os.getpid()}", f"bm25.tmp-{os.getpid()}"])
+
+
+def test_load_rejects_other_versions(index, tmp_path):
+    path = tmp_path / "bm25"
+    index.save(path)
+    (path / "meta.json").write_text('{"version": 0, "k1": 1.5, "b": 0.75}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        BM25Index.load(path)
+
+
+def test_retriever_sets_scores(index):
+    docs = BM25Retriever(index, k=2).invoke("quick fox")
+    assert len(docs) == 2
+    assert docs[0].metadata["score"] >= docs[1].metadata["score"] > 0
@@ -0,0 +1,104 @@
+"""列式分块缓存格式（cache_format）的测试"""
+import pytest
+from langchain_core.documents import Document
+
+from document_processor.cache_format import (
+    _HEADER, CacheFormatError, CachedChunks, available_codecs, write_chunks,
+)
+
+CHUNKS = [
+    Document(page_content="第一段文本", metadata={"source": "a.pdf", "page": 1}),
+    Document(page_content="second chunk", metadata={"source": "a.pdf", "page": 2}),
+    Document(page_content="", metadata={}),
+    Document(page_content="第一段文本", metadata={"source": "a.pdf", "page": 1}),
+]
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_round_trip(tmp_path, codec):
+    """每种压缩算法写入后都能按原顺序读回相同的文本与元数据"""
+    path = tmp_path / f"{codec}.chunks"
+    size = write_chunks(path, CHUNKS, created=123.0, codec=codec)
+    assert size == path.stat().st_size
+
+    with CachedChunks(path) as cached:
+        assert cached.created == 123.0
+        assert len(cached) == len(CHUNKS)
+        assert [(doc.page_content, doc.metadata) for doc in cached] == \
+            [(doc.page_content, doc.metadata) for doc in CHUNKS]
+        assert cached[-1].page_content == CHUNKS[-1].page_content
+
+
+def test_documents_are_independent(tmp_path):
+    """修改返回的Document不会影响缓存中的内容"""
+    path = tmp_path / "docs.chunks"
+    write_chunks(path, CHUNKS)
+    with CachedChunks(path) as cached:
+        cached[0].metadata["page"] = 99
+        assert cached[0].metadata["page"] == 1
+
+
+def test_unknown_codec(tmp_path):
+    with pytest.raises(ValueError):
+        write_chunks(tmp_path / "docs.chunks", CHUNKS, codec="brotli")
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.chunks"
+    path.write_bytes(b"")
+    with pytest.raises(CacheFormatError):
+        CachedChunks(path)
+
+
+def test_bad_magic(tmp_path):
+    path = tmp_path / "bad.chunks"
+    write_chunks(path, CHUNKS)
+    data = bytearray(path.read_bytes())
+    data[:8] = b"NOTCHUNK"
+    path.write_bytes(bytes(data))
+    with pytest.raises(CacheFormatError):
+        CachedChunks(path)
+
+
+def test_unsupported_version(tmp_path):
+    path = tmp_path / "future.chunks"
+    write_chunks(path, CHUNKS)
+    data = bytearray(path.read_bytes())
+    data[8:10] = (999).to_bytes(2, "little")
+    path.write_bytes(bytes(data))
+    with pytest.raises(CacheFormatError):
+        CachedChunks(path)
+
+
+@pytest.mark.parametrize("size", [_HEADER.size - 1, _HEADER.size + 4])
+def test_truncated_file(tmp_path, size):
+    """文件头或偏移量数组不完整时视为损坏"""
+    path = tmp_path / "truncated.chunks"
+    write_chunks(path, CHUNKS)
+    path.write_bytes(path.read_bytes()[:size])
+    with pytest.raises(CacheFormatError):
+        CachedChunks(path)
+
+
+@pytest.mark.parametrize("codec", [codec for codec in available_codecs() if codec != "none"])
+def test_corrupt_compressed_payload(tmp_path, codec):
+    """压缩数据段损坏时抛出CacheFormatError而不是底层的解压异常"""
+    path = tmp_path / "corrupt.chunks"
+    write_chunks(path, CHUNKS, codec=codec)
+    data = path.read_bytes()
+    path.write_bytes(data[:-8] + b"\xff" * 8)
+    with pytest.raises(CacheFormatError):
+        CachedChunks(path)
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_in_memory_holds_no_file(tmp_path, codec):
+    """in_memory模式读入整个文件，删除文件后仍可访问，也不持有mmap"""
+    path = tmp_path / f"{codec}.chunks"
+    write_chunks(path, CHUNKS, codec=codec)
+    cached = CachedChunks(path, in_memory=True)
+    path.unlink()
+    assert cached._mmap is None
+    assert [(doc.page_content, doc.metadata) for doc in cached] == \
+        [(doc.page_content, doc.metadata) for doc in CHUNKS]
+    cached.close()
@@ -0,0 +1,98 @@
+"""按配置生成缓存键与两级缓存的测试"""
+import pickle
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+from langchain_core.documents import Document
+
+from document_processor.base import BaseDocumentProcessor
+
+
+class ConvertingProcessor(BaseDocumentProcessor):
+    """先"转换"（读取文件）再按分隔符分块的处理器，记录转换次数"""
+
+    def __init__(self, separator: str = "\n", **kwargs):
+        super().__init__(**kwargs)
+        self.separator = separator
+        self.conversions = 0
+
+    def _process_file(self, file_path: str) -> List[Document]:
+        return self._split_markdown(self._convert_file(file_path), file_path)
+
+    def _uses_conversion_cache(self, file_path: str) -> bool:
+        return True
+
+    def _convert_file(self, file_path: str) -> str:
+        self.conversions += 1
+        with open(file_path, encoding="utf-8") as f:
+            return f.read()
+
+    def _split_markdown(self, markdown: str, file_path: str) -> List[Document]:
+        return [Document(page_content=part) for part in markdown.split(self.separator) if part]
+
+    def splitter_signature(self) -> Dict:
+        return {"separator": self.separator}
+
+
+def make_file(directory, content="a b\nc d"):
+    path = directory / "doc.txt"
+    path.write_text(content, encoding="utf-8")
+    return SimpleNamespace(name=str(path))
+
+
+def test_changing_splitter_reuses_conversion(isolated_cache):
+    file = make_file(isolated_cache)
+    lines = ConvertingProcessor("\n")
+    assert [doc.page_content for doc in lines.process([file])] == ["a b", "c d"]
+    assert [doc.page_content for doc in lines.process([file])] == ["a b", "c d"]
+    assert lines.conversions == 1
+
+    # 只修改分块配置：二级缓存未命中，一级缓存（转换结果）命中，无需重新转换
+    words = ConvertingProcessor(" ")
+    assert [doc.page_content for doc in words.process([file])] == ["a", "b\nc", "d"]
+    assert words.conversions == 0
+
+
+def test_legacy_pickle_cache_is_ignored(isolated_cache):
+    """旧版本以文件哈希为键的pickle缓存不含配置信息，不会被当作当前配置的结果返回"""
+    from utils.fingerprint import get_fingerprinter
+
+    file = make_file(isolated_cache)
+    processor = ConvertingProcessor()
+    legacy = processor.cache_dir / f"{get_fingerprinter().fingerprint(file.name)}.pkl"
+    with open(legacy, "wb") as f:
+        pickle.dump({"chunks": [Document(page_content="stale")]}, f)
+
+    assert [doc.page_content for doc in processor.process([file])] == ["a b", "c d"]
+    assert processor.conversions == 1
+
+
+def test_docling_signature_includes_sharding(isolated_cache, monkeypatch):
+    from config.settings import settings
+    from document_processor import DoclingProcessor
+
+    processor = DoclingProcessor(max_workers=1)
+    assert processor.converter_signature("a.pdf")["shard"] is None
+
+    processor.max_workers = 4
+    monkeypatch.setattr(settings, "DOCLING_SHARD_PAGES", 8)
+    sharded = processor.converter_signature("a.pdf")
+    assert sharded["shard"] == {"pages": 8, "min_pages": settings.DOCLING_SHARD_MIN_PAGES}
+    monkeypatch.setattr(settings, "DOCLING_SHARD_PAGES", 4)
+    assert processor._conversion_cache_key("hash", "a.pdf") != \
+        processor._signature_hash({"content": "hash", "converter": sharded})
+    assert processor.converter_signature("a.md") == {"processor": "text"}
+
+
+def test_memory_tier_holds_no_mmap(isolated_cache, monkeypatch):
+    """内存缓存中的分块已读入内存，不占用文件描述符；命中时不写缓存清单"""
+    file = make_file(isolated_cache)
+    processor = ConvertingProcessor()
+    processor.process([file])
+    cached = list(processor.memory_cache.entries.values())
+    assert cached and all(entry.value._mmap is None for entry in cached)
+
+    monkeypatch.setattr(processor.cache_queue.index, "touch", lambda *args: pytest.fail("memory hit wrote the manifest"))
+    assert [doc.page_content for doc in processor.process([file])] == ["a b", "c d"]
+    assert processor.conversions == 1
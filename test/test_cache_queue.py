@@ -0,0 +1,172 @@
+"""CacheQueueManager的测试：大小统计、过期清理与按大小的淘汰"""
+import time
+
+import pytest
+
+from utils.cache_queue import CacheQueueManager
+
+DAY = 24 * 60 * 60
+
+
+def write_file(directory, name, size=100):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = CacheQueueManager(cache_dir=str(tmp_path), expire_days=1, max_total_size=250)
+    assert manager._try_become_janitor()
+    yield manager
+    manager.stop_cleanup_loop()
+    manager._release_janitor()
+
+
+def test_add_and_stats(manager, tmp_path):
+    path = write_file(tmp_path, "a.chunks")
+    manager.add_file(path)
+    stats = manager.get_queue_stats()
+    assert stats["total_files"] == 1 and stats["total_size"] == 100 and stats["is_janitor"]
+    # 重新写入同一文件不会重复计算大小
+    manager.add_file(path)
+    assert manager.get_queue_stats()["total_size"] == 100
+    manager.remove_file(path)
+    assert manager.get_queue_stats()["total_size"] == 0
+
+
+def test_expired_files_are_removed(manager, tmp_path, monkeypatch):
+    old = write_file(tmp_path, "old.chunks")
+    manager.add_file(old)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + DAY / 2)
+    fresh = write_file(tmp_path, "fresh.chunks")
+    manager.add_file(fresh)
+
+    monkeypatch.setattr(time, "time", lambda: now + DAY + 1)
+    assert manager.cleanup_all_expired() == 1
+    assert not (tmp_path / "old.chunks").exists()
+    assert (tmp_path / "fresh.chunks").exists()
+    assert manager.get_queue_stats()["total_files"] == 1
+
+
+def test_size_limit_evicts_oldest(manager, tmp_path):
+    for name in ("first.chunks", "second.chunks", "third.chunks"):
+        manager.add_file(write_file(tmp_path, name))
+    assert not (tmp_path / "first.chunks").exists()
+    assert (tmp_path / "second.chunks").exists()
+    assert (tmp_path / "third.chunks").exists()
+    assert manager.get_queue_stats()["total_size"] == 200
+
+
+def test_update_config_shrinks_cache(manager, tmp_path):
+    for name in ("a.chunks", "b.chunks"):
+        manager.add_file(write_file(tmp_path, name))
+    manager.update_config(max_total_size=150)
+    assert not (tmp_path / "a.chunks").exists()
+    assert (tmp_path / "b.chunks").exists()
+
+
+def test_touch_extends_expiry(manager, tmp_path, monkeypatch):
+    path = write_file(tmp_path, "a.chunks")
+    manager.add_file(path)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + DAY / 2)
+    manager.touch_file(path)
+
+    monkeypatch.setattr(time, "time", lambda: now + DAY + 1)
+    assert manager.cleanup_all_expired() == 0
+    assert (tmp_path / "a.chunks").exists()
+
+
+def test_size_limit_evicts_least_recently_used(manager, tmp_path):
+    first = write_file(tmp_path, "first.chunks")
+    second = write_file(tmp_path, "second.chunks")
+    manager.add_file(first)
+    manager.add_file(second)
+    # 命中后first成为最近使用的文件，超出大小限制时先淘汰second
+    manager.touch_file(first)
+    manager.add_file(write_file(tmp_path, "third.chunks"))
+
+    assert (tmp_path / "first.chunks").exists()
+    assert not (tmp_path / "second.chunks").exists()
+    assert (tmp_path / "third.chunks").exists()
+    assert manager.get_queue_stats()["total_size"] == 200
+
+
+def test_cleanup_loop_wakes_on_next_expiry(manager, tmp_path):
+    """清理线程在空队列上等待时加入的文件，到期后立即被删除，而不是等到下一次轮询"""
+    manager.expire_seconds = 0.3
+    manager.start_cleanup_loop()
+    manager.add_file(write_file(tmp_path, "short.chunks"))
+    deadline = time.time() + 5
+    while (tmp_path / "short.chunks").exists() and time.time() < deadline:
+        time.sleep(0.05)
+    assert not (tmp_path / "short.chunks").exists()
+    assert manager.get_queue_stats()["total_files"] == 0
+
+
+def test_lookup_uses_manifest(manager, tmp_path, monkeypatch):
+    path = write_file(tmp_path, "a.chunks")
+    manager.add_file(path)
+    assert manager.lookup(path).size == 100
+    assert manager.lookup(str(tmp_path / "missing.chunks")) is None
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + DAY + 1)
+    assert manager.lookup(path) is None
+
+
+def test_manifest_is_shared(manager, tmp_path):
+    """同一缓存目录下新建的管理器从清单加载已有记录"""
+    path = write_file(tmp_path, "a.chunks")
+    manager.add_file(path)
+    other = CacheQueueManager(cache_dir=str(tmp_path), expire_days=1, max_total_size=250)
+    assert other.lookup(path) is not None
+    assert other.get_queue_stats()["total_size"] == 100
+
+
+def test_update_config_recomputes_expiry(manager, tmp_path):
+    """修改过期天数后，过期时间按最近访问时间加新有效期重新计算，重复应用不会累加"""
+    path = write_file(tmp_path, "a.chunks")
+    manager.add_file(path)
+    other = CacheQueueManager(cache_dir=str(tmp_path), expire_days=1, max_total_size=250)
+    manager.update_config(expire_days=3)
+    other.update_config(expire_days=3)
+    for queue in (manager, other):
+        assert queue.lookup(path).expire_time == pytest.approx(time.time() + 3 * DAY, abs=60)
+
+
+def test_deferred_touch_is_flushed_in_batch(manager, tmp_path, monkeypatch):
+    """内存缓存命中只更新本进程的队列，同步清单时批量写入访问时间"""
+    path = write_file(tmp_path, "a.chunks")
+    manager.add_file(path)
+    monkeypatch.setattr(manager.index, "touch", lambda *args: pytest.fail("memory hits must not write the manifest"))
+    before = manager.index.get(path).expire_time
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + DAY / 2)
+    manager.touch_file(path, defer=True)
+    assert manager.lookup(path).expire_time == pytest.approx(now + DAY / 2 + DAY)
+    assert manager.index.get(path).expire_time == before
+
+    # 同步前先写入延迟的访问记录，同步后不会丢失
+    manager._sync_from_index()
+    assert manager.index.get(path).expire_time == pytest.approx(now + DAY / 2 + DAY)
+    assert manager.lookup(path).expire_time == pytest.approx(now + DAY / 2 + DAY)
+    assert manager.flush_touches() == 0
+
+
+def test_deferred_touch_of_evicted_file_invalidates_memory(isolated_cache, tmp_path):
+    """延迟写入时发现文件已被其他进程删除，丢弃内存缓存中的副本"""
+    from utils.memory_cache import get_memory_cache
+
+    manager = CacheQueueManager(cache_dir=str(tmp_path), expire_days=1, max_total_size=250)
+    path = write_file(tmp_path, "a.chunks")
+    manager.add_file(path)
+    get_memory_cache().put(path, "chunks", 1)
+    manager.touch_file(path, defer=True)
+
+    manager.index.remove(manager._normalize(path))
+    (tmp_path / "a.chunks").unlink()
+    assert manager.flush_touches() == 1
+    assert get_memory_cache().get(path) is None
+    assert manager.get_queue_stats()["total_files"] == 0
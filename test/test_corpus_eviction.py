@@ -0,0 +1,57 @@
+"""按文档集合持久化的向量库集合与BM25索引的淘汰测试"""
+import os
+import time
+
+import chromadb
+import pytest
+
+from config.settings import settings
+from retriever.chroma import CORPUS_LAST_USED_KEY, RetrieverBuilder
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def builder(tmp_path):
+    # 只测试淘汰逻辑，不需要嵌入模型
+    builder = RetrieverBuilder.__new__(RetrieverBuilder)
+    builder.name = "kb"
+    builder.bm25_dir = str(tmp_path / "bm25")
+    return builder
+
+
+def add_corpus(client, builder, key, last_used):
+    client.create_collection(builder._collection_name(key), metadata={CORPUS_LAST_USED_KEY: last_used})
+    os.makedirs(builder._bm25_path(key))
+
+
+def remaining(client, builder):
+    return sorted(collection.name for collection in client.list_collections()), sorted(os.listdir(builder.bm25_dir))
+
+
+def test_keeps_most_recently_used(builder, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CORPUS_MAX_COUNT", 2)
+    monkeypatch.setattr(settings, "CORPUS_EXPIRE_DAYS", 0)
+    client = chromadb.PersistentClient(path=str(tmp_path / "vectors"))
+    now = time.time()
+    for i, key in enumerate(["a" * 16, "b" * 16, "c" * 16, "d" * 16]):
+        add_corpus(client, builder, key, now - i)
+
+    # 当前文档集合即使最久未使用也保留
+    assert builder._evict_corpora(client, "d" * 64) == 2
+    assert remaining(client, builder) == (["kb-" + "a" * 16, "kb-" + "d" * 16], ["a" * 16, "d" * 16])
+
+
+def test_expired_and_orphaned_corpora(builder, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CORPUS_MAX_COUNT", 0)
+    monkeypatch.setattr(settings, "CORPUS_EXPIRE_DAYS", 30)
+    client = chromadb.PersistentClient(path=str(tmp_path / "vectors"))
+    now = time.time()
+    add_corpus(client, builder, "a" * 16, now)
+    add_corpus(client, builder, "b" * 16, now - 31 * DAY)
+    # 没有对应集合的索引目录与正在保存的临时目录
+    os.makedirs(builder._bm25_path("c" * 16))
+    os.makedirs(os.path.join(builder.bm25_dir, ".tmp-saving"))
+
+    assert builder._evict_corpora(client, "a" * 16) == 1
+    assert remaining(client, builder) == (["kb-" + "a" * 16], [".tmp-saving", "a" * 16])
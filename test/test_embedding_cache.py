@@ -0,0 +1,79 @@
+"""嵌入缓存（EmbeddingCache / CachedEmbeddings）的测试"""
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from retriever.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    """按文本长度生成向量并记录请求过的文本"""
+
+    def __init__(self):
+        self.documents: List[str] = []
+        self.queries: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.documents.extend(texts)
+        return [[float(len(text)), 1.0, 2.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return [float(len(text)), -1.0, -2.0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path))
+
+
+def test_put_and_get(cache):
+    hashes = {cache.text_hash(text): text for text in ("a", "bb")}
+    cache.put_many("model", {text_hash: [float(len(text))] * 4 for text_hash, text in hashes.items()})
+    found = cache.get_many("model", [*hashes, "missing"])
+    assert set(found) == set(hashes)
+    for text_hash, vector in found.items():
+        np.testing.assert_array_equal(vector, [float(len(hashes[text_hash]))] * 4)
+    assert cache.get_many("other-model", hashes) == {}
+
+
+def test_vectors_of_different_dimensions(cache):
+    cache.put_many("model", {"short": [1.0, 2.0], "long": [1.0, 2.0, 3.0]})
+    cache.put_many("model", {"short2": [3.0, 4.0]})
+    found = cache.get_many("model", ["short", "long", "short2"])
+    np.testing.assert_array_equal(found["long"], [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(found["short2"], [3.0, 4.0])
+
+
+def test_persists_across_instances(cache, tmp_path):
+    cache.put_many("model", {"h": [1.0, 2.0]})
+    reopened = EmbeddingCache(str(tmp_path))
+    np.testing.assert_array_equal(reopened.get_many("model", ["h"])["h"], [1.0, 2.0])
+    assert reopened.get_stats()["entries"] == 1
+
+
+def test_cached_embeddings_only_requests_misses(cache):
+    base = CountingEmbeddings()
+    embeddings = CachedEmbeddings(base, model="test/model", cache=cache)
+    first = embeddings.embed_documents(["a", "bb", "a"])
+    assert base.documents == ["a", "bb"]
+    assert first == [[1.0, 1.0, 2.0], [2.0, 1.0, 2.0], [1.0, 1.0, 2.0]]
+    # 重复的文本只请求一次：2次未命中，1次命中
+    assert (cache.get_stats()["hits"], cache.get_stats()["misses"]) == (1, 2)
+
+    second = embeddings.embed_documents(["bb", "ccc"])
+    assert base.documents == ["a", "bb", "ccc"]
+    assert second == [[2.0, 1.0, 2.0], [3.0, 1.0, 2.0]]
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 3, 3)
+
+
+def test_queries_use_separate_keys(cache):
+    base = CountingEmbeddings()
+    embeddings = CachedEmbeddings(base, model="test/model", cache=cache)
+    embeddings.embed_documents(["a"])
+    assert embeddings.embed_query("a") == [1.0, -1.0, -2.0]
+    assert embeddings.embed_query("a") == [1.0, -1.0, -2.0]
+    assert base.queries == ["a"]
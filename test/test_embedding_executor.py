@@ -0,0 +1,124 @@
+"""并发嵌入执行器（EmbeddingExecutor）的测试：打包、顺序、重试与自适应并发"""
+from threading import Lock
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from retriever import embedding_executor
+from retriever.embedding_executor import AdaptiveLimiter, EmbeddingExecutor, get_embedding_executor
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code,
+                                        headers={"retry-after": retry_after} if retry_after else {})
+
+
+class ScriptedEmbeddings(Embeddings):
+    """前几次请求依次抛出给定的异常，之后把每个文本嵌入为[长度]"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+        self.lock = Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.lock:
+            self.calls.append(list(texts))
+            if self.errors:
+                raise self.errors.pop(0)
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(embedding_executor.time, "sleep", lambda seconds: None)
+
+
+def test_pack_respects_budgets_and_order():
+    executor = EmbeddingExecutor(ScriptedEmbeddings(), max_batch_size=3, max_batch_tokens=10, max_in_flight=1)
+    texts = ["a" * 3] * 7 + ["b" * 60, "c"]
+    batches = executor.pack(texts)
+    assert [i for batch in batches for i in batch] == list(range(len(texts)))
+    assert all(len(batch) <= 3 for batch in batches)
+    # 单个超出预算的文本独占一批
+    assert [7] in batches
+
+
+def test_embed_documents_preserves_order():
+    embeddings = ScriptedEmbeddings()
+    executor = EmbeddingExecutor(embeddings, max_batch_size=2, max_batch_tokens=1000, max_in_flight=4)
+    texts = ["x" * n for n in range(1, 12)]
+    assert executor.embed_documents(texts) == [[float(n)] for n in range(1, 12)]
+    assert len(embeddings.calls) == 6
+    assert executor.get_stats()["chunks"] == 11
+
+
+def test_rate_limit_is_retried_and_halves_concurrency():
+    embeddings = ScriptedEmbeddings([HTTPError(429, retry_after="0.01")])
+    executor = EmbeddingExecutor(embeddings, max_in_flight=8, max_retries=2)
+    assert executor.embed_documents(["abc"]) == [[3.0]]
+    assert len(embeddings.calls) == 2
+    stats = executor.get_stats()
+    assert stats["throttled"] == 1 and stats["concurrency"] == 4
+
+
+def test_transient_errors_are_retried_up_to_limit():
+    embeddings = ScriptedEmbeddings([HTTPError(503), ConnectionError("reset")])
+    executor = EmbeddingExecutor(embeddings, max_in_flight=1, max_retries=2)
+    assert executor.embed_documents(["ab"]) == [[2.0]]
+    assert len(embeddings.calls) == 3
+
+    embeddings = ScriptedEmbeddings([HTTPError(503)] * 3)
+    executor = EmbeddingExecutor(embeddings, max_in_flight=1, max_retries=2)
+    with pytest.raises(HTTPError):
+        executor.embed_documents(["ab"])
+    assert len(embeddings.calls) == 3
+
+
+def test_permanent_errors_are_not_retried():
+    embeddings = ScriptedEmbeddings([HTTPError(401)])
+    executor = EmbeddingExecutor(embeddings, max_in_flight=2, max_retries=5)
+    with pytest.raises(HTTPError, match="401"):
+        executor.embed_documents(["ab"])
+    assert len(embeddings.calls) == 1
+    assert executor.limiter.in_flight == 0
+
+
+def test_limiter_additive_increase():
+    limiter = AdaptiveLimiter(4)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 2
+    # 每连续成功limit次并发上限加一，直到恢复到上限
+    for expected in (2, 3, 3, 3, 4):
+        limiter.acquire()
+        limiter.release()
+        assert limiter.limit == expected
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 4
+
+
+def test_registry_is_keyed_on_credentials(monkeypatch):
+    from langchain_openai import OpenAIEmbeddings
+
+    monkeypatch.setattr(embedding_executor, "embedding_executors", {})
+
+    def make(base_url, api_key):
+        return OpenAIEmbeddings(model="bge-m3", base_url=base_url, openai_api_key=api_key)
+
+    first = get_embedding_executor("siliconflow/bge-m3", make("https://a.example/v1", "key-1"))
+    assert get_embedding_executor("siliconflow/bge-m3", make("https://a.example/v1", "key-1")) is first
+    assert get_embedding_executor("siliconflow/bge-m3", make("https://a.example/v1", "key-2")) is not first
+    assert get_embedding_executor("siliconflow/bge-m3", make("https://b.example/v1", "key-1")) is not first
+    # 注册表中不保存明文的API Key
+    assert not any("key-1" in "".join(key) for key in embedding_executor.embedding_executors)
@@ -0,0 +1,56 @@
+"""文件指纹服务（FileFingerprinter）的测试"""
+import hashlib
+import os
+
+from utils.fingerprint import FileFingerprinter
+
+
+def write(tmp_path, name, data: bytes):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_matches_sha256_across_block_boundaries(tmp_path):
+    data = os.urandom(10_000)
+    for block_size in (1, 7, 4096, 10_000, 65_536):
+        fingerprinter = FileFingerprinter(block_size=block_size, max_entries=8)
+        assert fingerprinter.fingerprint(write(tmp_path, "data.bin", data)) == hashlib.sha256(data).hexdigest()
+
+
+def test_empty_file(tmp_path):
+    assert FileFingerprinter(block_size=16, max_entries=8).fingerprint(write(tmp_path, "empty", b"")) == \
+        hashlib.sha256(b"").hexdigest()
+
+
+def test_memoized_until_file_changes(tmp_path, monkeypatch):
+    fingerprinter = FileFingerprinter(block_size=16, max_entries=8)
+    path = write(tmp_path, "a.txt", b"first")
+    calls = []
+    hash_file = fingerprinter._hash_file
+    monkeypatch.setattr(fingerprinter, "_hash_file", lambda file_path: calls.append(file_path) or hash_file(file_path))
+
+    first = fingerprinter.fingerprint(path)
+    assert fingerprinter.fingerprint(path) == first
+    assert len(calls) == 1
+
+    # 内容（大小与修改时间）变化后重新计算
+    write(tmp_path, "a.txt", b"second version")
+    assert fingerprinter.fingerprint(path) == hashlib.sha256(b"second version").hexdigest()
+    assert len(calls) == 2
+
+
+def test_same_content_same_fingerprint(tmp_path):
+    fingerprinter = FileFingerprinter(block_size=16, max_entries=8)
+    paths = [write(tmp_path, name, b"same") for name in ("a.txt", "b.txt")]
+    assert fingerprinter.fingerprints(paths) == frozenset({hashlib.sha256(b"same").hexdigest()})
+
+
+def test_memo_is_bounded(tmp_path):
+    fingerprinter = FileFingerprinter(block_size=16, max_entries=2)
+    paths = [write(tmp_path, f"{i}.txt", str(i).encode()) for i in range(3)]
+    for path in paths:
+        fingerprinter.fingerprint(path)
+    fingerprinter.fingerprint(paths[1])
+    assert len(fingerprinter._memo) == 2
+    assert fingerprinter._memo_key(paths[0]) not in fingerprinter._memo
@@ -0,0 +1,71 @@
+"""混合检索结果融合（fuse）的测试"""
+import pytest
+from langchain_core.documents import Document
+
+from retriever.fusion import fuse
+
+
+def doc(text):
+    return Document(page_content=text, metadata={})
+
+
+def test_rrf_ordering():
+    """被两个检索器同时召回的文档排在前面，其余按名次排列"""
+    bm25 = [(doc("a"), 9.0), (doc("b"), 5.0), (doc("c"), 1.0)]
+    # 向量检索返回的是距离，越小越相关
+    vector = [(doc("d"), 0.9), (doc("b"), 0.1)]
+    docs = fuse([bm25, vector], [0.5, 0.5], ["bm25", "vector"], mode="rrf", rrf_k=60)
+    assert [d.page_content for d in docs] == ["b", "a", "d", "c"]
+    assert docs[0].metadata["score"] == pytest.approx(0.5 / 62 + 0.5 / 61)
+    assert docs[2].metadata["retrieval_source"] == "vector"
+
+
+def test_weights():
+    docs = fuse([[doc("a")], [doc("b")]], [0.2, 0.8], ["bm25", "other"])
+    assert [d.page_content for d in docs] == ["b", "a"]
+
+
+def test_scores_from_metadata():
+    """未带分数的结果使用metadata中的score"""
+    ranked = [Document(page_content="low", metadata={"score": 1.0}),
+              Document(page_content="high", metadata={"score": 3.0})]
+    docs = fuse([ranked], [1.0], ["bm25"])
+    assert [d.page_content for d in docs] == ["high", "low"]
+
+
+def test_top_k():
+    ranked = [(doc(str(i)), float(10 - i)) for i in range(10)]
+    docs = fuse([ranked], [1.0], ["bm25"], top_k=3)
+    assert [d.page_content for d in docs] == ["0", "1", "2"]
+    assert len(fuse([ranked], [1.0], ["bm25"])) == 10
+
+
+def test_duplicates_are_counted_once():
+    ranked = [(doc("a"), 3.0), (doc("a"), 2.0), (doc("b"), 1.0)]
+    docs = fuse([ranked], [1.0], ["bm25"], rrf_k=60)
+    assert [d.page_content for d in docs] == ["a", "b"]
+    assert docs[0].metadata["score"] == pytest.approx(1 / 61)
+
+
+def test_minmax():
+    bm25 = [(doc("a"), 10.0), (doc("b"), 5.0), (doc("c"), 0.0)]
+    vector = [(doc("c"), 0.2), (doc("a"), 0.6)]
+    docs = fuse([bm25, vector], [0.5, 0.5], ["bm25", "vector"], mode="minmax")
+    scores = {d.page_content: d.metadata["score"] for d in docs}
+    assert scores == pytest.approx({"a": 0.5, "b": 0.25, "c": 0.5})
+
+
+def test_empty_results():
+    assert fuse([[], []], [0.5, 0.5], ["bm25", "vector"]) == []
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        fuse([[doc("a")]], [1.0], ["bm25"], mode="borda")
+
+
+def test_retriever_rejects_unknown_mode():
+    """无效的融合方式在构建检索器时报错，而不是在每次查询时"""
+    from retriever.chroma import Chroma_Retriever
+    with pytest.raises(ValueError):
+        Chroma_Retriever([], [], [], fusion="borda")
@@ -0,0 +1,79 @@
+"""混合检索器（Chroma_Retriever）的测试：超时或出错的子检索器不参与结果"""
+import asyncio
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from retriever.chroma import Chroma_Retriever
+
+
+def doc(text):
+    return Document(page_content=text, metadata={})
+
+
+class FakeKeyword:
+    """BM25检索器的替身，通过invoke返回带分数的文档"""
+
+    def __init__(self, texts, delay=0.0, error=None):
+        self.texts, self.delay, self.error = texts, delay, error
+
+    def invoke(self, query):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [(doc(text), float(len(self.texts) - i)) for i, text in enumerate(self.texts)]
+
+
+class FakeVector(FakeKeyword):
+    """向量库的替身，返回 (文档, 距离)"""
+
+    def similarity_search_with_score(self, query, k):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [(doc(text), 0.1 * (i + 1)) for i, text in enumerate(self.texts)]
+
+
+def make_retriever(bm25, vector):
+    return Chroma_Retriever(retrievers=[bm25, vector], weights=[0.5, 0.5], flags=["bm25", "vector"],
+                            timeouts={"bm25": 0.2, "vector": 0.2}, fusion="rrf", top_k=10)
+
+
+def contents(docs):
+    return sorted(d.page_content for d in docs)
+
+
+def run(retriever, query, use_async):
+    if use_async:
+        return asyncio.run(retriever.ainvoke(query))
+    return retriever.invoke(query)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_combines_all_retrievers(use_async):
+    retriever = make_retriever(FakeKeyword(["a", "b"]), FakeVector(["c"]))
+    assert contents(run(retriever, "q", use_async)) == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failed_retriever_is_dropped(use_async):
+    retriever = make_retriever(FakeKeyword(["a", "b"]), FakeVector(["c"], error=RuntimeError("vector store down")))
+    assert contents(run(retriever, "q", use_async)) == ["a", "b"]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_slow_retriever_is_dropped(use_async):
+    retriever = make_retriever(FakeKeyword(["a"], delay=1.0), FakeVector(["c", "d"]))
+    start = time.monotonic()
+    assert contents(run(retriever, "q", use_async)) == ["c", "d"]
+    # 按超时返回，不等待慢的检索器
+    assert time.monotonic() - start < 0.8
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_all_failing_raises(use_async):
+    retriever = make_retriever(FakeKeyword(["a"], error=ValueError("bm25 broken")),
+                               FakeVector(["c"], delay=1.0))
+    with pytest.raises(ValueError, match="bm25 broken"):
+        run(retriever, "q", use_async)
@@ -0,0 +1,70 @@
+"""流式入库预取（prefetch）的测试"""
+import threading
+import time
+
+import pytest
+
+from retriever.ingest import prefetch
+
+
+def test_preserves_order():
+    assert list(prefetch(iter(range(100)), 3)) == list(range(100))
+    assert list(prefetch([], 3)) == []
+
+
+def test_producer_is_bounded():
+    """消费者不取数据时，生产者最多领先max_pending（加上正在放入的一个）个元素"""
+    produced = []
+
+    def items():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    iterator = prefetch(items(), 2)
+    assert next(iterator) == 0
+    time.sleep(0.3)
+    assert len(produced) <= 1 + 2 + 1
+    assert list(iterator) == list(range(1, 100))
+
+
+def test_overlaps_producer_and_consumer():
+    """生产与消费同时进行，总耗时接近两者中较慢的一方而不是两者之和"""
+    def items():
+        for i in range(5):
+            time.sleep(0.1)
+            yield i
+
+    start = time.perf_counter()
+    for _ in prefetch(items(), 2):
+        time.sleep(0.1)
+    assert time.perf_counter() - start < 0.85
+
+
+def test_producer_error_is_raised_after_earlier_items():
+    def items():
+        yield 1
+        yield 2
+        raise ValueError("parse failed")
+
+    received = []
+    with pytest.raises(ValueError, match="parse failed"):
+        for item in prefetch(items(), 4):
+            received.append(item)
+    assert received == [1, 2]
+
+
+def test_consumer_stopping_early_stops_producer():
+    finished = threading.Event()
+
+    def items():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            finished.set()
+
+    iterator = prefetch(items(), 1)
+    assert next(iterator) == 0
+    iterator.close()
+    assert finished.wait(timeout=3)
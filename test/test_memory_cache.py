@@ -0,0 +1,74 @@
+"""MemoryCache的测试：LRU顺序、字节预算与过期"""
+import time
+
+from utils.memory_cache import MemoryCache
+
+DAY = 24 * 60 * 60
+
+
+def test_get_and_put():
+    cache = MemoryCache(max_bytes=100, expire_days=1)
+    assert cache.get("a") is None
+    cache.put("a", [1, 2, 3], 10)
+    assert cache.get("a") == [1, 2, 3]
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["total_size"]) == (1, 1, 1, 10)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_replace_updates_size():
+    cache = MemoryCache(max_bytes=100, expire_days=1)
+    cache.put("a", "old", 30)
+    cache.put("a", "new", 50)
+    assert cache.get("a") == "new"
+    assert cache.get_stats()["total_size"] == 50
+
+
+def test_evicts_least_recently_used():
+    cache = MemoryCache(max_bytes=100, expire_days=1)
+    cache.put("a", "a", 40)
+    cache.put("b", "b", 40)
+    cache.get("a")
+    cache.put("c", "c", 40)
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" and cache.get("c") == "c"
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["total_size"] == 80
+
+
+def test_oversized_values_are_not_cached():
+    cache = MemoryCache(max_bytes=100, expire_days=1)
+    cache.put("a", "a", 40)
+    cache.put("big", "big", 101)
+    assert cache.get("big") is None
+    assert cache.get("a") == "a"
+
+
+def test_disabled_with_zero_budget():
+    cache = MemoryCache(max_bytes=0, expire_days=1)
+    cache.put("a", "a", 1)
+    assert cache.get("a") is None
+
+
+def test_expiry_is_refreshed_on_access(monkeypatch):
+    cache = MemoryCache(max_bytes=100, expire_days=1)
+    now = time.time()
+    cache.put("a", "a", 10)
+    cache.put("b", "b", 10)
+    monkeypatch.setattr(time, "time", lambda: now + DAY / 2)
+    assert cache.get("a") == "a"
+    monkeypatch.setattr(time, "time", lambda: now + DAY + 1)
+    assert cache.get("a") == "a"
+    assert cache.get("b") is None
+    assert cache.get_stats()["total_size"] == 10
+
+
+def test_invalidate_and_clear():
+    cache = MemoryCache(max_bytes=100, expire_days=1)
+    cache.put("a", "a", 10)
+    cache.put("b", "b", 10)
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    cache.clear()
+    stats = cache.get_stats()
+    assert stats["entries"] == 0 and stats["total_size"] == 0
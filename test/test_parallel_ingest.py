@@ -0,0 +1,95 @@
+"""BaseDocumentProcessor并行解析的测试：结果顺序、跨文件去重与单个文件失败"""
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+
+from document_processor import CHUNK_ID_KEY
+from document_processor.base import BaseDocumentProcessor
+
+
+class LineProcessor(BaseDocumentProcessor):
+    """
+    每行一个分块的处理器
+
+    首行为 "sleep <秒数>" 时先等待，使并行解析的完成顺序与上传顺序不同；首行为 "fail" 时抛出异常。
+    """
+
+    def _process_file(self, file_path: str) -> List[Document]:
+        return self._split_markdown(self._convert_file(file_path), file_path)
+
+    def _convert_file(self, file_path: str) -> str:
+        with open(file_path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        if lines and lines[0] == "fail":
+            raise RuntimeError("broken file")
+        if lines and lines[0].startswith("sleep "):
+            time.sleep(float(lines.pop(0).split()[1]))
+        return "\n".join(lines)
+
+    def _split_markdown(self, markdown: str, file_path: str) -> List[Document]:
+        return [Document(page_content=line, metadata={"source": file_path}) for line in markdown.splitlines()]
+
+
+def make_files(directory, contents):
+    files = []
+    for i, content in enumerate(contents):
+        path = directory / f"file{i}.txt"
+        path.write_text(content, encoding="utf-8")
+        files.append(SimpleNamespace(name=str(path)))
+    return files
+
+
+CONTENTS = [
+    "sleep 1.0\na\nshared",  # 最先上传、最后完成
+    "b\nshared\nb2",
+    "sleep 0.3\nc",
+    "d\na",
+]
+EXPECTED = ["a", "shared", "b", "b2", "c", "d"]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_order_and_dedup(isolated_cache, workers):
+    """输出按上传顺序排列并跨文件去重，与并行度无关"""
+    files = make_files(isolated_cache, CONTENTS)
+    processor = LineProcessor(max_workers=workers)
+    try:
+        chunks = processor.process(files)
+    finally:
+        processor.shutdown()
+    assert [chunk.page_content for chunk in chunks] == EXPECTED
+    assert all(chunk.metadata[CHUNK_ID_KEY] for chunk in chunks)
+
+
+def test_iter_process_yields_per_file(isolated_cache):
+    """每个文件产出其新增的分块，全部重复的文件不产出"""
+    files = make_files(isolated_cache, CONTENTS[1:] + ["b\nshared"])
+    processor = LineProcessor(max_workers=1)
+    batches = [[chunk.page_content for chunk in chunks] for chunks in processor.iter_process(files)]
+    assert batches == [["b", "shared", "b2"], ["c"], ["d", "a"]]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_failed_file_is_skipped(isolated_cache, workers):
+    files = make_files(isolated_cache, ["a", "fail", "sleep 0.2\nc"])
+    processor = LineProcessor(max_workers=workers)
+    try:
+        chunks = processor.process(files)
+    finally:
+        processor.shutdown()
+    assert [chunk.page_content for chunk in chunks] == ["a", "c"]
+
+
+def test_second_run_hits_cache(isolated_cache):
+    from utils.cache_metrics import get_cache_metrics
+
+    files = make_files(isolated_cache, CONTENTS)
+    processor = LineProcessor(max_workers=1)
+    first = [chunk.page_content for chunk in processor.process(files)]
+    hits = sum(get_cache_metrics().snapshot()["hits"].values())
+    second = [chunk.page_content for chunk in processor.process(files)]
+    assert first == second == EXPECTED
+    assert sum(get_cache_metrics().snapshot()["hits"].values()) == hits + len(files)
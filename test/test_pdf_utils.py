@@ -0,0 +1,58 @@
+"""PDF页面工具函数的测试"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pypdfium2 as pdfium
+import pytest
+
+from document_processor.pdf_utils import count_pdf_pages, page_ranges, probe_text_layer, split_pdf
+
+SCANNED_PDF = str(Path(__file__).resolve().parent / "ocr_test.pdf")
+
+
+@pytest.fixture
+def blank_pdf(tmp_path):
+    """生成一个7页的空白PDF"""
+    path = tmp_path / "blank.pdf"
+    pdf = pdfium.PdfDocument.new()
+    for _ in range(7):
+        pdf.new_page(595, 842)
+    pdf.save(str(path))
+    pdf.close()
+    return str(path)
+
+
+def test_page_ranges():
+    assert page_ranges(7, 3) == [(0, 3), (3, 6), (6, 7)]
+    assert page_ranges(0, 3) == []
+    assert page_ranges(2, 0) == [(0, 1), (1, 2)]
+
+
+def test_count_and_probe(blank_pdf):
+    assert count_pdf_pages(blank_pdf) == 7
+    assert probe_text_layer(blank_pdf, 1) == [False] * 7
+    assert probe_text_layer(blank_pdf, 0) == [True] * 7
+
+
+def test_scanned_fixture_has_no_text_layer():
+    pages = count_pdf_pages(SCANNED_PDF)
+    assert pages >= 1
+    assert probe_text_layer(SCANNED_PDF, 32) == [False] * pages
+
+
+def test_split(blank_pdf, tmp_path):
+    ranges = page_ranges(7, 3)
+    shards = split_pdf(blank_pdf, ranges, str(tmp_path))
+    assert [count_pdf_pages(shard) for shard in shards] == [3, 3, 1]
+
+
+def test_concurrent_calls(blank_pdf, tmp_path):
+    """多个线程同时调用时（调用在pdfium锁内串行执行）结果保持正确"""
+    def work(i):
+        output = tmp_path / f"out{i}"
+        output.mkdir()
+        shards = split_pdf(blank_pdf, page_ranges(7, 2), str(output))
+        return count_pdf_pages(blank_pdf), len(probe_text_layer(blank_pdf, 1)), len(shards)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert set(pool.map(work, range(32))) == {(7, 7, 4)}
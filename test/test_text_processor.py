@@ -0,0 +1,82 @@
+"""纯文本与markdown快速解析路径的测试"""
+import pytest
+from langchain_text_splitters import MarkdownHeaderTextSplitter
+
+from document_processor.text import split_text_file
+
+HEADERS = [("#", "Header 1"), ("##", "Header 2"), ("###", "Header 3")]
+
+MARKDOWN = """前言，没有标题的内容
+
+# 第一章
+第一章的正文
+## 1.1 小节
+小节正文
+```python
+# 代码块中的注释不是标题
+print("hi")
+```
+### 1.1.1 更小的小节
+更多内容
+
+#不是标题
+# 第二章
+第二章正文
+~~~
+# 同样在代码块中
+~~~
+## 2.1
+结尾
+"""
+
+
+def split_whole(text):
+    return [(doc.page_content, doc.metadata) for doc in MarkdownHeaderTextSplitter(HEADERS).split_text(text)]
+
+
+def write(tmp_path, name, text, encoding="utf-8"):
+    path = tmp_path / name
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+@pytest.mark.parametrize("name", ["doc.md", "doc.txt"])
+def test_matches_splitting_whole_file(tmp_path, name):
+    """逐段流式分块与整篇交给MarkdownHeaderTextSplitter的结果相同"""
+    chunks = split_text_file(write(tmp_path, name, MARKDOWN), HEADERS)
+    assert [(doc.page_content, doc.metadata) for doc in chunks] == split_whole(MARKDOWN)
+    assert {"Header 1": "第二章", "Header 2": "2.1"} in [doc.metadata for doc in chunks]
+
+
+def test_keeps_heading_levels(tmp_path):
+    """保留原文的标题层级（Docling会把二级以下的标题都导出为##）"""
+    chunks = split_text_file(write(tmp_path, "doc.md", MARKDOWN), HEADERS)
+    assert {"Header 1": "第一章", "Header 2": "1.1 小节", "Header 3": "1.1.1 更小的小节"} in \
+        [doc.metadata for doc in chunks]
+
+
+def test_gb18030_fallback(tmp_path):
+    text = "# 标题\n中文内容"
+    chunks = split_text_file(write(tmp_path, "gbk.txt", text, encoding="gb18030"), HEADERS)
+    assert [(doc.page_content, doc.metadata) for doc in chunks] == split_whole(text)
+
+
+def test_plain_text(tmp_path):
+    chunks = split_text_file(write(tmp_path, "plain.txt", "第一行\n第二行\n"), HEADERS)
+    assert [doc.page_content for doc in chunks] == ["第一行\n第二行"]
+
+
+@pytest.mark.parametrize("text", ["", "  \n\n"])
+def test_empty_file(tmp_path, text):
+    assert split_text_file(write(tmp_path, "empty.md", text), HEADERS) == []
+
+
+def test_processor_uses_fast_path(isolated_cache, monkeypatch):
+    """DoclingProcessor处理.md/.txt文件时不经过转换器"""
+    from document_processor import DoclingProcessor
+
+    processor = DoclingProcessor()
+    monkeypatch.setattr(processor, "_convert_to_markdown",
+                        lambda file_path: pytest.fail("text files must not be converted by Docling"))
+    chunks = processor._process_file(write(isolated_cache, "doc.md", MARKDOWN))
+    assert [(doc.page_content, doc.metadata) for doc in chunks] == split_whole(MARKDOWN)
@@ -1,4 +1,9 @@
 from .logging import logger
 from .cache_queue import CacheQueueManager, initialize_cache_queue, get_cache_queue_manager
+from .fingerprint import FileFingerprinter, get_fingerprinter
+from .memory_cache import MemoryCache, get_memory_cache
+from .cache_metrics import CacheMetrics, get_cache_metrics, get_cache_stats
 
-__all__ = ["logger", "CacheQueueManager", "initialize_cache_queue", "get_cache_queue_manager"]
\ No newline at end of file
+__all__ = ["logger", "CacheQueueManager", "initialize_cache_queue", "get_cache_queue_manager",
+           "FileFingerprinter", "get_fingerprinter", "MemoryCache", "get_memory_cache",
+           "CacheMetrics", "get_cache_metrics", "get_cache_stats"]
\ No newline at end of file
@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from utils.logging import logger
+
+
+class ManifestRow(NamedTuple):
+    """缓存清单中的一条记录"""
+    path: str
+    key: str  # 缓存键（文件名去掉缓存后缀）
+    size: int
+    created: float
+    accessed: float
+    expire_time: float
+    config_version: str  # 写入方的缓存格式/配置版本，版本不符的缓存视为失效
+
+
+class SharedCacheIndex:
+    """
+    跨进程共享的持久化缓存清单
+
+    同一台机器上的多个应用进程共用一个缓存目录时，各自的CacheQueueManager只能看到自己写入的文件。
+    清单把每个缓存文件的键、大小、创建/访问时间、过期时间与配置版本保存在SQLite数据库中，
+    所有进程的写入与命中都会同步到这里，负责清理的进程据此做出淘汰决定。
+    启动时用一次查询加载全部记录，不必遍历缓存目录并逐个stat文件；
+    并发访问由SQLite自身的文件锁保证一致性。
+    """
+
+    # 表结构版本，旧版本的表会被重建，随后由清理进程扫描缓存目录重新登记
+    SCHEMA_VERSION = 2
+
+    def __init__(self, db_path):
+        """
+        打开（必要时创建）缓存清单
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = Path(db_path)
+        self.lock = Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        with self.lock:
+            # WAL模式下读写互不阻塞，适合多个进程频繁更新访问时间
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+                # 新建的清单还不包含已有的缓存文件，需要完整扫描一次缓存目录
+                self.created = version < self.SCHEMA_VERSION
+                if self.created:
+                    self._conn.execute("DROP TABLE IF EXISTS cache_entries")
+                    self._conn.execute(
+                        "CREATE TABLE cache_entries ("
+                        "path TEXT PRIMARY KEY, key TEXT NOT NULL, size INTEGER NOT NULL, "
+                        "created REAL NOT NULL, accessed REAL NOT NULL, expire_time REAL NOT NULL, "
+                        "config_version TEXT NOT NULL DEFAULT '')"
+                    )
+                    self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                # 所有进程共用的设置（目前只有缓存有效期）
+                self._conn.execute("CREATE TABLE IF NOT EXISTS cache_settings (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def key_for(path: str) -> str:
+        """由缓存文件路径得到缓存键"""
+        return Path(path).stem
+
+    def upsert(self, path: str, size: int, expire_time: float, config_version: str = ""):
+        """登记或更新一个（新写入的）缓存文件"""
+        now = time.time()
+        with self.lock:
+            self._conn.execute(
+                "INSERT INTO cache_entries (path, key, size, created, accessed, expire_time, config_version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, created = excluded.created, "
+                "accessed = excluded.accessed, expire_time = excluded.expire_time, "
+                "config_version = excluded.config_version",
+                (path, self.key_for(path), size, now, now, expire_time, config_version),
+            )
+
+    def insert_missing(self, rows: Iterable[ManifestRow]):
+        """登记清单中尚不存在的缓存文件，已有的记录保持不变"""
+        with self.lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO cache_entries "
+                    "(path, key, size, created, accessed, expire_time, config_version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def touch(self, path: str, expire_time: float) -> bool:
+        """
+        记录一次访问并刷新缓存文件的过期时间
+
+        Returns:
+            清单中存在该文件时返回True
+        """
+        with self.lock:
+            cursor = self._conn.execute(
+                "UPDATE cache_entries SET accessed = ?, expire_time = MAX(expire_time, ?) WHERE path = ?",
+                (time.time(), expire_time, path))
+            return cursor.rowcount > 0
+
+    def touch_many(self, touches: Iterable[Tuple[str, float, float]]) -> List[str]:
+        """
+        在一个事务中批量记录访问
+
+        Args:
+            touches: (文件路径, 访问时间, 过期时间) 序列
+
+        Returns:
+            清单中不存在的文件路径
+        """
+        missing = []
+        with self.lock:
+            self._conn.execute("BEGIN")
+            try:
+                for path, accessed, expire_time in touches:
+                    cursor = self._conn.execute(
+                        "UPDATE cache_entries SET accessed = MAX(accessed, ?), expire_time = MAX(expire_time, ?) "
+                        "WHERE path = ?", (accessed, expire_time, path))
+                    if cursor.rowcount == 0:
+                        missing.append(path)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return missing
+
+    def get(self, path: str) -> Optional[ManifestRow]:
+        """查询单个缓存文件的记录"""
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT path, key, size, created, accessed, expire_time, config_version "
+                "FROM cache_entries WHERE path = ?", (path,)).fetchone()
+        return ManifestRow(*row) if row else None
+
+    def remove(self, path: str):
+        """无条件移除缓存文件的登记"""
+        with self.lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE path = ?", (path,))
+
+    def claim(self, path: str, expire_time: float) -> bool:
+        """
+        为删除文件认领一条记录
+
+        只有当记录的过期时间不晚于调用方看到的expire_time时才会移除，
+        若其他进程在此期间命中并刷新了该文件，则认领失败，文件应当保留。
+
+        Returns:
+            认领成功（调用方可以删除文件）时返回True
+        """
+        with self.lock:
+            cursor = self._conn.execute(
+                "DELETE FROM cache_entries WHERE path = ? AND expire_time <= ?", (path, expire_time))
+            return cursor.rowcount > 0
+
+    def set_expire_seconds(self, expire_seconds: float) -> bool:
+        """
+        修改缓存有效期，所有记录的过期时间按 最近访问时间 + 新有效期 重新计算
+
+        有效期保存在清单中，多个进程先后应用同一修改时只有第一次会更新记录，
+        过期时间由访问时间直接算出而不是在原值上平移，重复应用也不会累加。
+
+        Returns:
+            记录被更新时返回True，清单中的有效期已经是该值时返回False
+        """
+        with self.lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT value FROM cache_settings WHERE key = 'expire_seconds'").fetchone()
+                changed = row is None or row[0] != expire_seconds
+                if changed:
+                    self._conn.execute("UPDATE cache_entries SET expire_time = accessed + ?", (expire_seconds,))
+                    self._conn.execute(
+                        "INSERT INTO cache_settings (key, value) VALUES ('expire_seconds', ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (expire_seconds,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return changed
+
+    def entries(self) -> List[ManifestRow]:
+        """按过期时间（即最近访问顺序）从早到晚返回所有记录"""
+        with self.lock:
+            rows = self._conn.execute(
+                "SELECT path, key, size, created, accessed, expire_time, config_version "
+                "FROM cache_entries ORDER BY expire_time").fetchall()
+        return [ManifestRow(*row) for row in rows]
+
+    def reconcile(self, directories: Iterable[Path], suffixes: Iterable[str], expire_seconds: float) -> int:
+        """
+        使清单与缓存目录中的实际文件保持一致
+
+        登记目录中存在但清单中没有的缓存文件（过期时间按修改时间推算），
+        并移除这些目录下文件已不存在的记录。
+
+        Returns:
+            新增与移除的记录总数
+        """
+        suffixes = tuple(suffixes)
+        # 与CacheQueueManager使用相同的路径规范化（不解析符号链接），同一文件只有一条记录
+        directories = [os.path.abspath(directory) for directory in directories]
+        found = {}
+        for directory in directories:
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        if item.name.endswith(suffixes) and item.is_file():
+                            found[os.path.join(directory, item.name)] = item.stat()
+            except FileNotFoundError:
+                continue
+
+        known = {row.path for row in self.entries()}
+        missing = [
+            ManifestRow(path, self.key_for(path), stat.st_size, stat.st_mtime, stat.st_mtime,
+                        stat.st_mtime + expire_seconds, "")
+            for path, stat in found.items() if path not in known
+        ]
+        stale = [path for path in known
+                 if path not in found and os.path.dirname(path) in directories and not os.path.exists(path)]
+        if missing:
+            self.insert_missing(missing)
+        for path in stale:
+            self.remove(path)
+        if missing or stale:
+            logger.info(f"Reconciled cache manifest: {len(missing)} files added, {len(stale)} stale records removed")
+        return len(missing) + len(stale)
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            try:
+                self._conn.close()
+            except sqlite3.Error as e:
+                logger.debug(f"Failed to close cache index {self.db_path}: {e}")
@@ -0,0 +1,159 @@
+import bisect
+from threading import Lock
+from typing import Dict, List
+
+
+class LatencyHistogram:
+    """
+    固定分桶的耗时直方图
+
+    分桶上限以毫秒为单位，落在最后一个上限之外的记录计入溢出桶。
+    百分位数按分桶上限估计，足以判断缓存读写的量级。
+    """
+
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds: float):
+        """记录一次耗时（秒）"""
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """估计第q百分位的耗时（毫秒），取所在分桶的上限（不超过最大值），溢出桶取最大值"""
+        if not self.count:
+            return 0.0
+        target = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(float(self.BUCKETS_MS[index]), self.max_ms) if index < len(self.BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict:
+        buckets = {f"<={bound}ms": count for bound, count in zip(self.BUCKETS_MS, self.counts)}
+        buckets[f">{self.BUCKETS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": self.max_ms,
+            "buckets": buckets,
+        }
+
+
+class CacheMetrics:
+    """
+    文档缓存的运行指标
+
+    由BaseDocumentProcessor记录命中（按内存/磁盘层区分）、未命中、读写字节数与读写耗时，
+    由CacheQueueManager记录按原因（ttl过期/size超出大小限制）区分的淘汰。
+    据此可以根据实际的命中率与淘汰情况调整MAX_CACHE_SIZE与CACHE_EXPIRE_DAYS。
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """清零所有指标"""
+        with self.lock:
+            self.hits: Dict[str, int] = {"memory": 0, "disk": 0}
+            self.misses = 0
+            self.evictions: Dict[str, int] = {"ttl": 0, "size": 0}
+            self.evicted_bytes: Dict[str, int] = {"ttl": 0, "size": 0}
+            self.bytes_read = 0
+            self.bytes_written = 0
+            self.load_latency = LatencyHistogram()
+            self.save_latency = LatencyHistogram()
+
+    def record_hit(self, tier: str):
+        """记录一次命中，tier为memory或disk"""
+        with self.lock:
+            self.hits[tier] = self.hits.get(tier, 0) + 1
+
+    def record_miss(self):
+        """记录一次未命中"""
+        with self.lock:
+            self.misses += 1
+
+    def record_load(self, seconds: float, nbytes: int):
+        """记录一次从磁盘读取缓存文件的耗时与大小"""
+        with self.lock:
+            self.bytes_read += nbytes
+            self.load_latency.record(seconds)
+
+    def record_save(self, seconds: float, nbytes: int):
+        """记录一次写入缓存文件的耗时与大小"""
+        with self.lock:
+            self.bytes_written += nbytes
+            self.save_latency.record(seconds)
+
+    def record_eviction(self, reason: str, nbytes: int):
+        """记录一次淘汰，reason为ttl或size"""
+        with self.lock:
+            self.evictions[reason] = self.evictions.get(reason, 0) + 1
+            self.evicted_bytes[reason] = self.evicted_bytes.get(reason, 0) + nbytes
+
+    def snapshot(self) -> Dict:
+        """
+        获取当前指标的快照
+
+        Returns:
+            包含命中、未命中、命中率、淘汰、读写字节数与读写耗时分布的字典
+        """
+        with self.lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "evictions": dict(self.evictions),
+                "evicted_bytes": dict(self.evicted_bytes),
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+                "load_latency": self.load_latency.snapshot(),
+                "save_latency": self.save_latency.snapshot(),
+            }
+
+
+# 全局实例
+cache_metrics = None
+
+def get_cache_metrics():
+    """
+    获取全局缓存指标实例
+
+    Returns:
+        CacheMetrics实例
+    """
+    global cache_metrics
+    if cache_metrics is None:
+        cache_metrics = CacheMetrics()
+    return cache_metrics
+
+def get_cache_stats() -> Dict:
+    """
+    汇总文档缓存的统计信息
+
+    Returns:
+        包含运行指标（metrics）、磁盘缓存队列（queue）与内存缓存（memory）统计的字典
+    """
+    from utils.cache_queue import get_cache_queue_manager
+    from utils.memory_cache import get_memory_cache
+    return {
+        "metrics": get_cache_metrics().snapshot(),
+        "queue": get_cache_queue_manager().get_queue_stats(),
+        "memory": get_memory_cache().get_stats(),
+    }
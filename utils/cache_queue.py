@@ -3,13 +3,29 @@ import time
 import os
 import json
 from pathlib import Path
+import heapq
 from typing import Dict, List, Tuple
-from threading import Thread, Lock
-from collections import deque
+from threading import Thread, Lock, Condition
+from collections import OrderedDict
+from filelock import FileLock, Timeout
 from config.settings import settings
+from utils.cache_index import SharedCacheIndex
+from utils.cache_metrics import get_cache_metrics
+from utils.memory_cache import get_memory_cache
 from utils.logging import logger
 
 
+class CacheEntry:
+    """队列中的单个缓存文件"""
+    __slots__ = ("path", "expire_time", "size", "config_version")
+
+    def __init__(self, path: str, expire_time: float, size: int, config_version: str = ""):
+        self.path = path
+        self.expire_time = expire_time
+        self.size = size
+        self.config_version = config_version
+
+
 class CacheQueueManager:
     """
     消息队列管理器，用于处理文档缓存的自动清理
@@ -17,29 +33,63 @@ class CacheQueueManager:
     该类使用生产者-消费者模式来管理缓存文件的生命周期。
     当文件被访问时，会将其加入队列，当队列中的文件达到过期时间后，
     自动将其从磁盘上删除以释放空间。
+
+    多个进程共用同一个缓存目录时，写入与命中都会同步到共享索引（SharedCacheIndex）；
+    只有通过缓存目录下的janitor锁选举出的一个进程负责删除文件，它定期从共享索引同步
+    所有进程的记录，并在删除前向索引认领该文件，避免删除其他进程刚刚写入或命中的缓存。
+
+    共享索引同时是持久化的缓存清单：启动时一次查询即可加载全部记录，处理器查找缓存时
+    也直接查询队列而不必stat文件。清单与磁盘的差异（清单之外的文件、已被删除的文件）
+    在访问时或由janitor在后台扫描时再修正。
     """
+    # 由队列管理的缓存文件后缀（列式分块缓存与旧版本的pickle缓存）
+    CACHE_SUFFIXES = (".chunks", ".pkl")
+    # 共享索引与janitor锁的文件名，位于缓存目录下
+    INDEX_FILE_NAME = "cache_index.sqlite3"
+    JANITOR_LOCK_NAME = "janitor.lock"
     
     def __init__(self, cache_dir: str = None, expire_days: int = None, max_total_size: int = None):
         """
         初始化缓存队列管理器
         
         Args:
-            cache_dir: 缓存目录路径
+            cache_dir: 缓存目录路径，默认管理处理器使用的所有缓存目录，清单保存在其中的第一个目录
             expire_days: 缓存过期天数
             max_total_size: 缓存最大总大小（字节），默认为None表示无限制
         """
-        self.cache_dir = Path(cache_dir or settings.CACHE_DIR)
+        if cache_dir:
+            self.cache_dirs = [Path(self._normalize(cache_dir))]
+        else:
+            # DoclingProcessor写入CACHE_DIR_PATH，BaseDocumentProcessor写入CACHE_DIR
+            self.cache_dirs = list(dict.fromkeys(
+                Path(self._normalize(directory)) for directory in (settings.CACHE_DIR_PATH, settings.CACHE_DIR)))
+        self.cache_dir = self.cache_dirs[0]
         self.expire_days = expire_days or settings.CACHE_EXPIRE_DAYS
         self.expire_seconds = self.expire_days * 24 * 60 * 60
         # 默认最大缓存大小为1GB，可以通过settings配置
         self.max_total_size = max_total_size or getattr(settings, "MAX_CACHE_SIZE", 1024*1024*1024)
         
-        # 使用deque作为队列存储(文件路径, 过期时间戳, 文件大小)
-        self.queue = deque()
+        # 文件路径 -> CacheEntry，按最近访问顺序排列，最久未访问的在前（按大小淘汰时先删除）
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        # 过期时间小顶堆(过期时间戳, 文件路径)，删除条目时不从堆中移除，弹出时再校验（惰性删除）
+        self.expiry_heap: List[Tuple[float, str]] = []
+        # 队列中文件的总大小，随增删实时维护
+        self.total_size = 0
         self.lock = Lock()
+        # 清理线程在该条件变量上等待，直到下一个条目过期；新增条目、修改配置或停止时会被提前唤醒
+        self.condition = Condition(self.lock)
         
         # 确保缓存目录存在
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for directory in self.cache_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+
+        # 跨进程共享的索引，以及选举清理进程（janitor）用的文件锁
+        self.index = SharedCacheIndex(self.cache_dir / self.INDEX_FILE_NAME)
+        self.janitor_lock = FileLock(str(self.cache_dir / self.JANITOR_LOCK_NAME))
+        self.is_janitor = False
+        self.sync_interval = settings.CACHE_INDEX_SYNC_INTERVAL
+        # 内存缓存命中的访问记录，文件路径 -> (访问时间, 过期时间, 内存缓存键)，同步共享索引时批量写入
+        self.pending_touches: Dict[str, Tuple[float, float, str]] = {}
         
         # 控制清理线程的标志
         self.running = False
@@ -53,29 +103,124 @@ class CacheQueueManager:
 
     def _load_existing_cache_files(self):
         """
-        初始化时加载已存在的缓存文件到队列中
+        初始化时从缓存清单加载已存在的缓存文件到队列中
+
+        只执行一次查询，不遍历缓存目录；清单之外的文件（例如清单创建之前写入的）
+        在被访问时或由janitor在后台扫描目录时补登记。
         """
         try:
-            cache_files = []
-            for file_path in self.cache_dir.glob("*.pkl"):
-                if file_path.is_file():
-                    stat = file_path.stat()
-                    cache_files.append((
-                        str(file_path),
-                        stat.st_mtime + self.expire_seconds,  # 过期时间
-                        stat.st_size  # 文件大小
-                    ))
-            
-            # 按照修改时间排序（最早的在前面）
-            cache_files.sort(key=lambda x: x[1] - self.expire_seconds)
-            
-            with self.lock:
-                self.queue.extend(cache_files)
-                
-            logger.info(f"Loaded {len(cache_files)} existing cache files")
+            self._sync_from_index()
+            logger.info(f"Loaded {len(self.entries)} existing cache files from manifest")
         except Exception as e:
             logger.error(f"Error loading existing cache files: {e}")
 
+    def reconcile(self) -> int:
+        """
+        扫描所有缓存目录，使缓存清单与磁盘上的文件保持一致，并重新加载队列
+
+        Returns:
+            新增与移除的记录总数
+        """
+        changed = self.index.reconcile(self.cache_dirs, self.CACHE_SUFFIXES, self.expire_seconds)
+        if changed:
+            self._sync_from_index()
+        return changed
+
+    @staticmethod
+    def _normalize(file_path) -> str:
+        """清单与队列中统一使用绝对路径，避免相对路径随工作目录变化"""
+        return os.path.abspath(file_path)
+
+    def lookup(self, file_path: str) -> CacheEntry:
+        """
+        查询缓存文件在队列（或缓存清单）中的记录，无需访问文件系统
+
+        Args:
+            file_path: 缓存文件路径
+
+        Returns:
+            未过期的记录；文件不在清单中或已过期时返回None
+        """
+        file_path = self._normalize(file_path)
+        with self.lock:
+            entry = self.entries.get(file_path)
+        if entry is None:
+            # 可能是其他进程刚写入、本进程尚未同步的记录
+            row = self.index.get(file_path)
+            if row is None:
+                return None
+            with self.lock:
+                entry = self.entries.get(file_path)
+                if entry is None:
+                    self._track(file_path, row.expire_time, row.size, row.config_version)
+                    entry = self.entries[file_path]
+        if entry.expire_time <= time.time():
+            return None
+        return entry
+
+    def _sync_from_index(self):
+        """用共享索引中的记录（包含其他进程的写入与命中）替换本进程的队列"""
+        # 先写入延迟的访问记录，否则同步会丢失本进程的内存缓存命中
+        self.flush_touches()
+        with self.lock:
+            # 在锁内读取索引，避免覆盖同步期间本进程新增的条目
+            rows = self.index.entries()
+            self.entries.clear()
+            self.expiry_heap = []
+            self.total_size = 0
+            # 记录按过期时间从早到晚排列，即最近访问顺序
+            for row in rows:
+                self._track(row.path, row.expire_time, row.size, row.config_version)
+
+    def _try_become_janitor(self) -> bool:
+        """尝试以非阻塞方式获取janitor锁，成功后由本进程负责删除过期或超额的缓存"""
+        if not self.is_janitor:
+            try:
+                self.janitor_lock.acquire(timeout=0)
+            except Timeout:
+                return False
+            self.is_janitor = True
+            logger.info(f"This process is now the cache janitor for {self.cache_dir}")
+            # 接管时扫描一次缓存目录修正清单，并同步其他进程的记录
+            self.index.reconcile(self.cache_dirs, self.CACHE_SUFFIXES, self.expire_seconds)
+            self._sync_from_index()
+            with self.lock:
+                self._maintain_size_limit()
+        return True
+
+    def _release_janitor(self):
+        """释放janitor锁，其他进程可以接管清理"""
+        if self.is_janitor:
+            self.is_janitor = False
+            self.janitor_lock.release()
+
+    def _delete_file(self, entry: CacheEntry, reason: str) -> bool:
+        """
+        淘汰一个已移出队列的缓存文件，reason为ttl（过期）或size（超出大小限制）
+
+        只有janitor进程会删除文件，且删除前要向共享索引认领该记录：其他进程在此期间
+        命中或重新写入了该文件时认领失败，文件保留，在下次同步时重新加入队列。
+
+        Returns:
+            文件被删除时返回True
+        """
+        if not self.is_janitor:
+            return False
+        try:
+            if not self.index.claim(entry.path, entry.expire_time):
+                logger.debug(f"Cache file was refreshed by another process, keeping: {entry.path}")
+                return False
+            if os.path.exists(entry.path):
+                os.remove(entry.path)
+                get_cache_metrics().record_eviction(reason, entry.size)
+                logger.info(f"Removed cache file ({'expired' if reason == 'ttl' else 'size limit'}): "
+                            f"{entry.path} ({entry.size} bytes)")
+                return True
+            logger.debug(f"Cache file already removed: {entry.path}")
+        except Exception as e:
+            logger.error(f"Failed to remove cache file {entry.path}: {e}")
+        return False
+
     def start_cleanup_loop(self):
         """
         启动后台清理循环线程
@@ -91,32 +236,81 @@ class CacheQueueManager:
         停止后台清理循环线程
         """
         if self.running:
-            self.running = False
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
             if self.cleanup_thread:
                 self.cleanup_thread.join(timeout=5)  # 等待最多5秒
+            self.flush_touches()
             logger.info("Cache cleanup loop stopped")
     
-    def add_file(self, file_path: str):
+    def _track(self, file_path: str, expire_time: float, file_size: int, config_version: str = ""):
+        """登记一个缓存文件（调用方需持有锁）"""
+        self.entries[file_path] = CacheEntry(file_path, expire_time, file_size, config_version)
+        self.total_size += file_size
+        heapq.heappush(self.expiry_heap, (expire_time, file_path))
+        if self.expiry_heap[0][1] == file_path:
+            # 新条目成为最早过期的条目，唤醒清理线程重新计算等待时间
+            self.condition.notify_all()
+
+    def _untrack(self, file_path: str) -> CacheEntry:
+        """移除一个缓存文件的登记（调用方需持有锁），返回被移除的条目，不存在时返回None"""
+        entry = self.entries.pop(file_path, None)
+        if entry is not None:
+            self.total_size -= entry.size
+            self._compact_heap()
+        return entry
+
+    def _compact_heap(self):
+        """堆中失效的记录过多时重建堆，避免惰性删除导致堆无限增长（调用方需持有锁）"""
+        if len(self.expiry_heap) > 2 * len(self.entries) + 64:
+            self.expiry_heap = [(entry.expire_time, path) for path, entry in self.entries.items()]
+            heapq.heapify(self.expiry_heap)
+
+    def _pop_expired(self, current_time: float) -> List[CacheEntry]:
+        """弹出所有已过期的条目（调用方需持有锁）"""
+        expired = []
+        while self.expiry_heap and self.expiry_heap[0][0] <= current_time:
+            expire_time, file_path = heapq.heappop(self.expiry_heap)
+            entry = self.entries.get(file_path)
+            # 条目已被移除或过期时间已更新时，这条堆记录已经失效
+            if entry is None or entry.expire_time != expire_time:
+                continue
+            expired.append(self._untrack(file_path))
+        return expired
+
+    def _next_expiry(self) -> float:
+        """最早的有效过期时间，队列为空时返回None（调用方需持有锁）"""
+        while self.expiry_heap:
+            expire_time, file_path = self.expiry_heap[0]
+            entry = self.entries.get(file_path)
+            if entry is not None and entry.expire_time == expire_time:
+                return expire_time
+            heapq.heappop(self.expiry_heap)
+        return None
+
+    def add_file(self, file_path: str, config_version: str = ""):
         """
         将文件添加到清理队列中
         
         Args:
             file_path: 要跟踪的缓存文件路径
+            config_version: 写入方的缓存格式/配置版本，记录在清单中供读取方校验
         """
         try:
+            file_path = self._normalize(file_path)
             # 获取文件大小
             file_size = os.path.getsize(file_path)
             expire_time = time.time() + self.expire_seconds
             
+            self.index.upsert(file_path, file_size, expire_time, config_version)
             with self.lock:
-                # 检查文件是否已经在队列中，避免重复添加
-                for existing_path, _, _ in self.queue:
-                    if existing_path == file_path:
-                        logger.debug(f"File already in cache queue: {file_path}")
-                        return
+                # 文件已经在队列中（例如被重新写入）时，更新大小并视为一次访问
+                if self._untrack(file_path) is not None:
+                    logger.debug(f"File already in cache queue, refreshing: {file_path}")
                 
                 # 添加到队列
-                self.queue.append((file_path, expire_time, file_size))
+                self._track(file_path, expire_time, file_size, config_version)
                 logger.debug(f"Added file to cache queue: {file_path}, size: {file_size}, expires at: {expire_time}")
                 
                 # 检查并维护总大小限制
@@ -133,73 +327,179 @@ class CacheQueueManager:
             return  # 无大小限制
             
         try:
-            # 计算当前总大小
-            total_size = sum(size for _, _, size in self.queue)
-            
+            # 只有janitor进程负责淘汰，其他进程的队列只用于统计与登记
+            if not self.is_janitor:
+                return
             # 如果超出限制，删除最老的文件直到满足限制
-            while total_size > self.max_total_size and self.queue:
-                oldest_file_path, _, oldest_file_size = self.queue.popleft()
-                total_size -= oldest_file_size
-                
-                # 删除实际文件
-                try:
-                    if os.path.exists(oldest_file_path):
-                        os.remove(oldest_file_path)
-                        logger.info(f"Removed oldest cache file to maintain size limit: {oldest_file_path} ({oldest_file_size} bytes)")
-                    else:
-                        logger.debug(f"Oldest cache file already removed: {oldest_file_path}")
-                except Exception as e:
-                    logger.error(f"Failed to remove cache file {oldest_file_path}: {e}")
+            while self.total_size > self.max_total_size and self.entries:
+                oldest_file_path = next(iter(self.entries))
+                self._delete_file(self._untrack(oldest_file_path), "size")
                     
         except Exception as e:
             logger.error(f"Error maintaining cache size limit: {e}")
 
+    def touch_file(self, file_path: str, defer: bool = False):
+        """
+        记录一次缓存命中：刷新文件的过期时间，并将其移到最近使用的位置（最后被淘汰）
+
+        文件大小仍然计入总大小。访问时间与过期时间记录在缓存清单中，不再修改文件本身。
+
+        Args:
+            file_path: 被访问的缓存文件路径
+            defer: 为True时只更新本进程的队列，清单在下次同步（或flush_touches）时批量更新，
+                用于内存缓存命中，命中路径上不写SQLite；文件不在本进程队列中时仍立即写入
+        """
+        memory_key = file_path
+        file_path = self._normalize(file_path)
+        now = time.time()
+        expire_time = now + self.expire_seconds
+        with self.lock:
+            entry = self.entries.get(file_path)
+            if entry is not None:
+                entry.expire_time = expire_time
+                self.entries.move_to_end(file_path)
+                heapq.heappush(self.expiry_heap, (entry.expire_time, file_path))
+                self._compact_heap()
+                if defer:
+                    self.pending_touches[file_path] = (now, expire_time, str(memory_key))
+                    return
+        if not self.index.touch(file_path, expire_time):
+            self._touch_missing(file_path, memory_key)
+        elif entry is None:
+            # 其他进程写入的缓存，加入本进程的队列
+            row = self.index.get(file_path)
+            with self.lock:
+                if row is not None and file_path not in self.entries:
+                    self._track(file_path, row.expire_time, row.size, row.config_version)
+
+    def _touch_missing(self, file_path: str, memory_key: str):
+        """处理命中了清单中不存在的文件：文件已被删除时丢弃内存中的副本，否则补登记"""
+        if not os.path.exists(file_path):
+            # 内存缓存命中的文件已被清理进程删除：不再登记，内存中的副本随之失效
+            logger.debug(f"Cache file already evicted, dropping it from memory: {file_path}")
+            with self.lock:
+                self._untrack(file_path)
+            get_memory_cache().invalidate(str(memory_key))
+            return
+        # 清单之外的文件直接登记
+        self.add_file(file_path)
+
+    def flush_touches(self) -> int:
+        """
+        在一个事务中把延迟的访问记录写入共享索引
+
+        Returns:
+            写入的记录数
+        """
+        with self.lock:
+            pending, self.pending_touches = self.pending_touches, {}
+        if not pending:
+            return 0
+        try:
+            missing = self.index.touch_many(
+                (file_path, accessed, expire_time) for file_path, (accessed, expire_time, _) in pending.items())
+        except Exception as e:
+            logger.error(f"Error flushing cache access times: {e}")
+            return 0
+        for file_path in missing:
+            self._touch_missing(file_path, pending[file_path][2])
+        return len(pending)
+
     def remove_file(self, file_path: str):
         """
-        从队列中移除特定文件（当文件被主动使用时）
+        从队列中移除特定文件（文件被删除或失效时）
         
         Args:
             file_path: 要从队列中移除的文件路径
         """
+        file_path = self._normalize(file_path)
+        self.index.remove(file_path)
         with self.lock:
-            removed_items = [(fp, et, sz) for fp, et, sz in self.queue if fp != file_path]
-            removed_count = len(self.queue) - len(removed_items)
-            self.queue = deque(removed_items)
-        if removed_count > 0:
-            logger.debug(f"Removed {removed_count} instances of file from cache queue: {file_path}")
+            removed = self._untrack(file_path) is not None
+        if removed:
+            logger.debug(f"Removed file from cache queue: {file_path}")
     
-    def _cleanup_loop(self):
+    def _wait_for_expired(self) -> List[CacheEntry]:
         """
-        后台清理循环，定期检查并删除过期的缓存文件
+        等待直到有条目过期或清理循环被停止
+
+        Returns:
+            已过期的条目列表；清理循环停止时返回None
         """
-        while self.running:
-            try:
+        next_sync = time.time() + self.sync_interval
+        with self.condition:
+            while self.running:
+                next_expiry = self._next_expiry()
                 current_time = time.time()
-                expired_files = []
-                
-                # 收集所有已过期的文件
-                with self.lock:
-                    while self.queue and self.queue[0][1] <= current_time:
-                        expired_files.append(self.queue.popleft())
-                
-                # 删除过期文件
-                for file_path, expire_time, file_size in expired_files:
-                    try:
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                            logger.info(f"Removed expired cache file: {file_path} ({file_size} bytes)")
-                        else:
-                            logger.debug(f"Cache file already removed: {file_path}")
-                    except Exception as e:
-                        logger.error(f"Failed to remove cache file {file_path}: {e}")
-                
-                # 如果没有待处理的任务，短暂休眠
-                if not expired_files:
-                    time.sleep(60)  # 每分钟检查一次
-                
-            except Exception as e:
-                logger.error(f"Error in cache cleanup loop: {e}")
-                time.sleep(60)
+                if next_expiry is not None and next_expiry <= current_time:
+                    return self._pop_expired(current_time)
+                if current_time >= next_sync:
+                    # 定期同步共享索引（或重新尝试成为janitor）
+                    return []
+                # 除了下一个条目到期，还要按同步间隔醒来
+                wake_at = next_sync if next_expiry is None else min(next_expiry, next_sync)
+                self.condition.wait(wake_at - current_time)
+            return None
+
+    def _cleanup_loop(self):
+        """
+        后台清理循环，在下一个条目到期时删除过期的缓存文件
+
+        janitor锁只在该线程中获取与释放；未能成为janitor的进程按同步间隔重试，
+        原janitor进程退出后（锁随之释放）由其他进程接管。
+        """
+        try:
+            while self.running:
+                try:
+                    self._try_become_janitor()
+                    # 收集所有已过期的文件，到达同步间隔时返回空列表
+                    expired_files = self._wait_for_expired()
+                    if expired_files is None:
+                        break
+
+                    # 删除过期文件
+                    for entry in expired_files:
+                        self._delete_file(entry, "ttl")
+
+                    if not expired_files:
+                        # 同步其他进程的写入与命中，janitor据此淘汰超出大小限制的文件
+                        self._sync_from_index()
+                        with self.lock:
+                            self._maintain_size_limit()
+
+                except Exception as e:
+                    logger.error(f"Error in cache cleanup loop: {e}")
+                    with self.condition:
+                        if self.running:
+                            self.condition.wait(60)
+        finally:
+            self._release_janitor()
+
+    def update_config(self, expire_days: int = None, max_total_size: int = None):
+        """
+        修改过期天数或最大总大小，并立即对已有条目生效
+
+        修改过期天数时，已有条目的过期时间在共享清单中按 最近访问时间 + 新有效期 重新计算
+        （多个进程应用同一修改不会重复平移），再同步到本进程的队列；清理线程会被唤醒重新计算等待时间。
+
+        Args:
+            expire_days: 新的缓存过期天数
+            max_total_size: 新的缓存最大总大小（字节）
+        """
+        if expire_days is not None and expire_days != self.expire_days:
+            expire_seconds = expire_days * 24 * 60 * 60
+            self.index.set_expire_seconds(expire_seconds)
+            self._sync_from_index()
+            with self.lock:
+                self.expire_days = expire_days
+                self.expire_seconds = expire_seconds
+        with self.condition:
+            if max_total_size is not None:
+                self.max_total_size = max_total_size
+                self._maintain_size_limit()
+            self.condition.notify_all()
+        logger.info(f"CacheQueueManager config updated: expire_days: {self.expire_days}, "
+                    f"max_total_size: {self.max_total_size}")
     
     def get_queue_stats(self) -> Dict:
         """
@@ -209,11 +509,11 @@ class CacheQueueManager:
             包含队列统计信息的字典
         """
         with self.lock:
-            total_files = len(self.queue)
-            total_size = sum(size for _, _, size in self.queue)
+            total_files = len(self.entries)
+            total_size = self.total_size
             if total_files > 0:
-                soonest_expiry = min(expiry for _, expiry, _ in self.queue)
-                latest_expiry = max(expiry for _, expiry, _ in self.queue)
+                soonest_expiry = self._next_expiry()
+                latest_expiry = max(entry.expire_time for entry in self.entries.values())
                 next_expiry_in = soonest_expiry - time.time()
             else:
                 soonest_expiry = latest_expiry = next_expiry_in = 0
@@ -223,6 +523,7 @@ class CacheQueueManager:
             "total_size": total_size,
             "max_size": self.max_total_size,
             "size_utilization": total_size / self.max_total_size if self.max_total_size > 0 else 0,
+            "is_janitor": self.is_janitor,
             "soonest_expiry": soonest_expiry,
             "latest_expiry": latest_expiry,
             "next_expiry_in_seconds": max(0, next_expiry_in)
@@ -236,24 +537,11 @@ class CacheQueueManager:
         expired_files = []
         
         with self.lock:
-            # 找出所有已过期的文件
-            expired_items = [(fp, et, sz) for fp, et, sz in self.queue if et <= current_time]
-            expired_files = [fp for fp, _, _ in expired_items]
-            
-            # 从队列中移除已过期的项目
-            for item in expired_items:
-                self.queue.remove(item)
-        
-        # 删除过期文件
-        for file_path in expired_files:
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Removed expired cache file: {file_path}")
-            except Exception as e:
-                logger.error(f"Failed to remove cache file {file_path}: {e}")
+            # 找出并移除所有已过期的文件
+            expired_files = self._pop_expired(current_time)
         
-        return len(expired_files)
+        # 删除过期文件（非janitor进程只移出本进程的队列）
+        return sum(1 for entry in expired_files if self._delete_file(entry, "ttl"))
 
 # 全局实例
 cache_queue_manager = None
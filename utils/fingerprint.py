@@ -0,0 +1,92 @@
+import os
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, Tuple
+from config.settings import settings
+
+
+class FileFingerprinter:
+    """
+    文件指纹服务
+
+    按固定大小的块流式计算文件的SHA-256，避免把大文件整个读入内存；
+    并以 (真实路径, 大小, 修改时间, inode) 为键缓存结果，同一个文件在上传流程中
+    （会话变更检测、处理器缓存查找等）只需要读取和计算一次。
+    """
+
+    def __init__(self, block_size: int = None, max_entries: int = None):
+        """
+        初始化文件指纹服务
+
+        Args:
+            block_size: 每次读取的块大小（字节）
+            max_entries: 最多缓存的指纹数量，超出后淘汰最久未使用的记录
+        """
+        self.block_size = block_size or settings.HASH_BLOCK_SIZE
+        self.max_entries = max_entries or settings.FINGERPRINT_CACHE_SIZE
+        self._memo: "OrderedDict[Tuple, str]" = OrderedDict()
+        self.lock = Lock()
+
+    def _memo_key(self, file_path: str) -> Tuple:
+        """文件内容未变化时保持不变的缓存键"""
+        stat = os.stat(file_path)
+        return (os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def _hash_file(self, file_path: str) -> str:
+        """分块计算文件的SHA-256"""
+        digest = hashlib.sha256()
+        buffer = bytearray(self.block_size)
+        view = memoryview(buffer)
+        with open(file_path, "rb", buffering=0) as f:
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                digest.update(view[:size])
+        return digest.hexdigest()
+
+    def fingerprint(self, file_path: str) -> str:
+        """
+        获取文件内容的SHA-256指纹
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            十六进制的SHA-256字符串
+        """
+        key = self._memo_key(file_path)
+        with self.lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+
+        # 在锁外计算哈希，避免大文件阻塞其他请求
+        file_hash = self._hash_file(file_path)
+        with self.lock:
+            self._memo[key] = file_hash
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return file_hash
+
+    def fingerprints(self, file_paths: Iterable[str]) -> frozenset:
+        """获取多个文件的指纹集合"""
+        return frozenset(self.fingerprint(file_path) for file_path in file_paths)
+
+
+# 全局实例
+file_fingerprinter = None
+
+def get_fingerprinter():
+    """
+    获取全局文件指纹服务实例
+
+    Returns:
+        FileFingerprinter实例
+    """
+    global file_fingerprinter
+    if file_fingerprinter is None:
+        file_fingerprinter = FileFingerprinter()
+    return file_fingerprinter
@@ -0,0 +1,138 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional
+from config.settings import settings
+
+
+class MemoryEntry:
+    """内存缓存中的单个条目"""
+    __slots__ = ("value", "size", "expire_time")
+
+    def __init__(self, value: Any, size: int, expire_time: float):
+        self.value = value
+        self.size = size
+        self.expire_time = expire_time
+
+
+class MemoryCache:
+    """
+    进程内按字节预算淘汰的LRU缓存
+
+    位于磁盘缓存之前，保存已经反序列化的对象，同一份文档被多个会话重复上传时无需再读取磁盘。
+    条目在最近一次访问后expire_seconds秒内有效（与磁盘缓存命中时刷新过期时间的策略一致），
+    总大小超过max_bytes时淘汰最久未使用的条目。所有操作都在锁内完成，可供Gradio的并发请求共享。
+    """
+
+    def __init__(self, max_bytes: int = None, expire_days: int = None):
+        """
+        初始化内存缓存
+
+        Args:
+            max_bytes: 缓存的最大总大小（字节），为0时禁用内存缓存
+            expire_days: 条目自最近一次访问起的有效天数
+        """
+        self.max_bytes = settings.MEMORY_CACHE_SIZE if max_bytes is None else max_bytes
+        self.expire_seconds = (expire_days or settings.CACHE_EXPIRE_DAYS) * 24 * 60 * 60
+        # 键 -> MemoryEntry，按最近访问顺序排列，最久未访问的在前
+        self.entries: "OrderedDict[Hashable, MemoryEntry]" = OrderedDict()
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        查找缓存，命中时刷新条目的过期时间与最近使用顺序
+
+        Returns:
+            命中时返回缓存的对象，否则返回None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expire_time <= time.time():
+                self._remove(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entry.expire_time = time.time() + self.expire_seconds
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: Hashable, value: Any, size: int):
+        """
+        添加或替换缓存条目，超出字节预算时淘汰最久未使用的条目
+
+        单个对象超过整个预算时不会被缓存。
+
+        Args:
+            key: 缓存键
+            value: 缓存的对象
+            size: 对象占用内存的估计值（字节）
+        """
+        with self.lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = MemoryEntry(value, size, time.time() + self.expire_seconds)
+            self.total_size += size
+            while self.total_size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """移除缓存条目（对应的磁盘缓存被删除时调用）"""
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        """清空缓存，统计计数保持不变"""
+        with self.lock:
+            self.entries.clear()
+            self.total_size = 0
+
+    def _remove(self, key: Hashable):
+        """在持有锁的情况下移除条目"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_size -= entry.size
+
+    def get_stats(self) -> Dict:
+        """
+        获取内存缓存的统计信息
+
+        Returns:
+            包含条目数、总大小、命中/未命中/淘汰次数与命中率的字典
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "total_size": self.total_size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# 全局实例
+memory_cache = None
+
+def get_memory_cache():
+    """
+    获取全局内存缓存实例
+
+    Returns:
+        MemoryCache实例
+    """
+    global memory_cache
+    if memory_cache is None:
+        memory_cache = MemoryCache()
+    return memory_cache